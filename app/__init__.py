@@ -2,8 +2,39 @@ from app.heroes import (
     HEROES_DICT,
     HERO_ROLES,
     PLAYER_SPAWNED_NAMES_MAP,
+    DraftExtractionResult,
+    DraftPick,
+    ExtractionErrorCategory,
+    ExtractionResult,
     clean_hero_name,
+    extract_draft_from_replay,
+    extract_heroes_from_bytes,
+    extract_heroes_from_contents,
     extract_heroes_from_replay,
+    extract_heroes_from_replays,
+    search_heroes,
 )
-from app.match_series_interface import MatchSeriesManager
-from app.common import align_headers, db_connection
+from app.ban_set import BanSet
+from app.series_events import SERIES_EVENTS
+from app.match_series_interface import (
+    BAN,
+    BanEvent,
+    EditConflictError,
+    GameBans,
+    MatchSeriesManager,
+    MatchSeriesView,
+)
+from app.hero_grid import BAN_FILTERS, hero_grid, hero_grid_style
+from app.common import (
+    align_headers,
+    client_id,
+    db_connection,
+    is_admin,
+    preload_protocols,
+    replay_cache,
+    rerun_on_series_change,
+    stop_following_series,
+)
+from app.extraction_trace import TRACE_SUMMARY
+from app.replay_cache import replay_hash
+from app.rate_limit import CREATE_RATE_LIMITER, RateLimitExceeded
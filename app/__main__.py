@@ -0,0 +1,212 @@
+"""
+Command line interface of the app::
+
+    python -m app schema upgrade [--url URL]
+    python -m app schema check [--url URL]
+    python -m app sprites build
+    python -m app sprites check
+    python -m app series create FILE [--pre-bans HERO ...] [--output PATH] [--base-url BASE_URL] [--url URL]
+    python -m app heroes scan DIR [--output PATH] [--manifest PATH] [--workers N]
+    python -m app api serve [--host HOST] [--port PORT] [--url URL]
+
+`URL` defaults to the `match_series` connection in `.streamlit/secrets.toml`
+and `BASE_URL` to `links.base_url` there.
+"""
+import argparse
+import sys
+import tomllib
+from pathlib import Path
+
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.bulk_series import parse_series_file, series_links_csv
+from app.match_series_interface import MatchSeriesManager
+from app.read_api import create_app
+from app.replay_scan import scan_replays
+
+from app.schema import SCHEMA_VERSION, check_schema_version, upgrade_schema
+from app.sprites import (
+    SPRITES_DIR,
+    build_sprite_sheets,
+    sprite_sheets_up_to_date,
+    sprite_size_report,
+)
+
+
+def _secrets() -> dict:
+    secrets_path = Path(".streamlit") / "secrets.toml"
+    with open(secrets_path, "rb") as fd:
+        return tomllib.load(fd)
+
+
+def _default_url() -> str:
+    return _secrets()["connections"]["match_series"]["url"]
+
+
+def _add_url_argument(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--url",
+        help="Database URL. Defaults to the match_series connection in .streamlit/secrets.toml.",
+    )
+
+
+def schema(args):
+    engine = create_engine(args.url or _default_url())
+    if args.action == "upgrade":
+        previous_version = upgrade_schema(engine)
+        print(f"Schema upgraded from version {previous_version} to {SCHEMA_VERSION}.")
+    else:
+        check_schema_version(engine)
+        print(f"Schema version {SCHEMA_VERSION} is up to date.")
+
+
+def sprites(args):
+    if args.action == "build":
+        sprite_map = build_sprite_sheets()
+        print(f"Packed {len(sprite_map['tiles'])} icons into {SPRITES_DIR}.")
+        print("\n".join(sprite_size_report(sprite_map)))
+    elif not sprite_sheets_up_to_date():
+        raise RuntimeError(
+            "Sprite sheets are outdated. Run `python -m app sprites build`."
+        )
+    else:
+        print("Sprite sheets are up to date.")
+
+
+def series(args):
+    with open(args.file, "r", encoding="utf-8") as fd:
+        specs = parse_series_file(args.file, fd.read(), args.pre_bans)
+
+    engine = create_engine(args.url or _default_url())
+    check_schema_version(engine)
+    with Session(engine) as session:
+        created = MatchSeriesManager.create_many(
+            session,
+            [(spec.name, spec.pre_banned_heroes) for spec in specs],
+            limiter=None,
+        )
+
+    base_url = args.base_url
+    if base_url is None:
+        base_url = _secrets().get("links", {}).get("base_url", "")
+    links = series_links_csv(created, base_url)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fd:
+            fd.write(links)
+        print(f"Created {len(created)} match series. Links written to {args.output}.")
+    else:
+        sys.stdout.write(links)
+
+
+def heroes(args):
+    root = Path(args.dir)
+    if not root.is_dir():
+        raise NotADirectoryError(args.dir)
+
+    if args.output:
+        output = open(args.output, "a", encoding="utf-8")
+    else:
+        output = sys.stdout
+    try:
+        stats = scan_replays(
+            root,
+            output,
+            Path(args.manifest) if args.manifest else None,
+            args.workers,
+            progress=sys.stderr,
+        )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print(
+        f"Scanned {stats.files} replays in {stats.seconds:.1f}s: "
+        f"{stats.extracted} extracted, {stats.failed} failed, {stats.skipped} skipped.",
+        file=sys.stderr,
+    )
+
+
+def api(args):
+    uvicorn.run(
+        create_app(args.url or _default_url()),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="python -m app")
+    subparsers = parser.add_subparsers(required=True)
+
+    schema_parser = subparsers.add_parser(
+        "schema", help="Manage the match series database schema."
+    )
+    schema_parser.add_argument("action", choices=["upgrade", "check"])
+    _add_url_argument(schema_parser)
+    schema_parser.set_defaults(command=schema)
+
+    sprites_parser = subparsers.add_parser(
+        "sprites", help="Generate sprite sheets of the icons in static/."
+    )
+    sprites_parser.add_argument("action", choices=["build", "check"])
+    sprites_parser.set_defaults(command=sprites)
+
+    series_parser = subparsers.add_parser("series", help="Manage match series.")
+    series_parser.add_argument("action", choices=["create"])
+    series_parser.add_argument(
+        "file", help="CSV or JSON list of series (see app.bulk_series)."
+    )
+    series_parser.add_argument(
+        "--pre-bans",
+        nargs="*",
+        default=[],
+        metavar="HERO",
+        help="Heroes pre-banned in every series.",
+    )
+    series_parser.add_argument(
+        "--output", help="File to write links to. Printed to stdout by default."
+    )
+    series_parser.add_argument(
+        "--base-url",
+        help="URL of the app used in links. Defaults to links.base_url in .streamlit/secrets.toml.",
+    )
+    _add_url_argument(series_parser)
+    series_parser.set_defaults(command=series)
+
+    heroes_parser = subparsers.add_parser(
+        "heroes", help="Extract heroes from replays (see app.replay_scan)."
+    )
+    heroes_parser.add_argument("action", choices=["scan"])
+    heroes_parser.add_argument("dir", help="Directory with .StormReplay files.")
+    heroes_parser.add_argument(
+        "--output", help="JSON Lines file to append results to. Defaults to stdout."
+    )
+    heroes_parser.add_argument(
+        "--manifest",
+        help="File with hashes of processed replays. Replays listed there are skipped.",
+    )
+    heroes_parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    heroes_parser.set_defaults(command=heroes)
+
+    api_parser = subparsers.add_parser(
+        "api", help="Serve the JSON read API (see app.read_api)."
+    )
+    api_parser.add_argument("action", choices=["serve"])
+    api_parser.add_argument("--host", default="127.0.0.1")
+    api_parser.add_argument("--port", type=int, default=8502)
+    _add_url_argument(api_parser)
+    api_parser.set_defaults(command=api)
+
+    args = parser.parse_args(args)
+    args.command(args)
+
+
+if __name__ == "__main__":
+    main()
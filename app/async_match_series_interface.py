@@ -0,0 +1,278 @@
+"""
+Async Match Series Interface
+----------------------------
+This module defines :py:class:`AsyncMatchSeriesManager`, a counterpart of
+:py:class:`~app.match_series_interface.MatchSeriesManager` built on SQLAlchemy's asyncio extension,
+so that the CLI, background workers or an API can serve many concurrent requests in one process
+without a thread per request::
+
+    engine = create_async_engine("sqlite+aiosqlite:///match_series.db")
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with async_session() as session:
+        manager = await AsyncMatchSeriesManager.load(session, id, edit_key)
+        await manager.set_hero_bans(["cho"], [])
+
+Requires an async driver (`aiosqlite` or `asyncpg`).
+Both managers share tables, ban events and optimistic concurrency control,
+so they can edit the same database at the same time.
+The schema is not created here, use `python -m app schema upgrade`.
+"""
+import asyncio
+import random
+from typing import Awaitable, Callable, Iterable, Optional
+
+from sqlalchemy import insert, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+
+from app.ban_set import BanSet
+from app.match_series_interface import (
+    EDIT_RETRY_DELAY,
+    MAX_EDIT_ATTEMPTS,
+    SERIES_VIEW_CACHE,
+    EditConflictError,
+    GameBans,
+    MatchSeries,
+    MatchSeriesView,
+    _ban_tail_stmt,
+    _hero_bans_changes,
+    _new_match_series,
+    _next_game_stmt,
+    _pre_ban_events,
+    _stage_edit,
+    apply_ban_events,
+    ban_events_table,
+    match_series_table,
+)
+from app.rate_limit import CREATE_RATE_LIMITER, RateLimitExceeded, TokenBucketLimiter
+from app.series_events import SERIES_EVENTS
+
+VIEWS_BATCH_SIZE = 500
+"""Maximum number of series loaded by one query of :py:meth:`AsyncMatchSeriesManager.get_views`."""
+
+
+async def _refresh_expired(session: AsyncSession, match_series: MatchSeries):
+    """
+    Reload attributes expired by a commit or rollback (lazy loading is not possible with asyncio).
+    """
+    if inspect(match_series).expired_attributes:
+        await session.refresh(match_series)
+
+
+class AsyncMatchSeriesManager:
+    """
+    Class managing one match series with an :py:class:`~sqlalchemy.ext.asyncio.AsyncSession`.
+
+    Use :py:meth:`load` to create instances.
+    """
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        match_series: MatchSeries,
+        edit_key: Optional[str] = None,
+    ):
+        self.session = session
+        self.match_series = match_series
+        """A MatchSeries instance for the ID."""
+        self.edit_permission = (
+            edit_key is not None and match_series.edit_key == edit_key
+        )
+        """Whether edit permission is granted to this manager."""
+        self._bans_version: Optional[int] = None
+        """Version of the series loaded bans are from (or newer)."""
+
+    @classmethod
+    async def load(
+        cls, session: AsyncSession, id: str, edit_key: Optional[str] = None
+    ) -> "AsyncMatchSeriesManager":
+        """
+        Load a series and its current bans.
+
+        :raises sqlalchemy.exc.NoResultFound: If there is no series with the ID.
+        """
+        stmt = select(MatchSeries).where(MatchSeries.id == id)
+        manager = cls(session, (await session.scalars(stmt)).one(), edit_key)
+        await manager._load_banned_heroes()
+        return manager
+
+    def _check_edit_permission(self):
+        if not self.edit_permission:
+            raise RuntimeError("Insufficient permissions to edit match series.")
+
+    async def _load_banned_heroes(self):
+        """
+        Reload bans unless they are as of the current version of the series.
+        """
+        match_series = self.match_series
+        await _refresh_expired(self.session, match_series)
+        if match_series.version == self._bans_version:
+            return
+        self._bans_version = match_series.version
+        result = await self.session.execute(
+            _ban_tail_stmt(match_series.id, match_series.snapshot_version)
+        )
+        match_series._banned_heroes = apply_ban_events(
+            BanSet.from_bytes(match_series._banned_mask), result.tuples()
+        )
+
+    async def _edit(
+        self, changes: Callable[[BanSet], Awaitable[tuple[BanSet, list[dict]]]]
+    ):
+        """
+        Append ban events as a new version of the series and commit.
+
+        See :py:meth:`MatchSeriesManager._edit <app.match_series_interface.MatchSeriesManager._edit>`.
+
+        :param changes: Coroutine function taking current bans and returning bans after the edit and its events.
+        :raises EditConflictError: If every attempt conflicted with another edit.
+        """
+        match_series = self.match_series
+        self.session.add(match_series)
+        for attempt in range(MAX_EDIT_ATTEMPTS):
+            await self._load_banned_heroes()
+            banned_heroes, events = await changes(match_series.banned_heroes)
+            if not events:
+                return
+            rows = _stage_edit(match_series, banned_heroes, events)
+            await self.session.execute(insert(ban_events_table), rows)
+            try:
+                await self.session.commit()
+            except StaleDataError:
+                await self.session.rollback()
+                await asyncio.sleep(random.uniform(0, EDIT_RETRY_DELAY * (attempt + 1)))
+                continue
+            version = rows[0]["version"]
+            await _refresh_expired(self.session, match_series)
+            match_series._banned_heroes = banned_heroes
+            self._bans_version = version
+            SERIES_VIEW_CACHE.invalidate(match_series.id)
+            SERIES_EVENTS.publish(match_series.id, version)
+            return
+        raise EditConflictError(
+            f"Could not edit match series {match_series.id} "
+            f"because of concurrent edits, please try again."
+        )
+
+    async def set_hero_bans(
+        self,
+        ban_heroes: Iterable[str],
+        unban_heroes: Iterable[str],
+        games: Iterable[GameBans] = (),
+    ):
+        """
+        Ban heroes from `games` (in order), then heroes from `ban_heroes`,
+        then unban heroes from `unban_heroes`.
+
+        See :py:meth:`MatchSeriesManager.set_hero_bans <app.match_series_interface.MatchSeriesManager.set_hero_bans>`.
+
+        :raises RuntimeError: If this manager does not have permission to edit bans.
+        :raises ValueError: If any of the heroes is not in `HEROES_DICT`.
+        :raises EditConflictError: If the edit kept conflicting with concurrent edits.
+        """
+        self._check_edit_permission()
+        ban_heroes = BanSet(ban_heroes)
+        unban_heroes = BanSet(unban_heroes)
+        games = list(games)
+
+        async def changes(banned_heroes: BanSet) -> tuple[BanSet, list[dict]]:
+            first_game = 1
+            if games:
+                stmt = _next_game_stmt(self.match_series.id)
+                first_game = (await self.session.execute(stmt)).scalar() + 1
+            return _hero_bans_changes(
+                banned_heroes, ban_heroes, unban_heroes, games, first_game
+            )
+
+        await self._edit(changes)
+
+    @staticmethod
+    async def create_new(
+        session: AsyncSession,
+        name: str,
+        pre_banned_heroes: Iterable[str],
+        client_id: Optional[str] = None,
+        limiter: Optional[TokenBucketLimiter] = CREATE_RATE_LIMITER,
+    ) -> MatchSeries:
+        """
+        Create new MatchSeries.
+
+        :param session: SQLAlchemy async session.
+        :param name: Name of the series.
+        :param pre_banned_heroes: An iterable with pre-banned heroes.
+        :param client_id: Identity of the client to rate limit
+            (see :py:meth:`MatchSeriesManager.create_new <app.match_series_interface.MatchSeriesManager.create_new>`).
+        :param limiter: Rate limiter of series creation, None for trusted callers.
+        :raises app.rate_limit.RateLimitExceeded: If the client created too many series recently.
+        :return: A MatchSeries instance.
+        """
+        if limiter is not None:
+            try:
+                await limiter.consume_async(session, client_id)
+            except RateLimitExceeded:
+                await session.rollback()
+                raise
+        match_series = _new_match_series(name, pre_banned_heroes)
+        session.add(match_series)
+        await session.flush()
+        events = _pre_ban_events([(match_series.id, match_series.banned_heroes)])
+        if events:
+            await session.execute(insert(ban_events_table), events)
+        await session.commit()
+        await _refresh_expired(session, match_series)
+        return match_series
+
+    @staticmethod
+    async def get_views(
+        session: AsyncSession, ids: Iterable[str]
+    ) -> dict[str, MatchSeriesView]:
+        """
+        Return read-only views of many series with two queries per :py:data:`VIEWS_BATCH_SIZE` series.
+
+        :param session: SQLAlchemy async session.
+        :param ids: IDs of the series.
+        :return: Views by series ID. Series that do not exist are left out.
+        """
+        ids = list(dict.fromkeys(ids))
+        views = {}
+        for start in range(0, len(ids), VIEWS_BATCH_SIZE):
+            batch = ids[start : start + VIEWS_BATCH_SIZE]
+            series_stmt = select(
+                match_series_table.c.id,
+                match_series_table.c.name,
+                match_series_table.c.banned_mask,
+                match_series_table.c.version,
+            ).where(match_series_table.c.id.in_(batch))
+            rows = (await session.execute(series_stmt)).all()
+
+            tails_stmt = (
+                select(
+                    ban_events_table.c.series_id,
+                    ban_events_table.c.hero,
+                    ban_events_table.c.op,
+                )
+                .join(
+                    match_series_table,
+                    match_series_table.c.id == ban_events_table.c.series_id,
+                )
+                .where(
+                    ban_events_table.c.series_id.in_(batch),
+                    ban_events_table.c.version > match_series_table.c.snapshot_version,
+                )
+                .order_by(ban_events_table.c.version, ban_events_table.c.id)
+            )
+            tails: dict[str, list[tuple[str, str]]] = {}
+            for series_id, hero, op in await session.execute(tails_stmt):
+                tails.setdefault(series_id, []).append((hero, op))
+
+            for row in rows:
+                views[row.id] = MatchSeriesView(
+                    row.id,
+                    row.name,
+                    apply_ban_events(
+                        BanSet.from_bytes(row.banned_mask), tails.get(row.id, ())
+                    ),
+                    row.version,
+                )
+        return views
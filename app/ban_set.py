@@ -0,0 +1,148 @@
+"""
+Ban Set
+-------
+This module defines :py:class:`BanSet`, an immutable set of heroes backed by an integer bitmask.
+
+Bit positions are the stable `index` values from `HEROES_DICT`,
+so the same mask can be persisted and read back after new heroes are added.
+"""
+from collections.abc import Set
+from typing import Iterable, Iterator
+
+from app.heroes import HEROES_DICT
+
+_HERO_BITS: dict[str, int] = {
+    hero_name: 1 << hero["index"] for hero_name, hero in HEROES_DICT.items()
+}
+"""Bit of every hero (in `HEROES_DICT` order)."""
+
+_HERO_BITS_ORDERED = tuple(_HERO_BITS.items())
+
+_ALL_MASK = sum(_HERO_BITS.values())
+
+CHO_GALL_MASK = _HERO_BITS["cho"] | _HERO_BITS["gall"]
+"""Cho and Gall share a ban: a set containing either half always contains both."""
+
+
+def _pair_cho_gall(mask: int) -> int:
+    if mask & CHO_GALL_MASK:
+        return mask | CHO_GALL_MASK
+    return mask
+
+
+class BanSet(Set):
+    """
+    Immutable set of hero names (keys of `HEROES_DICT`).
+
+    Supports O(1) membership tests and length, union / difference / intersection
+    via integer operations and iteration in `HEROES_DICT` order.
+    Compares equal to regular sets with the same heroes.
+
+    :param heroes: Hero names.
+    :raises ValueError: If any of the heroes is not in `HEROES_DICT`.
+    """
+
+    __slots__ = ("_mask",)
+
+    def __init__(self, heroes: Iterable[str] = ()):
+        mask = 0
+        for hero in heroes:
+            bit = _HERO_BITS.get(hero)
+            if bit is None:
+                raise ValueError(f"Unknown hero: {hero!r}.")
+            mask |= bit
+        self._mask = _pair_cho_gall(mask)
+
+    @classmethod
+    def from_mask(cls, mask: int) -> "BanSet":
+        """
+        Create a set from a bitmask. Unknown bits are dropped.
+        """
+        ban_set = cls.__new__(cls)
+        ban_set._mask = _pair_cho_gall(mask & _ALL_MASK)
+        return ban_set
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "BanSet":
+        """
+        Create a set from the output of :py:meth:`to_bytes`.
+        """
+        return cls.from_mask(int.from_bytes(data or b"", "little"))
+
+    @classmethod
+    def all(cls) -> "BanSet":
+        """
+        Set of all heroes.
+        """
+        return _ALL
+
+    @property
+    def mask(self) -> int:
+        return self._mask
+
+    def to_bytes(self) -> bytes:
+        """
+        Return the bitmask as little-endian bytes.
+        """
+        return self._mask.to_bytes((self._mask.bit_length() + 7) // 8, "little")
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        return cls(iterable)
+
+    @staticmethod
+    def _mask_of(other) -> int:
+        if isinstance(other, BanSet):
+            return other._mask
+        return BanSet(other)._mask
+
+    def __contains__(self, hero) -> bool:
+        return bool(self._mask & _HERO_BITS.get(hero, 0))
+
+    def __iter__(self) -> Iterator[str]:
+        mask = self._mask
+        return (hero for hero, bit in _HERO_BITS_ORDERED if mask & bit)
+
+    def __len__(self) -> int:
+        return self._mask.bit_count()
+
+    def __or__(self, other: Iterable[str]) -> "BanSet":
+        return BanSet.from_mask(self._mask | self._mask_of(other))
+
+    def __and__(self, other: Iterable[str]) -> "BanSet":
+        return BanSet.from_mask(self._mask & self._mask_of(other))
+
+    def __sub__(self, other: Iterable[str]) -> "BanSet":
+        return BanSet.from_mask(self._mask & ~self._mask_of(other))
+
+    def __rsub__(self, other: Iterable[str]) -> "BanSet":
+        return BanSet.from_mask(self._mask_of(other) & ~self._mask)
+
+    __ror__ = __or__
+    __rand__ = __and__
+
+    def union(self, *others: Iterable[str]) -> "BanSet":
+        result = self
+        for other in others:
+            result = result | other
+        return result
+
+    def difference(self, *others: Iterable[str]) -> "BanSet":
+        result = self
+        for other in others:
+            result = result - other
+        return result
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, BanSet):
+            return self._mask == other._mask
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        return self._hash()
+
+    def __repr__(self) -> str:
+        return f"BanSet({list(self)!r})"
+
+
+_ALL = BanSet.from_mask(_ALL_MASK)
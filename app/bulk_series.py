@@ -0,0 +1,196 @@
+"""
+Bulk Series
+-----------
+This module parses lists of match series to create in bulk
+(see :py:meth:`~app.match_series_interface.MatchSeriesManager.create_many`)
+and formats links to the created series.
+
+Series lists are either CSV with a `name` column and an optional `pre_bans` column
+(hero names separated by semicolons)::
+
+    name,pre_bans
+    ASH vs. Raiders,cho;Li-Ming
+    Winners Final,
+
+or JSON: a list of series names or of objects with `name` and optional `pre_bans` (a list of hero names)::
+
+    [{"name": "ASH vs. Raiders", "pre_bans": ["cho", "Li-Ming"]}, "Winners Final"]
+
+Hero names are cleaned with :py:func:`~app.heroes.clean_hero_name`.
+Lists of more than :py:data:`MAX_BULK_SERIES` series are rejected.
+"""
+import csv
+import io
+import json
+from typing import Iterable, NamedTuple
+
+from app.ban_set import BanSet
+from app.heroes import HEROES_DICT, clean_hero_name
+from app.match_series_interface import CreatedMatchSeries
+
+VIEW_PAGE_PATH = "/View_Match_Series"
+
+MAX_NAME_LENGTH = 50
+"""Maximum length of a series name (same as on the Create page)."""
+
+MAX_BULK_SERIES = 1000
+"""Maximum number of series in one list."""
+
+
+class SeriesSpec(NamedTuple):
+    """
+    Series to create.
+    """
+
+    name: str
+    pre_banned_heroes: BanSet
+
+
+def parse_hero_names(names: Iterable[str]) -> BanSet:
+    """
+    Clean hero names and return them as a set.
+
+    :raises ValueError: If any of the names is not recognized.
+    """
+    names = [name for name in names if name.strip()]
+    incorrect_names = [
+        name for name in names if clean_hero_name(name) not in HEROES_DICT
+    ]
+    if incorrect_names:
+        raise ValueError(f"Unknown heroes: {', '.join(incorrect_names)}.")
+    return BanSet(clean_hero_name(name) for name in names)
+
+
+def _check_series_count(count: int):
+    if count > MAX_BULK_SERIES:
+        raise ValueError(
+            f"Series list has more than {MAX_BULK_SERIES} series, please split it."
+        )
+
+
+def _series_spec(
+    line: int, name: str, pre_bans: Iterable[str], default_pre_bans: BanSet
+) -> SeriesSpec:
+    name = (name or "").strip()
+    if not name:
+        raise ValueError(f"Series {line}: name is empty.")
+    if len(name) > MAX_NAME_LENGTH:
+        raise ValueError(
+            f"Series {line}: name is longer than {MAX_NAME_LENGTH} characters."
+        )
+    try:
+        pre_banned_heroes = parse_hero_names(pre_bans)
+    except ValueError as error:
+        raise ValueError(f"Series {line}: {error}") from None
+    return SeriesSpec(name, pre_banned_heroes | default_pre_bans)
+
+
+def parse_series_csv(
+    text: str, default_pre_bans: Iterable[str] = ()
+) -> list[SeriesSpec]:
+    """
+    Parse a CSV series list.
+
+    :param text: CSV contents.
+    :param default_pre_bans: Heroes pre-banned in every series.
+    :raises ValueError: If the list is malformed, contains unknown heroes
+        or has more than :py:data:`MAX_BULK_SERIES` series.
+    """
+    default_pre_bans = parse_hero_names(default_pre_bans)
+    reader = csv.DictReader(io.StringIO(text))
+    if reader.fieldnames is None or "name" not in reader.fieldnames:
+        raise ValueError("CSV series list must have a `name` column.")
+
+    series = []
+    for line, row in enumerate(reader, start=1):
+        _check_series_count(line)
+        series.append(
+            _series_spec(
+                line,
+                row["name"],
+                (row.get("pre_bans") or "").split(";"),
+                default_pre_bans,
+            )
+        )
+    return series
+
+
+def parse_series_json(
+    text: str, default_pre_bans: Iterable[str] = ()
+) -> list[SeriesSpec]:
+    """
+    Parse a JSON series list.
+
+    :param text: JSON contents.
+    :param default_pre_bans: Heroes pre-banned in every series.
+    :raises ValueError: If the list is malformed, contains unknown heroes
+        or has more than :py:data:`MAX_BULK_SERIES` series.
+    """
+    default_pre_bans = parse_hero_names(default_pre_bans)
+    items = json.loads(text)
+    if not isinstance(items, list):
+        raise ValueError("JSON series list must be a list.")
+    _check_series_count(len(items))
+
+    series = []
+    for line, item in enumerate(items, start=1):
+        if isinstance(item, str):
+            item = {"name": item}
+        if not isinstance(item, dict) or not isinstance(item.get("pre_bans", []), list):
+            raise ValueError(
+                f"Series {line}: expected a name or an object with `name` and `pre_bans`."
+            )
+        series.append(
+            _series_spec(
+                line, item.get("name"), item.get("pre_bans", []), default_pre_bans
+            )
+        )
+    return series
+
+
+def parse_series_file(
+    file_name: str, text: str, default_pre_bans: Iterable[str] = ()
+) -> list[SeriesSpec]:
+    """
+    Parse a series list choosing the format by the extension of `file_name` (`.json` or CSV otherwise).
+    """
+    if file_name.lower().endswith(".json"):
+        return parse_series_json(text, default_pre_bans)
+    return parse_series_csv(text, default_pre_bans)
+
+
+def series_links(
+    match_series: CreatedMatchSeries, base_url: str = ""
+) -> dict[str, str]:
+    """
+    Return view and edit links of a series.
+
+    :param base_url: URL of the app. Links are relative if empty.
+    """
+    view_link = f"{base_url.rstrip('/')}{VIEW_PAGE_PATH}?id={match_series.id}"
+    return {
+        "view_link": view_link,
+        "edit_link": f"{view_link}&edit_key={match_series.edit_key}",
+    }
+
+
+def series_links_csv(created: Iterable[CreatedMatchSeries], base_url: str = "") -> str:
+    """
+    Return a CSV file with name, number of pre-banned heroes, view and edit links of every series.
+
+    :param base_url: URL of the app. Links are relative if empty.
+    """
+    output = io.StringIO()
+    writer = csv.DictWriter(
+        output, ["name", "banned_heroes", "view_link", "edit_link"], lineterminator="\n"
+    )
+    writer.writeheader()
+    for match_series in created:
+        writer.writerow(
+            {
+                "name": match_series.name,
+                "banned_heroes": len(match_series.banned_heroes),
+                **series_links(match_series, base_url),
+            }
+        )
+    return output.getvalue()
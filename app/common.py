@@ -1,8 +1,22 @@
+import hmac
+import threading
+import time
 from contextlib import contextmanager
+from typing import Optional
 
 import streamlit as st
+from sqlalchemy.exc import NoResultFound, SQLAlchemyError
+from sqlalchemy.orm import Session
+from streamlit import runtime
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.web.server.browser_websocket_handler import BrowserWebSocketHandler
 
-from app.match_series_interface import _mapper_registry
+from app.match_series_interface import MatchSeriesManager
+from app.protocols import PROTOCOLS
+from app.replay_cache import ReplayCache
+from app.schema import check_schema_version, upgrade_schema
+from app.series_events import SERIES_EVENTS
 
 
 def align_headers():
@@ -21,11 +35,178 @@ def align_headers():
     st.write(style, unsafe_allow_html=True)
 
 
+def is_admin() -> bool:
+    """
+    Return whether the page was opened with the `admin_key` query parameter
+    equal to `admin.key` in secrets. Always false if the key is not set.
+
+    A valid key is remembered for the session,
+    so pages may clear query parameters without losing admin access on reruns.
+    """
+    if st.session_state.get("is_admin", False):
+        return True
+    key = st.secrets.get("admin", {}).get("key", "")
+    given_keys = st.experimental_get_query_params().get("admin_key", [])
+    admin = bool(key) and any(
+        hmac.compare_digest(given_key, key) for given_key in given_keys
+    )
+    if admin:
+        st.session_state["is_admin"] = True
+    return admin
+
+
+def client_id() -> Optional[str]:
+    """
+    Return the identity of the client for rate limits: the IP address of its connection or,
+    if `rate_limit.trusted_proxy` is true in secrets, the last `X-Forwarded-For` entry
+    (added by the reverse proxy in front of the app).
+    Clients sending their own `X-Forwarded-For` cannot choose their identity otherwise.
+
+    None if the address is unknown (e.g. a script run by `streamlit.testing`).
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None or not runtime.exists():
+        return None
+    client = runtime.get_instance().get_client(ctx.session_id)
+    if not isinstance(client, BrowserWebSocketHandler):
+        return None
+    request = client.request
+
+    if st.secrets.get("rate_limit", {}).get("trusted_proxy", False):
+        forwarded_for = (
+            request.headers.get("X-Forwarded-For", "").split(",")[-1].strip()
+        )
+        if forwarded_for:
+            return forwarded_for
+    return request.remote_ip
+
+
+@st.cache_resource
+def _prepare_schema():
+    """
+    Upgrade (or, if `schema.auto_upgrade` is false in secrets, only check)
+    the database schema. Runs once per process.
+    """
+    conn = st.connection("match_series", type="sql")
+
+    if st.secrets.get("schema", {}).get("auto_upgrade", True):
+        upgrade_schema(conn.engine)
+    else:
+        check_schema_version(conn.engine)
+
+
 @contextmanager
 def db_connection():
     conn = st.connection("match_series", type="sql")
+    _prepare_schema()
 
     with conn.session as session:
-        _mapper_registry.metadata.create_all(conn.engine)
-
         yield session
+
+
+@st.cache_resource
+def replay_cache() -> ReplayCache:
+    """
+    Process-wide replay cache persisted in the match series database.
+    """
+    conn = st.connection("match_series", type="sql")
+    _prepare_schema()
+
+    return ReplayCache(conn.engine)
+
+
+@st.cache_resource
+def preload_protocols() -> threading.Thread:
+    """
+    Import protocol modules of recently uploaded replays in a background thread.
+
+    Builds listed under `protocols.preload_builds` in secrets are imported as well.
+    Runs once per process.
+    """
+    builds = list(st.secrets.get("protocols", {}).get("preload_builds", []))
+    builds.extend(replay_cache().recent_builds())
+
+    thread = threading.Thread(
+        target=PROTOCOLS.preload, args=(builds,), name="preload_protocols", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def rerun_on_series_change(series_id: str, version: int):
+    """
+    Rerun the page of the current browser session, as if the user interacted with it,
+    once a version of a series newer than `version` is published to
+    :py:data:`~app.series_events.SERIES_EVENTS`. The script does not keep running meanwhile.
+
+    Does nothing outside browser sessions (e.g. in a script run by `streamlit.testing`).
+    """
+    ctx = get_script_run_ctx()
+    if ctx is None or not runtime.exists():
+        return
+    instance = runtime.get_instance()
+    if not isinstance(instance.get_client(ctx.session_id), BrowserWebSocketHandler):
+        return
+
+    # the message a browser sends to rerun the page, keeping widget values
+    message = BackMsg()
+    message.rerun_script.query_string = ctx.query_string
+    message.rerun_script.page_script_hash = ctx.page_script_hash
+    session_id = ctx.session_id
+    # sessions may only be handled on the event loop of the server
+    event_loop = instance._get_async_objs().eventloop
+
+    def rerun(new_version: int):
+        if instance.is_active_session(session_id):
+            event_loop.call_soon_threadsafe(
+                instance.handle_backmsg, session_id, message
+            )
+
+    SERIES_EVENTS.subscribe(session_id, series_id, version, rerun)
+    _series_version_poller()
+
+
+def stop_following_series():
+    """
+    Cancel :py:func:`rerun_on_series_change` of the current session.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        SERIES_EVENTS.unsubscribe(ctx.session_id)
+
+
+@st.cache_resource
+def _series_version_poller() -> threading.Thread:
+    """
+    Poll versions of series followed by browser sessions every `live_updates.poll_interval` seconds
+    in a background thread, so that edits made by other app processes are published too.
+    Subscriptions of closed sessions are dropped. Runs once per process.
+    """
+    conn = st.connection("match_series", type="sql")
+    poll_interval = st.secrets.get("live_updates", {}).get("poll_interval", 10)
+    instance = runtime.get_instance()
+
+    def poll():
+        while True:
+            time.sleep(poll_interval)
+            for session_id in SERIES_EVENTS.subscribers():
+                if not instance.is_active_session(session_id):
+                    SERIES_EVENTS.unsubscribe(session_id)
+            series_ids = SERIES_EVENTS.subscribed_series()
+            if not series_ids:
+                continue
+            try:
+                with Session(conn.engine) as session:
+                    for series_id in series_ids:
+                        try:
+                            # publishes the version if it changed
+                            MatchSeriesManager.get_version(session, series_id)
+                        except NoResultFound:
+                            pass
+            except SQLAlchemyError:
+                # e.g. the database is briefly unavailable, try again at the next poll
+                continue
+
+    thread = threading.Thread(target=poll, name="series_version_poller", daemon=True)
+    thread.start()
+    return thread
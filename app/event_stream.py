@@ -0,0 +1,116 @@
+"""
+Event Stream
+------------
+This module contains an incremental decoder for replay event streams.
+
+heroprotocol decoders expect the whole decompressed file in memory.
+The buffer defined here pulls decompressed chunks from :py:meth:`~app.mpq.MPQReader.iter_file` on demand,
+so a consumer that stops iterating early never reads or decompresses the rest of the file.
+"""
+from dataclasses import dataclass
+from typing import Iterator
+
+from heroprotocol.decoders import BitPackedBuffer, VersionedDecoder
+
+from app.mpq import MPQReader
+
+
+@dataclass
+class StreamStats:
+    """
+    Amount of work done by :py:func:`iter_tracker_events`.
+    """
+
+    archive_bytes_read: int = 0
+    """Compressed bytes read from the archive."""
+    bytes_decoded: int = 0
+    """Decompressed bytes consumed by the decoder."""
+    bytes_decompressed: int = 0
+    """Decompressed bytes pulled from the archive (may exceed `bytes_decoded` by one chunk)."""
+    file_size: int = 0
+    """Decompressed size of the whole file."""
+    events_decoded: int = 0
+    """Number of events yielded."""
+
+
+class StreamingBitPackedBuffer(BitPackedBuffer):
+    """
+    :py:class:`heroprotocol.decoders.BitPackedBuffer` that reads its contents from an iterator of chunks.
+
+    Consumed bytes are dropped whenever a new chunk is appended.
+
+    :param chunks: Iterator of byte strings.
+    """
+
+    def __init__(self, chunks: Iterator[bytes], endian="big"):
+        super().__init__(b"", endian)
+        self._data = b""
+        self._chunks = chunks
+        self._offset = 0
+        """Position of `_data` in the stream."""
+        self.bytes_pulled = 0
+
+    def _fill(self, size: int) -> bool:
+        """
+        Make sure at least `size` unread bytes are buffered.
+
+        :return: Whether enough bytes are available.
+        """
+        while len(self._data) - self._used < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return False
+            self.bytes_pulled += len(chunk)
+            self._offset += self._used
+            self._data = self._data[self._used :] + chunk
+            self._used = 0
+        return True
+
+    def done(self):
+        return self._nextbits == 0 and not self._fill(1)
+
+    def used_bits(self):
+        return (self._offset + self._used) * 8 - self._nextbits
+
+    def read_aligned_bytes(self, bytes):
+        self.byte_align()
+        self._fill(bytes)
+        return super().read_aligned_bytes(bytes)
+
+    def read_bits(self, bits):
+        self._fill((bits - self._nextbits + 7) // 8)
+        return super().read_bits(bits)
+
+
+def iter_tracker_events(archive: MPQReader, protocol, stats: StreamStats = None):
+    """
+    Decode and yield tracker events one by one.
+
+    Decompresses `replay.tracker.events` only as far as the consumer iterates.
+
+    :param archive: First item of :py:func:`~app.heroes.get_archive_protocol`.
+    :param protocol: Second item of :py:func:`~app.heroes.get_archive_protocol`.
+    :param stats: Optional :py:class:`StreamStats` updated after every event.
+    """
+    if stats is None:
+        stats = StreamStats()
+    block_entry = archive.get_block_table_entry("replay.tracker.events")
+    stats.file_size = block_entry.size if block_entry is not None else 0
+    bytes_read_before = archive.bytes_read
+
+    buffer = StreamingBitPackedBuffer(archive.iter_file("replay.tracker.events"))
+    decoder = VersionedDecoder(b"", protocol.typeinfos)
+    decoder._buffer = buffer
+
+    events = protocol._decode_event_stream(
+        decoder,
+        protocol.tracker_eventid_typeid,
+        protocol.tracker_event_types,
+        decode_user_id=False,
+    )
+    for event in events:
+        stats.events_decoded += 1
+        stats.bytes_decoded = buffer.used_bits() // 8
+        stats.bytes_decompressed = buffer.bytes_pulled
+        stats.archive_bytes_read = archive.bytes_read - bytes_read_before
+        yield event
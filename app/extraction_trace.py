@@ -0,0 +1,178 @@
+"""
+Extraction Trace
+----------------
+This module defines timing traces of hero extraction.
+
+Every call of :py:func:`~app.heroes.extract_heroes_from_replay`
+(and every replay of :py:func:`~app.heroes.extract_heroes_from_replays`)
+produces an :py:class:`ExtractionTrace` that is passed to every registered hook.
+Traces of replays parsed in worker processes are sent back with the results
+and emitted in the calling process.
+
+By default traces are logged at debug level (logger `app.extraction`)
+and recorded in :py:data:`TRACE_SUMMARY`, a rolling summary of recent extractions.
+"""
+import logging
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+STAGES = (
+    "read",
+    "cache_lookup",
+    "mpq_open",
+    "header_decode",
+    "protocol_import",
+    "details",
+    "init_data",
+    "tracker_events",
+)
+"""Stages that can appear in a trace, in the order they run."""
+
+logger = logging.getLogger("app.extraction")
+
+
+@dataclass
+class ExtractionTrace:
+    """
+    Timings and outcome of extracting heroes from one replay.
+    """
+
+    stages: dict[str, float] = field(default_factory=dict)
+    """Seconds spent in every stage that ran (see :py:data:`STAGES`)."""
+    bytes_read: int = 0
+    """Archive bytes read while decoding files."""
+    method: Optional[str] = None
+    """Path that succeeded: "details", "tracker_events" or "cache". None if extraction failed."""
+    base_build: Optional[int] = None
+    error: Optional[str] = None
+    """Value of :py:class:`~app.heroes.ExtractionErrorCategory` if extraction failed."""
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Add the time spent in the `with` block to stage `name`.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (
+                time.perf_counter() - start
+            )
+
+    @property
+    def total(self) -> float:
+        """Total seconds spent in all stages."""
+        return sum(self.stages.values())
+
+
+TraceHook = Callable[[ExtractionTrace], None]
+
+_hooks: list[TraceHook] = []
+
+
+def add_trace_hook(hook: TraceHook):
+    """
+    Call `hook` with every emitted trace (e.g. to export metrics).
+    """
+    _hooks.append(hook)
+
+
+def remove_trace_hook(hook: TraceHook):
+    _hooks.remove(hook)
+
+
+def emit_trace(trace: ExtractionTrace):
+    """
+    Pass a trace to every registered hook. Exceptions raised by hooks are logged and ignored.
+    """
+    for hook in list(_hooks):
+        try:
+            hook(trace)
+        except Exception:
+            logger.exception("Extraction trace hook %r failed.", hook)
+
+
+def log_trace(trace: ExtractionTrace):
+    """
+    Hook logging a trace at debug level.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "method=%s base_build=%s bytes_read=%d total=%.1fms %s%s",
+            trace.method,
+            trace.base_build,
+            trace.bytes_read,
+            trace.total * 1000,
+            " ".join(
+                f"{stage}={seconds * 1000:.1f}ms"
+                for stage, seconds in trace.stages.items()
+            ),
+            f" error={trace.error!r}" if trace.error else "",
+        )
+
+
+class TraceSummary:
+    """
+    Rolling summary of the most recent traces.
+
+    :param max_traces: Number of traces to keep.
+    """
+
+    def __init__(self, max_traces: int = 500):
+        self._traces: deque[ExtractionTrace] = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+
+    def record(self, trace: ExtractionTrace):
+        """
+        Hook adding a trace to the summary.
+        """
+        with self._lock:
+            self._traces.append(trace)
+
+    def summary(self) -> dict:
+        """
+        Return number of traces, counts of methods, errors and base builds,
+        mean bytes read and mean / p95 / max milliseconds per stage.
+        """
+        with self._lock:
+            traces = list(self._traces)
+
+        stages = {}
+        for stage in ("total", *STAGES):
+            durations = sorted(
+                trace.total if stage == "total" else trace.stages[stage]
+                for trace in traces
+                if stage == "total" or stage in trace.stages
+            )
+            if durations:
+                stages[stage] = {
+                    "count": len(durations),
+                    "mean_ms": sum(durations) / len(durations) * 1000,
+                    "p95_ms": durations[int((len(durations) - 1) * 0.95)] * 1000,
+                    "max_ms": durations[-1] * 1000,
+                }
+
+        return {
+            "traces": len(traces),
+            "methods": Counter(trace.method or "failed" for trace in traces),
+            "errors": Counter(trace.error for trace in traces if trace.error),
+            "base_builds": Counter(
+                trace.base_build for trace in traces if trace.base_build is not None
+            ),
+            "mean_bytes_read": (
+                sum(trace.bytes_read for trace in traces) / len(traces) if traces else 0
+            ),
+            "stages": stages,
+        }
+
+
+TRACE_SUMMARY = TraceSummary()
+"""Process-wide summary of recent extractions (registered as a hook by default)."""
+
+add_trace_hook(log_trace)
+add_trace_hook(TRACE_SUMMARY.record)
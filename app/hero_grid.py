@@ -0,0 +1,234 @@
+"""
+Hero Grid
+---------
+This module renders the hero grid of the View page as HTML.
+
+Tiles, whole grids and the stylesheet are memoized on their parameters,
+so a rerun that does not change bans or filters is a few cache lookups.
+
+Icons are drawn from sprite sheets (see :py:mod:`app.sprites`) when they are available.
+Tile positions are percentages of the sheet, so tiles do not depend on the icon size;
+the stylesheet picks the sheet to use.
+"""
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from app.ban_set import BanSet
+from app.heroes import HEROES_DICT
+from app.sprites import get_sprite_map
+
+BAN_FILTERS = ("Banned Only", "All", "Available Only")
+"""Options of the ban filter."""
+
+
+def _sprite(icon: str, classes: str, label: Optional[str] = None) -> Optional[str]:
+    """
+    Return a `div` showing `icon` from the sprite sheet or None if it is not in the sheet.
+    """
+    sprite_map = get_sprite_map()
+    if sprite_map is None or icon not in sprite_map["tiles"]:
+        return None
+
+    column, row = sprite_map["tiles"][icon]
+    x = column * 100 / max(sprite_map["columns"] - 1, 1)
+    y = row * 100 / max(sprite_map["rows"] - 1, 1)
+    aria = f' role="img" aria-label="{label}"' if label else ""
+    return (
+        f'<div class="{classes} sprite"{aria}'
+        f' style="background-position: {x:.4g}% {y:.4g}%"></div>'
+    )
+
+
+@lru_cache(maxsize=None)
+def hero_tile(hero_name: str, ban: bool = False, filtered: bool = False) -> str:
+    """
+    Return HTML image of a hero with a tooltip and an optional ban cross.
+
+    :param hero_name: Key of `HEROES_DICT`.
+    :param ban: Whether to add a ban cross.
+    :param filtered: Whether this image should have `filtered` class.
+    """
+    name = HEROES_DICT[hero_name]["name"]
+    hero_image = _sprite(name, "image", name) or (
+        f'<img class="image" src="app/static/{name}.png" alt="{name}">'
+    )
+    ban_image = ""
+    if ban:
+        ban_image = _sprite("ban", "image ban") or (
+            '<img class= "image ban" src="app/static/ban.png" alt="ban image">'
+        )
+
+    return (
+        f'<div class="hoverable{" filtered" if filtered else ""}">'
+        + hero_image
+        + ban_image
+        + f'<div class="tooltip">{name.replace("-", " ")}</div>'
+        "</div>"
+    )
+
+
+@lru_cache(maxsize=256)
+def _hero_grid(
+    banned_mask: int,
+    ban_filter: str,
+    cross_out_banned: bool,
+    role_filter: frozenset[str],
+    name_matches: Optional[frozenset[str]],
+) -> str:
+    banned_heroes = BanSet.from_mask(banned_mask)
+    unfiltered_tiles = []
+    filtered_tiles = []
+
+    for hero_name, hero in HEROES_DICT.items():
+        banned = hero_name in banned_heroes
+        if ban_filter == "Banned Only" and not banned:
+            continue
+        if ban_filter == "Available Only" and banned:
+            continue
+
+        filtered = (role_filter and hero["role"] not in role_filter) or (
+            name_matches is not None and hero_name not in name_matches
+        )
+
+        tile = hero_tile(hero_name, banned and cross_out_banned, bool(filtered))
+        (filtered_tiles if filtered else unfiltered_tiles).append(tile)
+
+    return (
+        '<div class="heroes">' + "".join(unfiltered_tiles + filtered_tiles) + "</div>"
+    )
+
+
+def hero_grid(
+    banned_heroes: Iterable[str],
+    ban_filter: str = "All",
+    cross_out_banned: bool = True,
+    role_filter: Iterable[str] = (),
+    name_matches: Optional[frozenset[str]] = None,
+) -> str:
+    """
+    Return HTML of the hero grid. Heroes that are filtered out are placed at the end.
+
+    :param banned_heroes: Banned heroes. Passing a :py:class:`~app.ban_set.BanSet` avoids a conversion.
+    :param ban_filter: One of :py:data:`BAN_FILTERS`.
+    :param cross_out_banned: Whether to draw a ban cross over banned heroes.
+    :param role_filter: Roles to keep. Empty to keep all roles.
+    :param name_matches: Heroes matching the name filter or None to keep all heroes.
+    """
+    if not isinstance(banned_heroes, BanSet):
+        banned_heroes = BanSet(banned_heroes)
+    return _hero_grid(
+        banned_heroes.mask,
+        ban_filter,
+        cross_out_banned,
+        frozenset(role_filter),
+        name_matches,
+    )
+
+
+@lru_cache(maxsize=64)
+def hero_grid_style(
+    image_width: int, grey_out_filtered: bool, hide_filters: bool
+) -> str:
+    """
+    Return the `<style>` block of the View page.
+
+    :param image_width: Width of hero tiles in pixels.
+    :param grey_out_filtered: Whether to grey out filtered heroes instead of hiding them.
+    :param hide_filters: Whether to hide the filters above the series name.
+    """
+    hide_filters_style = 'div[data-testid="stHorizontalBlock"]{display: none;}'
+
+    sprite_style = ""
+    sprite_map = get_sprite_map()
+    if sprite_map is not None:
+        sheet_sizes = sorted(int(size) for size in sprite_map["sheets"])
+        sheet_size = next(
+            (size for size in sheet_sizes if size >= image_width), sheet_sizes[-1]
+        )
+        sheets = sprite_map["sheets"][str(sheet_size)]
+        image_set = ", ".join(
+            f'url("app/static/sprites/{file_name}") type("image/{image_format}")'
+            for image_format, file_name in sheets.items()
+        )
+        # browsers without image-set() support ignore the second declaration
+        sprite_style = f"""
+.hoverable .sprite {{
+    height: {image_width}px;
+    background-image: url("app/static/sprites/{sheets["png"]}");
+    background-image: image-set({image_set});
+    background-size: {sprite_map["columns"] * 100}% {sprite_map["rows"] * 100}%;
+}}
+"""
+
+    if grey_out_filtered:
+        grey_out_filtered_style = """
+.filtered {
+    opacity: 0.3;
+}
+"""
+    else:
+        grey_out_filtered_style = """
+.filtered {
+    display: none;
+}
+"""
+
+    heroes_style = f"""
+.heroes {{
+    display: flex;
+    flex-direction: row;
+    flex-wrap: wrap;
+}}
+.hoverable {{
+    display: flex;
+    float: left;
+    position: relative;
+    margin: 6px;
+    width: {image_width}px;
+}}
+.hoverable .image {{
+    width: {image_width}px;
+    border-width: 3px;
+    border-style: solid;
+    border-color: black;
+}}
+.hoverable .ban {{
+    position: absolute;
+    margin-top: -100px;
+    margin-left: -100px;
+    top: 100px;
+    left: 100px;
+    opacity: 0.8;
+}}
+.hoverable .tooltip {{
+    opacity: 0;
+    position: absolute;
+    margin-top: -100px;
+    margin-left: -100px;
+    top: 100px;
+    left: 100px;
+    transition: opacity 0.5s;
+    background-color: rgba(0, 0, 0, 0.8);
+    color: #fff;
+    font-size: 18px;
+    text-align: center;
+}}
+.hoverable:hover .tooltip {{
+    opacity: 1;
+}}
+"""
+    hide_image_button_style = """
+button[title="View fullscreen"]{
+    visibility: hidden;
+}
+"""
+
+    return f"""
+<style>
+{hide_filters_style if hide_filters else ""}
+{hide_image_button_style}
+{heroes_style}
+{sprite_style}
+{grey_out_filtered_style}
+</style>
+"""
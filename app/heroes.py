@@ -5,28 +5,69 @@ This module contains functions for everything HotS related.
 It defines Hero dictionaries and functions for extracting data from replays.
 """
 import json
+from bisect import bisect_left
 from pathlib import Path
-from typing import Dict, TypedDict
+from typing import Dict, Iterable, NamedTuple, Optional, TypedDict
+import multiprocessing
 import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from contextlib import contextmanager
-
-from heroprotocol.versions import build, latest
-import mpyq
+from dataclasses import dataclass, field
+from enum import Enum
+from functools import lru_cache
+from io import BytesIO
+
+from app.event_stream import StreamStats, iter_tracker_events
+from app.extraction_trace import ExtractionTrace, emit_trace
+from app.mpq import MPQReader
+from app.protocols import PROTOCOLS
+from app.replay_cache import (
+    CachedExtraction,
+    CachedFailure,
+    ReplayCache,
+    replay_hash,
+)
 
 
 __heroes_file_path__ = Path(__file__).parent / "heroes.json"
 
 with open(__heroes_file_path__, "r") as __fd__:
     HEROES_DICT: Dict[
-        str, TypedDict("Hero", {"name": str, "role": str, "player_spawned_name": str})
+        str,
+        TypedDict(
+            "Hero",
+            {"name": str, "role": str, "player_spawned_name": str, "index": int},
+        ),
     ] = json.load(__fd__)
-    "Dictionary with information about heroes in the game."
+    """
+    Dictionary with information about heroes in the game.
+
+    `index` is the stable position of the hero in persisted ban bitmasks:
+    it must never change for an existing hero and new heroes must get a new index.
+    """
+
+if len({hero["index"] for hero in HEROES_DICT.values()}) != len(HEROES_DICT):
+    raise ValueError(f"Hero indexes in {__heroes_file_path__} are not unique.")
 
 PLAYER_SPAWNED_NAMES_MAP: Dict[str, str] = {
     hero["player_spawned_name"]: hero_name for hero_name, hero in HEROES_DICT.items()
 }
 "Reverse mapping from PlayerSpawned values to hero names."
 
+DRAFT_NAMES_MAP: Dict[str, str] = {
+    **{
+        hero["player_spawned_name"].removeprefix("Hero"): hero_name
+        for hero_name, hero in HEROES_DICT.items()
+    },
+    "DVa": "dva",
+    "LostVikings": "lostvikings",
+}
+"""Mapping from hero ids of draft tracker events (HeroBanned / HeroPicked) to hero names."""
+
+GAME_LOOPS_PER_SECOND = 16
+
 HERO_ROLES: set[str] = {hero["role"] for hero in HEROES_DICT.values()}
 """A set of all the hero roles found in the config file."""
 
@@ -43,8 +84,101 @@ def clean_hero_name(name: str) -> str:
     return clean_name.removeprefix("the")
 
 
+HERO_ALIASES: Dict[str, str] = {
+    "butch": "butcher",
+    "dw": "deathwing",
+    "elitetaurenchieftain": "etc",
+    "jim": "raynor",
+    "kt": "kelthuzad",
+    "ktz": "kelthuzad",
+    "lm": "liming",
+    "ming": "liming",
+    "morales": "ltmorales",
+    "sgt": "sgthammer",
+    "tlv": "lostvikings",
+    "vikings": "lostvikings",
+    "zj": "zuljin",
+}
+"""Common nicknames of heroes (mapped to keys of `HEROES_DICT`) recognized by :py:func:`search_heroes`."""
+
+
+class HeroSearchIndex:
+    """
+    Prefix index of hero names.
+
+    Keys are hero names, every part of hyphenated names (e.g. "hammer" for "sgt-hammer")
+    and aliases. They are kept in a sorted array, so a prefix lookup is a binary search.
+
+    :param heroes: Hero dictionary to index.
+    :param aliases: Mapping from aliases to keys of `heroes`.
+    """
+
+    def __init__(
+        self,
+        heroes: Dict[str, dict] = HEROES_DICT,
+        aliases: Dict[str, str] = HERO_ALIASES,
+    ):
+        entries = set()
+        for hero_name, hero in heroes.items():
+            entries.add((hero_name, hero_name))
+            for name_part in hero["name"].split("-"):
+                entries.add((name_part, hero_name))
+        for alias, hero_name in aliases.items():
+            entries.add((clean_hero_name(alias), hero_name))
+
+        entries = sorted(entries)
+        self._keys = [key for key, _ in entries]
+        self._heroes = [hero_name for _, hero_name in entries]
+        self._all = frozenset(heroes)
+
+    def search(self, query: str) -> frozenset[str]:
+        """
+        Return names of heroes that have a name, name part or alias starting with `query`.
+
+        The query is cleaned with :py:func:`clean_hero_name` first;
+        a query without letters matches every hero.
+        """
+        prefix = clean_hero_name(query)
+        if not prefix:
+            return self._all
+        start = bisect_left(self._keys, prefix)
+        # keys only contain lowercase letters and "{" sorts right after "z"
+        end = bisect_left(self._keys, prefix + "{", start)
+        return frozenset(self._heroes[start:end])
+
+
+HERO_SEARCH_INDEX = HeroSearchIndex()
+"""Index of `HEROES_DICT` and `HERO_ALIASES`."""
+
+
+@lru_cache(maxsize=1024)
+def search_heroes(query: str) -> frozenset[str]:
+    """
+    Return names of heroes matching a name filter query (see :py:meth:`HeroSearchIndex.search`).
+    """
+    return HERO_SEARCH_INDEX.search(query)
+
+
+def _decode_details(archive: MPQReader, protocol) -> dict:
+    contents = archive.read_file("replay.details")
+    return protocol.decode_replay_details(contents)
+
+
+def _players(details: dict) -> list[tuple[Optional[str], dict]]:
+    """
+    Return cleaned hero name (None if missing) and details of every player.
+    """
+    return [
+        (
+            clean_hero_name(player["m_hero"].decode()) if "m_hero" in player else None,
+            player,
+        )
+        for player in details["m_playerList"]
+    ]
+
+
 def extract_heroes_from_details(
-    archive: mpyq.MPQArchive, protocol, filter_names=True
+    archive: MPQReader, protocol, filter_names=True
 ) -> list[str]:
     """
     Extract hero list from replay details. The set only contains names included in `HEROES_DICT`.
@@ -53,44 +187,65 @@ def extract_heroes_from_details(
     :param protocol: Second item of :py:func:`~.get_archive_protocol`.
     :param filter_names: Whether to return hero names not included in `HEROES_DICT`.
     """
-    contents = archive.read_file("replay.details")
-    details = protocol.decode_replay_details(contents)
+    return [
+        hero_name
+        for hero_name, _ in _players(_decode_details(archive, protocol))
+        if hero_name is not None and (not filter_names or hero_name in HEROES_DICT)
+    ]
 
-    heroes = list()
 
-    for player in details["m_playerList"]:
-        if "m_hero" in player:
-            hero_name = clean_hero_name(player["m_hero"].decode())
-            if not filter_names or hero_name in HEROES_DICT:
-                heroes.append(hero_name)
-    return heroes
+def _player_spawned(event: dict) -> Optional[tuple[Optional[str], Optional[int]]]:
+    """
+    Return hero name (as written in tracker events) and player id of a `PlayerSpawned` event
+    or None if `event` is a different event.
+    """
+    if "m_eventName" not in event or event["m_eventName"].decode() != "PlayerSpawned":
+        return None
+    hero_name = event.get("m_stringData", [{}])[-1].get("m_value")
+    if hero_name is not None:
+        hero_name = hero_name.decode()
+    player_id = next(
+        (
+            item["m_value"]
+            for item in event.get("m_intData") or ()
+            if item["m_key"] == b"PlayerID"
+        ),
+        None,
+    )
+    return hero_name, player_id
 
 
 def extract_heroes_from_tracker_events(
-    archive: mpyq.MPQArchive, protocol, filter_names=True
+    archive: MPQReader,
+    protocol,
+    filter_names=True,
+    stats: Optional[StreamStats] = None,
 ) -> list[str]:
     """
     A fallback for extracting hero list.
     Extracts data from tracker events which is slower but works for replays in any language.
 
+    Events are decoded incrementally and decoding stops as soon as 10 heroes are found,
+    so the rest of `replay.tracker.events` is never decompressed.
+
     :param archive: First item of :py:func:`~.get_archive_protocol`.
     :param protocol: Second item of :py:func:`~.get_archive_protocol`.
     :param filter_names: Whether to return hero names not included in `HEROES_DICT`.
+    :param stats:
+        An optional :py:class:`~app.event_stream.StreamStats` instance
+        that will hold the number of bytes and events actually decoded.
     """
-    contents = archive.read_file("replay.tracker.events")
-    tracker_events = protocol.decode_replay_tracker_events(contents)
-
     heroes = list()
 
-    for event in tracker_events:
-        if "m_eventName" in event and event["m_eventName"].decode() == "PlayerSpawned":
-            hero_name = event.get("m_stringData", [{}])[-1].get("m_value")
-            if hero_name is not None:
-                hero_name = hero_name.decode()
-            if not filter_names or hero_name in PLAYER_SPAWNED_NAMES_MAP:
-                heroes.append(PLAYER_SPAWNED_NAMES_MAP[hero_name])
-                if len(heroes) == 10:
-                    break
+    for event in iter_tracker_events(archive, protocol, stats):
+        spawned = _player_spawned(event)
+        if spawned is None:
+            continue
+        hero_name, _ = spawned
+        if not filter_names or hero_name in PLAYER_SPAWNED_NAMES_MAP:
+            heroes.append(PLAYER_SPAWNED_NAMES_MAP[hero_name])
+            if len(heroes) == 10:
+                break
     return heroes
 
 
@@ -103,49 +258,579 @@ def _open_file(replay):
         yield replay
 
 
+def _read_bytes(replay) -> bytes:
+    if hasattr(replay, "getvalue"):
+        return replay.getvalue()
+    with _open_file(replay) as fd:
+        return fd.read()
+
+
+def _decode_header(archive: MPQReader) -> dict:
+    contents = archive.header["user_data_header"]["content"]
+    return PROTOCOLS.latest().decode_replay_header(contents)
+
+
+def get_base_build(archive: MPQReader) -> int:
+    """
+    Decode base build of the replay from the archive's user data header.
+    """
+    return _decode_header(archive)["m_version"]["m_baseBuild"]
+
+
 @contextmanager
-def get_archive_protocol(replay):
+def _open_archive(replay, trace: ExtractionTrace):
     """
-    Get mpyq.MPQArchive and protocol module from replay.
-    :param replay: Either a file path or an object with a `read` method.
-    :return:
+    Open a replay and yield the archive, its decoded header and the protocol module.
     """
     with _open_file(replay) as fd:
-        archive = mpyq.MPQArchive(fd)
+        with trace.stage("mpq_open"):
+            archive = MPQReader(fd)
 
-        contents = archive.header["user_data_header"]["content"]
-        header = latest().decode_replay_header(contents)
+        with trace.stage("header_decode"):
+            header = _decode_header(archive)
+            trace.base_build = header["m_version"]["m_baseBuild"]
 
-        base_build = header["m_version"]["m_baseBuild"]
+        with trace.stage("protocol_import"):
+            protocol = PROTOCOLS.get(trace.base_build)
 
-        protocol = build(base_build)
+        yield archive, header, protocol
 
+
+@contextmanager
+def get_archive_protocol(replay, trace: Optional[ExtractionTrace] = None):
+    """
+    Get :py:class:`~app.mpq.MPQReader` and protocol module from replay.
+
+    Only the archive header is read here; files are read on demand.
+
+    :param replay: Either a file path or an object with `read` and `seek` methods.
+    :param trace:
+        An optional :py:class:`~app.extraction_trace.ExtractionTrace`
+        to record timings of opening the archive, decoding the header and importing the protocol in.
+    """
+    if trace is None:
+        trace = ExtractionTrace()
+    with _open_archive(replay, trace) as (archive, _, protocol):
         yield archive, protocol
 
 
-def extract_heroes_from_replay(replay) -> str | list[str]:
+UNSUCCESSFUL_EXTRACTION_MESSAGE = (
+    "Could not extract heroes from replay. "
+    "Please open an issue on github: "
+    "https://github.com/RLKRo/meta-madness-tracker/issues."
+)
+
+
+class ExtractionErrorCategory(str, Enum):
     """
-    Extract heroes from a `.StormReplay` file.
+    Reason hero extraction failed.
+    """
+
+    READ = "read"
+    """The replay could not be read (e.g. a missing file). Retrying may succeed."""
+    CORRUPT = "corrupt"
+    """The replay is not a valid archive or could not be decoded."""
+    UNSUPPORTED_BUILD = "unsupported_build"
+    """heroprotocol does not support the base build of the replay."""
+    INCOMPLETE = "incomplete"
+    """The replay was decoded but 10 heroes were not found in it."""
+    WORKER_CRASHED = "worker_crashed"
+    """The worker process parsing the replay stopped (e.g. ran out of memory). Retrying may succeed."""
+
+    @property
+    def transient(self) -> bool:
+        """Whether the same replay may be extracted successfully on another attempt."""
+        return self in (
+            ExtractionErrorCategory.READ,
+            ExtractionErrorCategory.WORKER_CRASHED,
+        )
+
+
+@dataclass(slots=True)
+class ExtractionResult:
+    """
+    Result of extracting heroes from a replay.
+    """
+
+    heroes: tuple[str, ...] = ()
+    """Heroes played in the replay (empty if extraction failed)."""
+    teams: tuple[int, ...] = ()
+    """Team of every hero in `heroes` (empty if unknown)."""
+    base_build: Optional[int] = None
+    method: Optional[str] = None
+    """Path that succeeded: "details", "tracker_events" or "cache"."""
+    error: Optional[ExtractionErrorCategory] = None
+    message: Optional[str] = None
+    """Error message to show to the user."""
+    trace: ExtractionTrace = field(default_factory=ExtractionTrace)
+    replay_hash: Optional[str] = None
+    """
+    Hash of the replay contents (see :py:func:`~app.replay_cache.replay_hash`).
+    Set by :py:func:`extract_heroes_from_replays` for every replay that could be read
+    and by :py:func:`extract_heroes_from_replay` if a cache is passed.
+    """
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def timings(self) -> dict[str, float]:
+        """Seconds spent in every extraction stage (see :py:data:`~app.extraction_trace.STAGES`)."""
+        return self.trace.stages
+
+    def fail(self, error: ExtractionErrorCategory, message: str) -> "ExtractionResult":
+        self.error = error
+        self.message = message
+        self.trace.error = error.value
+        return self
+
+
+class DraftPick(NamedTuple):
+    hero: str
+    team: Optional[int]
+    """0-based team like `m_teamId` in `replay.details` (None if unknown)."""
+
+
+@dataclass(slots=True)
+class DraftExtractionResult(ExtractionResult):
+    """
+    Result of :py:func:`extract_draft_from_replay`: heroes with the rest of the draft.
+    """
+
+    map_name: Optional[str] = None
+    """Map name as written in `replay.details` (localized)."""
+    game_length: Optional[float] = None
+    """Game length in seconds."""
+    game_mode: Optional[int] = None
+    """`m_ammId` of the game (None for custom games and builds that do not record it)."""
+    bans: tuple[DraftPick, ...] = ()
+    """Heroes banned during the draft in ban order."""
+    picks: tuple[DraftPick, ...] = ()
+    """Heroes picked during the draft in pick order (empty in modes without a draft)."""
+
+
+def _error_category(exc: Exception, trace: ExtractionTrace) -> ExtractionErrorCategory:
+    if isinstance(exc, OSError):
+        return ExtractionErrorCategory.READ
+    if isinstance(exc, ImportError) and next(reversed(trace.stages), None) == (
+        "protocol_import"
+    ):
+        return ExtractionErrorCategory.UNSUPPORTED_BUILD
+    return ExtractionErrorCategory.CORRUPT
+
+
+def _player_team(players: list[tuple[Optional[str], dict]], player_id: Optional[int]):
+    if player_id is not None and 0 < player_id <= len(players):
+        return players[player_id - 1][1]["m_teamId"]
+    return None
+
+
+def _scan_tracker_events(
+    archive: MPQReader, protocol, players: list[tuple[Optional[str], dict]]
+) -> tuple[list[tuple[str, Optional[int]]], list[DraftPick], list[DraftPick]]:
+    """
+    Decode tracker events until 10 known heroes spawned.
+
+    Draft events precede spawn events, so this is the only pass over tracker events needed.
+
+    :param players: Players of `replay.details` (see :py:func:`_players`).
+    :return: Spawned heroes with their teams, bans and picks.
+    """
+    spawned, bans, picks = [], [], []
+    for event in iter_tracker_events(archive, protocol):
+        event_name = event.get("_event")
+        if event_name == "NNet.Replay.Tracker.SHeroBannedEvent":
+            hero_name = DRAFT_NAMES_MAP.get(event["m_hero"].decode())
+            if hero_name is not None:
+                # m_controllingTeam is 1-based
+                bans.append(DraftPick(hero_name, event["m_controllingTeam"] - 1))
+        elif event_name == "NNet.Replay.Tracker.SHeroPickedEvent":
+            hero_name = DRAFT_NAMES_MAP.get(event["m_hero"].decode())
+            if hero_name is not None:
+                picks.append(
+                    DraftPick(
+                        hero_name, _player_team(players, event["m_controllingPlayer"])
+                    )
+                )
+        else:
+            player_spawned = _player_spawned(event)
+            if player_spawned is None:
+                continue
+            hero_name, player_id = player_spawned
+            if hero_name in PLAYER_SPAWNED_NAMES_MAP:
+                spawned.append(
+                    (
+                        PLAYER_SPAWNED_NAMES_MAP[hero_name],
+                        _player_team(players, player_id),
+                    )
+                )
+                if len(spawned) == 10:
+                    break
+    return spawned, bans, picks
+
+
+def _extract(replay, trace: ExtractionTrace, draft: bool = False) -> ExtractionResult:
+    """
+    Parse a replay, recording timings, bytes read and the successful method in `trace`.
+
+    Heroes are taken from `replay.details` and, if their names are not recognized
+    (e.g. in localized replays), from tracker events.
+    In the latter case teams are only known if spawn events carry player ids.
+
+    :param draft:
+        Whether to extract the rest of the draft as well
+        (see :py:func:`extract_draft_from_replay`).
+        Every file is still decoded at most once.
+    """
+    result = (
+        DraftExtractionResult(trace=trace) if draft else ExtractionResult(trace=trace)
+    )
+    archive = None
+    try:
+        with _open_archive(replay, trace) as (archive, header, protocol):
+            with trace.stage("details"):
+                details = _decode_details(archive, protocol)
+            players = _players(details)
+            heroes = [
+                (hero_name, player["m_teamId"])
+                for hero_name, player in players
+                if hero_name in HEROES_DICT
+            ]
+            method = "details"
+
+            if draft:
+                result.map_name = details["m_title"].decode()
+                result.game_length = (
+                    header["m_elapsedGameLoops"] / GAME_LOOPS_PER_SECOND
+                )
+                with trace.stage("init_data"):
+                    init_data = protocol.decode_replay_initdata(
+                        archive.read_file("replay.initData")
+                    )
+                game_options = init_data["m_syncLobbyState"]["m_gameDescription"][
+                    "m_gameOptions"
+                ]
+                result.game_mode = game_options.get("m_ammId")
+
+            if draft or len(heroes) != 10:
+                with trace.stage("tracker_events"):
+                    spawned, bans, picks = _scan_tracker_events(
+                        archive, protocol, players
+                    )
+                if draft:
+                    result.bans = tuple(bans)
+                    result.picks = tuple(picks)
+                if len(heroes) != 10:
+                    heroes = spawned
+                    method = "tracker_events"
+
+            if len(heroes) != 10:
+                return result.fail(
+                    ExtractionErrorCategory.INCOMPLETE, UNSUCCESSFUL_EXTRACTION_MESSAGE
+                )
+
+            result.heroes = tuple(hero_name for hero_name, _ in heroes)
+            if all(team is not None for _, team in heroes):
+                result.teams = tuple(team for _, team in heroes)
+            result.method = trace.method = method
+            return result
+    except Exception as exc:
+        return result.fail(_error_category(exc, trace), str(exc))
+    finally:
+        result.base_build = trace.base_build
+        if archive is not None:
+            trace.bytes_read = archive.bytes_read
+
+
+def extract_draft_from_replay(replay) -> DraftExtractionResult:
+    """
+    Extract heroes, teams, map, game length, game mode, bans and picks from a `.StormReplay` file
+    in a single pass: the header, `replay.details`, `replay.initData` and tracker events
+    are decoded once and tracker events only up to the spawn of the heroes.
+
+    The trace of the call is passed to :py:func:`~app.extraction_trace.emit_trace`.
 
     :param replay: Either a file path or an object with a `read` method.
-    :return: List of heroes that are played in the replay OR an error message if extraction was unsuccessful.
     """
-    unsuccessful_extraction_message = (
-        "Could not extract heroes from replay. "
-        "Please open an issue on github: "
-        "https://github.com/RLKRo/meta-madness-tracker/issues."
+    trace = ExtractionTrace()
+    try:
+        return _extract(replay, trace, draft=True)
+    finally:
+        emit_trace(trace)
+
+
+def extract_heroes_from_bytes(data: bytes) -> ExtractionResult:
+    """
+    Extract heroes from replay contents without emitting the trace
+    (e.g. in worker processes, whose traces are emitted by the caller).
+    """
+    return _extract(BytesIO(data), ExtractionTrace())
+
+
+def _cached_result(
+    cache: ReplayCache, key: str, trace: ExtractionTrace
+) -> Optional[ExtractionResult]:
+    """
+    Return a result built from a cached extraction or failure of a replay hash or None.
+    """
+    failure = cache.get_failure(key)
+    if failure is not None:
+        return ExtractionResult(trace=trace).fail(
+            ExtractionErrorCategory(failure.category), failure.message
+        )
+
+    cached = cache.get(key)
+    if cached is None:
+        return None
+    trace.method = "cache"
+    trace.base_build = cached.base_build
+    return ExtractionResult(
+        cached.heroes, cached.teams, cached.base_build, "cache", trace=trace
     )
+
+
+def _cache_result(cache: ReplayCache, key: str, result: ExtractionResult):
+    if result.ok:
+        cache.put(
+            key,
+            CachedExtraction(
+                result.heroes, result.base_build, result.method, result.teams
+            ),
+        )
+    elif not result.error.transient:
+        cache.put_failure(key, CachedFailure(result.error.value, result.message))
+
+
+def _read_error(exc: Exception, trace: ExtractionTrace) -> ExtractionResult:
+    return ExtractionResult(trace=trace).fail(_error_category(exc, trace), str(exc))
+
+
+def extract_heroes_from_replay(
+    replay, cache: Optional[ReplayCache] = None
+) -> ExtractionResult:
+    """
+    Extract heroes from a `.StormReplay` file.
+
+    The trace of the call (:py:attr:`ExtractionResult.trace`) is passed
+    to :py:func:`~app.extraction_trace.emit_trace`.
+
+    :param replay: Either a file path or an object with a `read` method.
+    :param cache:
+        An optional :py:class:`~app.replay_cache.ReplayCache`.
+        If passed, results are looked up by the hash of replay contents before parsing
+        and stored after extraction (failures only if they are not transient).
+    """
+    trace = ExtractionTrace()
     try:
-        with get_archive_protocol(replay) as (archive, protocol):
-            heroes = extract_heroes_from_details(archive, protocol)
+        return _extract_heroes_from_replay(replay, cache, trace)
+    finally:
+        emit_trace(trace)
 
-            if len(heroes) == 10:
-                return heroes
 
-            heroes = extract_heroes_from_tracker_events(archive, protocol)
+def _extract_heroes_from_replay(
+    replay, cache: Optional[ReplayCache], trace: ExtractionTrace
+) -> ExtractionResult:
+    if cache is None:
+        return _extract(replay, trace)
 
-            if len(heroes) == 10:
-                return heroes
-            return unsuccessful_extraction_message
+    try:
+        with trace.stage("read"):
+            data = _read_bytes(replay)
     except Exception as exc:
-        return str(exc)
+        return _read_error(exc, trace)
+    with trace.stage("cache_lookup"):
+        key = replay_hash(data)
+        result = _cached_result(cache, key, trace)
+    if result is None:
+        result = _extract(BytesIO(data), trace)
+        _cache_result(cache, key, result)
+    result.replay_hash = key
+    return result
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+MAX_POOL_ATTEMPTS = 2
+"""Number of pools a batch of replays is parsed in before replays left unparsed are given up."""
+
+WORKER_CRASHED_MESSAGE = (
+    "The replay could not be parsed because the parser stopped unexpectedly, "
+    "please try again."
+)
+
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+"""
+Start method of replay workers. They are not forked from this process,
+since another thread may hold a lock (e.g. while preloading protocol modules)
+that a forked worker would inherit held and wait for forever.
+"""
+if _MP_CONTEXT.get_start_method() == "forkserver":
+    # workers are forked from a single-threaded server that has imported this module once
+    _MP_CONTEXT.set_forkserver_preload(["app.heroes"])
+
+
+def _init_worker(base_builds: list[int]):
+    PROTOCOLS.preload(base_builds)
+
+
+def _new_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Return a process pool whose workers import protocol modules already imported in this process.
+    """
+    return ProcessPoolExecutor(
+        max_workers,
+        mp_context=_MP_CONTEXT,
+        initializer=_init_worker,
+        initargs=(PROTOCOLS.loaded_builds,),
+    )
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """
+    Return a process pool shared by all batch extractions in this process.
+
+    Workers are kept alive between calls, so protocol modules they import stay imported.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = _new_executor()
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """
+    Shut down a broken pool, so that the next batch creates a new shared pool.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _extract_in_pool(
+    payloads: list[bytes], max_workers: Optional[int]
+) -> list[ExtractionResult]:
+    """
+    Parse replay contents in a process pool (the shared one if `max_workers` is None).
+
+    If a worker dies (e.g. runs out of memory or crashes in a parser), the pool breaks and
+    replays it has not parsed yet are parsed again in a new pool, up to :py:data:`MAX_POOL_ATTEMPTS` pools.
+    Replays left unparsed get a :py:attr:`ExtractionErrorCategory.WORKER_CRASHED` error.
+    """
+    results: dict[int, ExtractionResult] = {}
+    attempts = 0
+    while len(results) < len(payloads) and attempts < MAX_POOL_ATTEMPTS:
+        executor = (
+            _get_executor() if max_workers is None else _new_executor(max_workers)
+        )
+        try:
+            futures = {
+                index: executor.submit(extract_heroes_from_bytes, data)
+                for index, data in enumerate(payloads)
+                if index not in results
+            }
+        except BrokenProcessPool:
+            # the shared pool was broken by an earlier batch
+            _discard_executor(executor)
+            continue
+        attempts += 1
+        for index, future in futures.items():
+            try:
+                results[index] = future.result()
+            except BrokenProcessPool:
+                pass
+        if max_workers is not None:
+            executor.shutdown()
+        elif len(results) < len(payloads):
+            _discard_executor(executor)
+
+    return [
+        results[index]
+        if index in results
+        else ExtractionResult().fail(
+            ExtractionErrorCategory.WORKER_CRASHED, WORKER_CRASHED_MESSAGE
+        )
+        for index in range(len(payloads))
+    ]
+
+
+def extract_heroes_from_contents(
+    payloads: list[bytes], max_workers: Optional[int] = None
+) -> list[ExtractionResult]:
+    """
+    Extract heroes from contents of several replays in parallel without emitting traces
+    or using a cache (see :py:func:`extract_heroes_from_replays`).
+
+    :param payloads: Contents of `.StormReplay` files.
+    :param max_workers: Same as in :py:func:`extract_heroes_from_replays`.
+    :return: A result for every replay (in the same order).
+    """
+    if len(payloads) <= 1 or max_workers == 1:
+        return list(map(extract_heroes_from_bytes, payloads))
+    return _extract_in_pool(payloads, max_workers)
+
+
+def extract_heroes_from_replays(
+    replays: Iterable, cache: Optional[ReplayCache] = None, max_workers=None
+) -> list[ExtractionResult]:
+    """
+    Extract heroes from several `.StormReplay` files in parallel.
+
+    Replays are parsed in a process pool since decoding is CPU-bound.
+    A failure to parse one replay does not affect the others,
+    and a pool broken by a worker that died is replaced (see :py:func:`_extract_in_pool`).
+    Traces of every replay are sent back from the workers and emitted in this process.
+
+    :param replays: Iterable of file paths or objects with a `read` method.
+    :param cache: An optional :py:class:`~app.replay_cache.ReplayCache`.
+    :param max_workers:
+        Maximum number of replays parsed at the same time.
+        Replays are parsed in the current process if this is 1.
+        If not set, a process pool shared between calls is used.
+    :return: A result for every replay (in the same order).
+    """
+    results: list[Optional[ExtractionResult]] = []
+    pending: dict[int, tuple[bytes, str, ExtractionTrace]] = {}
+
+    for index, replay in enumerate(replays):
+        trace = ExtractionTrace()
+        try:
+            with trace.stage("read"):
+                data = _read_bytes(replay)
+        except Exception as exc:
+            results.append(_read_error(exc, trace))
+            continue
+        result = None
+        if cache is not None:
+            with trace.stage("cache_lookup"):
+                key = replay_hash(data)
+                result = _cached_result(cache, key, trace)
+        else:
+            key = replay_hash(data)
+        results.append(result)
+        if result is None:
+            pending[index] = (data, key, trace)
+        else:
+            result.replay_hash = key
+
+    extractions = extract_heroes_from_contents(
+        [data for data, _, _ in pending.values()], max_workers
+    )
+
+    for (index, (_, key, trace)), result in zip(pending.items(), extractions):
+        # merge timings of reading and cache lookup in this process into the worker's trace
+        result.trace.stages = {**trace.stages, **result.trace.stages}
+        result.replay_hash = key
+        results[index] = result
+        if cache is not None:
+            _cache_result(cache, key, result)
+
+    for result in results:
+        emit_trace(result.trace)
+    return results
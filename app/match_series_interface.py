@@ -4,15 +4,35 @@ Match Series Interface
 This module defines interface for reading match series information from sqlalchemy database.
 """
 import datetime
+import random
+import threading
+import time
+from collections import OrderedDict
 from uuid import uuid4
 
-from typing import Iterable, Optional
+from typing import Callable, Iterable, NamedTuple, Optional
 
-from sqlalchemy import Table, Column, Uuid, DateTime, Text, Boolean, select
+from sqlalchemy import (
+    Table,
+    Column,
+    Uuid,
+    DateTime,
+    Text,
+    LargeBinary,
+    Integer,
+    String,
+    Index,
+    Select,
+    insert,
+    select,
+)
 from sqlalchemy.orm import registry, Session
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.sql import func
 
-from app.heroes import HEROES_DICT
+from app.ban_set import BanSet
+from app.rate_limit import CREATE_RATE_LIMITER, RateLimitExceeded, TokenBucketLimiter
+from app.series_events import SERIES_EVENTS
 
 _mapper_registry = registry()
 
@@ -21,27 +41,60 @@ def generate_uuid():
     return str(uuid4())
 
 
+SNAPSHOT_INTERVAL = 16
+"""Number of ban edits after which the bans of a series are materialized in `match_series.banned_mask`."""
+
+MAX_EDIT_ATTEMPTS = 10
+"""Number of times a ban edit is attempted before giving up on concurrent edits of the same series."""
+
+EDIT_RETRY_DELAY = 0.01
+"""Upper bound of the random delay (in seconds) before the first retry of a conflicting edit; grows with every retry."""
+
+
+class EditConflictError(RuntimeError):
+    """
+    Raised when a ban edit keeps conflicting with concurrent edits of the same series.
+    """
+
+
 class MatchSeries:
     """
     Class representing a match series.
 
-    This class also has an attribute "{hero_name}_banned" for every hero in the game.
+    Bans are stored as an append-only log of :py:data:`ban_events_table` rows
+    and a snapshot (`banned_mask`) refreshed every :py:data:`SNAPSHOT_INTERVAL` edits.
     """
 
-    _COLUMN_POSTFIX = "_banned"
-    _CHO_GALL = ("cho", "gall")
     id: str
     created_at: datetime.datetime
     name: str
     edit_key: str
     """Key required for editing this series."""
+    _banned_mask: bytes
+    """
+    Little-endian bitmask of heroes banned as of `snapshot_version`
+    (see :py:meth:`~app.ban_set.BanSet.to_bytes`).
+    """
+    version: int
+    """
+    Number of ban edits made to this series.
+
+    Used for optimistic concurrency control: an edit only succeeds if the version did not change
+    since the series was loaded (see :py:meth:`MatchSeriesManager.set_hero_bans`).
+    """
+    snapshot_version: int
+    """Version of the series `_banned_mask` was materialized at."""
 
     def _set_status(self, hero, status: bool):
-        if hero in self._CHO_GALL:
-            for half in self._CHO_GALL:
-                self.__setattr__(half + self._COLUMN_POSTFIX, status)
+        """
+        Change a ban of a series that is not persisted yet
+        (bans of persisted series are changed by :py:meth:`MatchSeriesManager.set_hero_bans`).
+        """
+        if status:
+            banned_heroes = self.banned_heroes | BanSet([hero])
         else:
-            self.__setattr__(hero + self._COLUMN_POSTFIX, status)
+            banned_heroes = self.banned_heroes - BanSet([hero])
+        self._banned_mask = banned_heroes.to_bytes()
 
     def _ban(self, hero: str):
         self._set_status(hero, True)
@@ -50,14 +103,16 @@ class MatchSeries:
         self._set_status(hero, False)
 
     @property
-    def banned_heroes(self):
+    def banned_heroes(self) -> BanSet:
         """
-        Generator for banned heroes in this series.
+        Set of banned heroes in this series.
+
+        Series loaded by :py:class:`MatchSeriesManager` include ban events made after the snapshot;
+        otherwise this is the snapshot.
         """
-        banned_heroes = set()
-        for hero in HEROES_DICT:
-            if self.__getattribute__(hero + self._COLUMN_POSTFIX):
-                banned_heroes.add(hero)
+        banned_heroes = self.__dict__.get("_banned_heroes")
+        if banned_heroes is None:
+            return BanSet.from_bytes(self._banned_mask)
         return banned_heroes
 
 
@@ -68,15 +123,349 @@ match_series_table = Table(
     Column("created_at", DateTime, default=func.now()),
     Column("name", Text),
     Column("edit_key", Uuid(as_uuid=False), default=generate_uuid),
-    *(
-        Column(hero_name + MatchSeries._COLUMN_POSTFIX, Boolean, default=False)
-        for hero_name in sorted(HEROES_DICT)
-    ),
+    Column("banned_mask", LargeBinary, nullable=False, default=b""),
+    Column("version", Integer, nullable=False, default=0, server_default="0"),
+    Column("snapshot_version", Integer, nullable=False, default=0, server_default="0"),
 )
 """SQLAlchemy table for MatchSeries class."""
 
 
-_mapper_registry.map_imperatively(MatchSeries, match_series_table)
+_mapper_registry.map_imperatively(
+    MatchSeries,
+    match_series_table,
+    properties={"_banned_mask": match_series_table.c.banned_mask},
+    version_id_col=match_series_table.c.version,
+    version_id_generator=False,
+)
+
+BAN = "ban"
+UNBAN = "unban"
+
+ban_events_table = Table(
+    "ban_events",
+    _mapper_registry.metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("series_id", Uuid(as_uuid=False), nullable=False),
+    Column("version", Integer, nullable=False),
+    Column("game", Integer),
+    Column("hero", String(32), nullable=False),
+    Column("op", String(8), nullable=False),
+    Column("replay_hash", String(32)),
+    Column("created_at", DateTime, default=func.now()),
+    Index("ix_ban_events_series_version", "series_id", "version"),
+    Index("ix_ban_events_series_id", "series_id", "id"),
+)
+"""
+Append-only log of ban changes.
+
+Every row bans or unbans (`op`) one hero in a series at a series `version`.
+`game` is the number of the uploaded replay (within the series) that introduced the change
+and is NULL for pre-bans and manual edits.
+"""
+
+
+class BanEvent(NamedTuple):
+    """
+    A row of :py:data:`ban_events_table`.
+    """
+
+    id: int
+    version: int
+    game: Optional[int]
+    hero: str
+    op: str
+    """Either :py:data:`BAN` or :py:data:`UNBAN`."""
+    replay_hash: Optional[str]
+    created_at: datetime.datetime
+
+
+class GameBans(NamedTuple):
+    """
+    Heroes banned by an uploaded replay.
+    """
+
+    heroes: Iterable[str]
+    replay_hash: Optional[str] = None
+
+
+def apply_ban_events(
+    banned_heroes: BanSet, events: Iterable[tuple[str, str]]
+) -> BanSet:
+    """
+    Apply `(hero, op)` pairs in order to a set of banned heroes.
+    """
+    for hero, op in events:
+        if op == BAN:
+            banned_heroes = banned_heroes | BanSet([hero])
+        else:
+            banned_heroes = banned_heroes - BanSet([hero])
+    return banned_heroes
+
+
+def _ban_tail_stmt(id: str, snapshot_version: int) -> Select:
+    """
+    Select `(hero, op)` of events of a series made after its snapshot, in order.
+    """
+    return (
+        select(ban_events_table.c.hero, ban_events_table.c.op)
+        .where(
+            ban_events_table.c.series_id == id,
+            ban_events_table.c.version > snapshot_version,
+        )
+        .order_by(ban_events_table.c.version, ban_events_table.c.id)
+    )
+
+
+def load_banned_heroes(
+    session: Session, id: str, banned_mask: bytes, snapshot_version: int
+) -> BanSet:
+    """
+    Return current bans of a series: its snapshot with the events made after the snapshot applied.
+    """
+    return apply_ban_events(
+        BanSet.from_bytes(banned_mask),
+        session.execute(_ban_tail_stmt(id, snapshot_version)).tuples(),
+    )
+
+
+def _next_game_stmt(id: str) -> Select:
+    """
+    Select the number of the next game (uploaded replay) of a series minus one.
+    """
+    return select(func.coalesce(func.max(ban_events_table.c.game), 0)).where(
+        ban_events_table.c.series_id == id
+    )
+
+
+def _ban_changes(
+    banned_heroes: BanSet, heroes: Iterable[str], op: str
+) -> tuple[BanSet, BanSet]:
+    """
+    Return bans after banning / unbanning `heroes` and heroes whose status changed.
+    """
+    if op == BAN:
+        new_banned_heroes = banned_heroes | BanSet(heroes)
+        return new_banned_heroes, new_banned_heroes - banned_heroes
+    new_banned_heroes = banned_heroes - BanSet(heroes)
+    return new_banned_heroes, banned_heroes - new_banned_heroes
+
+
+def _hero_bans_changes(
+    banned_heroes: BanSet,
+    ban_heroes: BanSet,
+    unban_heroes: BanSet,
+    games: list[GameBans],
+    first_game: int,
+) -> tuple[BanSet, list[dict]]:
+    """
+    Return bans after an edit of :py:meth:`MatchSeriesManager.set_hero_bans` and its events
+    (values of `game`, `hero`, `op` and `replay_hash`).
+
+    :param first_game: Number of the first game in `games`.
+    """
+    events = []
+    for game, game_bans in enumerate(games, start=first_game):
+        banned_heroes, changed = _ban_changes(banned_heroes, game_bans.heroes, BAN)
+        events.extend(
+            {
+                "game": game,
+                "hero": hero,
+                "op": BAN,
+                "replay_hash": game_bans.replay_hash,
+            }
+            for hero in changed
+        )
+    for heroes, op in ((ban_heroes, BAN), (unban_heroes, UNBAN)):
+        banned_heroes, changed = _ban_changes(banned_heroes, heroes, op)
+        events.extend(
+            {"game": None, "hero": hero, "op": op, "replay_hash": None}
+            for hero in changed
+        )
+    return banned_heroes, events
+
+
+def _stage_edit(
+    match_series: MatchSeries, banned_heroes: BanSet, events: list[dict]
+) -> list[dict]:
+    """
+    Bump the version of a series (refreshing its snapshot if it is :py:data:`SNAPSHOT_INTERVAL` versions old)
+    and return `ban_events` rows of the edit.
+
+    :param banned_heroes: Bans after the edit.
+    :param events: Values of `game`, `hero`, `op` and `replay_hash` of every event.
+    """
+    version = match_series.version + 1
+    match_series.version = version
+    if version - match_series.snapshot_version >= SNAPSHOT_INTERVAL:
+        match_series._banned_mask = banned_heroes.to_bytes()
+        match_series.snapshot_version = version
+    return [
+        {"series_id": match_series.id, "version": version, **event} for event in events
+    ]
+
+
+def _new_match_series(name: str, pre_banned_heroes: Iterable[str]) -> MatchSeries:
+    match_series = MatchSeries(
+        name=name,
+        version=0,
+        snapshot_version=0,
+    )
+    for hero in pre_banned_heroes:
+        match_series._ban(hero)
+    return match_series
+
+
+def _pre_ban_events(series: list[tuple[str, BanSet]]) -> list[dict]:
+    """
+    Return pre-bans of new series as ban events of version 0 (already included in their snapshots).
+    """
+    return [
+        {"series_id": id, "version": 0, "game": None, "hero": hero, "op": BAN}
+        for id, banned_heroes in series
+        for hero in banned_heroes
+    ]
+
+
+class MatchSeriesView(NamedTuple):
+    """
+    Read-only snapshot of a match series.
+    """
+
+    id: str
+    name: str
+    banned_heroes: BanSet
+    version: int
+
+    @classmethod
+    def from_match_series(cls, match_series: MatchSeries) -> "MatchSeriesView":
+        return cls(
+            match_series.id,
+            match_series.name,
+            match_series.banned_heroes,
+            match_series.version,
+        )
+
+
+class CreatedMatchSeries(NamedTuple):
+    """
+    Series created by :py:meth:`MatchSeriesManager.create_many`.
+    """
+
+    id: str
+    name: str
+    edit_key: str
+    banned_heroes: BanSet
+
+
+class MatchSeriesViewCache:
+    """
+    Process-wide read-through cache of :py:class:`MatchSeriesView` keyed by series ID.
+
+    Concurrent misses for the same series wait for a single database query.
+
+    :param ttl: Seconds after which an entry is reloaded from the database.
+        Bounds staleness of changes made by other processes;
+        changes made through :py:meth:`MatchSeriesManager.set_hero_bans` invalidate entries immediately.
+    :param max_entries: Maximum number of cached series.
+    """
+
+    def __init__(self, ttl: float = 5.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.db_queries = 0
+        self._entries: OrderedDict[str, tuple[float, MatchSeriesView]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: dict[str, threading.Lock] = {}
+
+    @property
+    def stats(self) -> dict[str, float]:
+        """
+        Hit / miss counters, hit rate and number of database queries.
+        """
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "db_queries": self.db_queries,
+            "entries": len(self._entries),
+        }
+
+    def _get_fresh(self, id: str) -> Optional[MatchSeriesView]:
+        """
+        Return a cached view that has not expired (counting a hit) or None.
+        """
+        with self._lock:
+            entry = self._entries.get(id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                return None
+            self._entries.move_to_end(id)
+            self.hits += 1
+            return entry[1]
+
+    def get(self, session: Session, id: str) -> MatchSeriesView:
+        """
+        Return a cached view of a series, loading it with `session` on a miss.
+
+        :raises sqlalchemy.exc.NoResultFound: If there is no series with the ID.
+        """
+        view = self._get_fresh(id)
+        if view is not None:
+            return view
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(id, threading.Lock())
+        try:
+            with load_lock:
+                # another thread may have loaded the series while this one was waiting
+                view = self._get_fresh(id)
+                if view is not None:
+                    return view
+
+                with self._lock:
+                    self.misses += 1
+                    self.db_queries += 1
+                stmt = select(
+                    match_series_table.c.id,
+                    match_series_table.c.name,
+                    match_series_table.c.banned_mask,
+                    match_series_table.c.version,
+                    match_series_table.c.snapshot_version,
+                ).where(match_series_table.c.id == id)
+                row = session.execute(stmt).one()
+                view = MatchSeriesView(
+                    row.id,
+                    row.name,
+                    load_banned_heroes(
+                        session, row.id, row.banned_mask, row.snapshot_version
+                    ),
+                    row.version,
+                )
+
+                with self._lock:
+                    self._entries[id] = (time.monotonic(), view)
+                    self._entries.move_to_end(id)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                return view
+        finally:
+            # later misses (e.g. after a failed load) start with a new lock
+            with self._lock:
+                if self._load_locks.get(id) is load_lock:
+                    del self._load_locks[id]
+
+    def invalidate(self, id: str):
+        """
+        Drop the cached view of a series.
+        """
+        with self._lock:
+            self._entries.pop(id, None)
+
+
+SERIES_VIEW_CACHE = MatchSeriesViewCache()
+"""Process-wide :py:class:`MatchSeriesViewCache` used by :py:class:`MatchSeriesManager`."""
 
 
 class MatchSeriesManager:
@@ -94,31 +483,220 @@ class MatchSeriesManager:
         stmt = select(MatchSeries).where(MatchSeries.id == id)
         self.match_series: MatchSeries = self.session.scalars(stmt).one()
         """A MatchSeries instance for the ID."""
+        self._load_banned_heroes()
         if edit_key is not None:
             self.edit_permission = self.match_series.edit_key == edit_key
             """Whether edit permission is granted to this manager."""
         else:
             self.edit_permission = False
 
-    def set_hero_bans(self, ban_heroes: Iterable[str], unban_heroes: Iterable[str]):
+    def _check_edit_permission(self):
+        if not self.edit_permission:
+            raise RuntimeError("Insufficient permissions to edit match series.")
+
+    def _next_game(self) -> int:
+        return self.session.execute(_next_game_stmt(self.match_series.id)).scalar() + 1
+
+    def _load_banned_heroes(self):
+        match_series = self.match_series
+        self._bans_version = match_series.version
+        """Version of the series loaded bans are from (or newer)."""
+        match_series._banned_heroes = load_banned_heroes(
+            self.session,
+            match_series.id,
+            match_series._banned_mask,
+            match_series.snapshot_version,
+        )
+
+    def _edit(self, changes: Callable[[BanSet], tuple[BanSet, list[dict]]]):
         """
-        Ban heroes from `ban_heroes`, then unban heroes from `unban_heroes`.
+        Append ban events as a new version of the series and commit.
+
+        The version is compared and swapped: the update only succeeds if no other edit
+        was committed since the series was loaded. Otherwise, current bans are reloaded
+        and `changes` are recomputed from them after a short random delay,
+        up to :py:data:`MAX_EDIT_ATTEMPTS` times,
+        so concurrent edits are merged instead of overwriting each other.
+        The snapshot is refreshed if it is :py:data:`SNAPSHOT_INTERVAL` versions old.
+
+        :param changes: Function taking current bans and returning bans after the edit
+            and values of `game`, `hero`, `op` and `replay_hash` of every event (nothing is written if empty).
+        :raises EditConflictError: If every attempt conflicted with another edit.
+        """
+        match_series = self.match_series
+        self.session.add(match_series)
+        for attempt in range(MAX_EDIT_ATTEMPTS):
+            if match_series.version != self._bans_version:
+                # reloaded after a commit or rollback
+                self._load_banned_heroes()
+            banned_heroes, events = changes(match_series.banned_heroes)
+            if not events:
+                return
+            rows = _stage_edit(match_series, banned_heroes, events)
+            self.session.execute(insert(ban_events_table), rows)
+            try:
+                self.session.commit()
+            except StaleDataError:
+                self.session.rollback()
+                # random delay, so that conflicting editors do not retry in lockstep
+                time.sleep(random.uniform(0, EDIT_RETRY_DELAY * (attempt + 1)))
+                continue
+            version = rows[0]["version"]
+            match_series._banned_heroes = banned_heroes
+            self._bans_version = version
+            SERIES_VIEW_CACHE.invalidate(match_series.id)
+            SERIES_EVENTS.publish(match_series.id, version)
+            return
+        raise EditConflictError(
+            f"Could not edit match series {match_series.id} "
+            f"because of concurrent edits, please try again."
+        )
+
+    def set_hero_bans(
+        self,
+        ban_heroes: Iterable[str],
+        unban_heroes: Iterable[str],
+        games: Iterable[GameBans] = (),
+    ):
+        """
+        Ban heroes from `games` (in order), then heroes from `ban_heroes`,
+        then unban heroes from `unban_heroes`.
+
+        Only heroes whose status changes are written (as :py:data:`ban_events_table` rows).
+        Every game gets the next game number of the series, so that it can be rolled back
+        with :py:meth:`rollback_game`.
+        Changes are applied to the latest bans even if other edits were made after this manager was created.
 
         :raises RuntimeError: If this manager does not have permission to edit bans.
+        :raises ValueError: If any of the heroes is not in `HEROES_DICT`.
+        :raises EditConflictError: If the edit kept conflicting with concurrent edits.
         """
-        if not self.edit_permission:
-            raise RuntimeError("Insufficient permissions to edit match series.")
+        self._check_edit_permission()
+        ban_heroes = BanSet(ban_heroes)
+        unban_heroes = BanSet(unban_heroes)
+        games = list(games)
+
+        def changes(banned_heroes: BanSet) -> tuple[BanSet, list[dict]]:
+            return _hero_bans_changes(
+                banned_heroes,
+                ban_heroes,
+                unban_heroes,
+                games,
+                self._next_game() if games else 1,
+            )
+
+        self._edit(changes)
+
+    def rollback_game(self, game: int) -> BanSet:
+        """
+        Unban heroes banned by an uploaded replay that are still banned.
+
+        :raises RuntimeError: If this manager does not have permission to edit bans.
+        :raises EditConflictError: If the edit kept conflicting with concurrent edits.
+        :return: Unbanned heroes.
+        """
+        self._check_edit_permission()
+
+        stmt = select(ban_events_table.c.hero).where(
+            ban_events_table.c.series_id == self.match_series.id,
+            ban_events_table.c.game == game,
+            ban_events_table.c.op == BAN,
+        )
+        game_bans = BanSet(self.session.scalars(stmt))
+        unbanned = BanSet()
+
+        def changes(banned_heroes: BanSet) -> tuple[BanSet, list[dict]]:
+            nonlocal unbanned
+            banned_heroes, unbanned = _ban_changes(banned_heroes, game_bans, UNBAN)
+            return banned_heroes, [
+                {"game": game, "hero": hero, "op": UNBAN, "replay_hash": None}
+                for hero in unbanned
+            ]
+
+        self._edit(changes)
+        return unbanned
+
+    @staticmethod
+    def get_games(session: Session, id: str) -> list[int]:
+        """
+        Return numbers of the games (uploaded replays) of a series.
+        """
+        stmt = (
+            select(ban_events_table.c.game)
+            .where(
+                ban_events_table.c.series_id == id,
+                ban_events_table.c.game.is_not(None),
+            )
+            .group_by(ban_events_table.c.game)
+            .order_by(ban_events_table.c.game)
+        )
+        return list(session.scalars(stmt))
+
+    @staticmethod
+    def get_history(
+        session: Session, id: str, before: Optional[int] = None, limit: int = 50
+    ) -> list[BanEvent]:
+        """
+        Return ban events of a series, newest first.
+
+        :param before: Only return events with a smaller `id` (the `id` of the last event of the previous page).
+        :param limit: Maximum number of events to return.
+        """
+        stmt = select(
+            ban_events_table.c.id,
+            ban_events_table.c.version,
+            ban_events_table.c.game,
+            ban_events_table.c.hero,
+            ban_events_table.c.op,
+            ban_events_table.c.replay_hash,
+            ban_events_table.c.created_at,
+        ).where(ban_events_table.c.series_id == id)
+        if before is not None:
+            stmt = stmt.where(ban_events_table.c.id < before)
+        stmt = stmt.order_by(ban_events_table.c.id.desc()).limit(limit)
+        return [BanEvent(*row) for row in session.execute(stmt)]
+
+    @staticmethod
+    def get_view(
+        session: Session, id: str, cache: Optional[MatchSeriesViewCache] = None
+    ) -> MatchSeriesView:
+        """
+        Return a read-only view of a series without loading the full MatchSeries object.
+
+        :param session: SQLAlchemy session used on a cache miss.
+        :param id: ID of the series.
+        :param cache: Cache to read through. Defaults to :py:data:`SERIES_VIEW_CACHE`.
+        :raises sqlalchemy.exc.NoResultFound: If there is no series with the ID.
+        """
+        return (cache or SERIES_VIEW_CACHE).get(session, id)
 
-        for hero in ban_heroes:
-            self.match_series._ban(hero)
-        for hero in unban_heroes:
-            self.match_series._unban(hero)
-        self.session.add(self.match_series)
-        self.session.commit()
+    @staticmethod
+    def get_version(session: Session, id: str) -> int:
+        """
+        Return the current version of a series straight from the database.
+
+        Used to detect changes made by other processes:
+        if the version is newer than the one known to :py:data:`~app.series_events.SERIES_EVENTS`,
+        the cached view is dropped and the version is published.
+
+        :raises sqlalchemy.exc.NoResultFound: If there is no series with the ID.
+        """
+        stmt = select(match_series_table.c.version).where(match_series_table.c.id == id)
+        version = session.execute(stmt).scalar_one()
+
+        known_version = SERIES_EVENTS.latest(id)
+        if known_version is None or version > known_version:
+            SERIES_VIEW_CACHE.invalidate(id)
+            SERIES_EVENTS.publish(id, version)
+        return version
 
     @staticmethod
     def create_new(
-        session: Session, name: str, pre_banned_heroes: Iterable[str]
+        session: Session,
+        name: str,
+        pre_banned_heroes: Iterable[str],
+        client_id: Optional[str] = None,
+        limiter: Optional[TokenBucketLimiter] = CREATE_RATE_LIMITER,
     ) -> MatchSeries:
         """
         Create new MatchSeries.
@@ -126,13 +704,93 @@ class MatchSeriesManager:
         :param session: SQLAlchemy session.
         :param name: Name of the series.
         :param pre_banned_heroes: An iterable with pre-banned heroes.
+        :param client_id: Identity of the client creating the series (e.g. its IP address)
+            to rate limit with `limiter`. Clients with unknown identities (None) share one bucket.
+        :param limiter: Rate limiter of series creation.
+            Trusted callers (e.g. the CLI) pass None to create series without limits.
+        :raises app.rate_limit.RateLimitExceeded: If the client created too many series recently.
         :return: A MatchSeries instance.
         """
-        match_series = MatchSeries(
-            name=name,
-        )
-        for hero in pre_banned_heroes:
-            match_series._ban(hero)
+        _consume_tokens(session, client_id, limiter, 1)
+        match_series = _new_match_series(name, pre_banned_heroes)
         session.add(match_series)
+        session.flush()
+        _insert_pre_ban_events(session, [(match_series.id, match_series.banned_heroes)])
         session.commit()
         return match_series
+
+    @staticmethod
+    def create_many(
+        session: Session,
+        series: Iterable[tuple[str, Iterable[str]]],
+        client_id: Optional[str] = None,
+        limiter: Optional[TokenBucketLimiter] = CREATE_RATE_LIMITER,
+    ) -> list[CreatedMatchSeries]:
+        """
+        Create many MatchSeries in a single transaction with one executemany insert.
+
+        :param session: SQLAlchemy session.
+        :param series: Pairs of series name and pre-banned heroes.
+        :param client_id: Identity of the client to rate limit (see :py:meth:`create_new`).
+        :param limiter: Rate limiter of series creation, taking one token per series.
+            Trusted callers (e.g. the CLI) pass None to create series without limits.
+        :raises ValueError: If any of the pre-banned heroes is not in `HEROES_DICT`
+            or there are more series than the limiter allows at once.
+        :raises app.rate_limit.RateLimitExceeded: If the client created too many series recently.
+        :return: Created series in the order of `series`.
+        """
+        created = [
+            CreatedMatchSeries(
+                generate_uuid(), name, generate_uuid(), BanSet(pre_banned_heroes)
+            )
+            for name, pre_banned_heroes in series
+        ]
+        if not created:
+            return created
+
+        _consume_tokens(session, client_id, limiter, len(created))
+        session.execute(
+            insert(match_series_table),
+            [
+                {
+                    "id": match_series.id,
+                    "name": match_series.name,
+                    "edit_key": match_series.edit_key,
+                    "banned_mask": match_series.banned_heroes.to_bytes(),
+                    "version": 0,
+                    "snapshot_version": 0,
+                }
+                for match_series in created
+            ],
+        )
+        _insert_pre_ban_events(
+            session,
+            [(match_series.id, match_series.banned_heroes) for match_series in created],
+        )
+        session.commit()
+        return created
+
+
+def _consume_tokens(
+    session: Session,
+    client_id: Optional[str],
+    limiter: Optional[TokenBucketLimiter],
+    tokens: int,
+):
+    """
+    Take creation tokens of a client (unless there is no limiter),
+    rolling back the session if there are not enough left.
+    """
+    if limiter is None:
+        return
+    try:
+        limiter.consume(session, client_id, tokens)
+    except RateLimitExceeded:
+        session.rollback()
+        raise
+
+
+def _insert_pre_ban_events(session: Session, series: list[tuple[str, BanSet]]):
+    events = _pre_ban_events(series)
+    if events:
+        session.execute(insert(ban_events_table), events)
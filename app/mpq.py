@@ -0,0 +1,352 @@
+"""
+MPQ
+---
+This module contains a lightweight reader for MPQ archives (the container format of `.StormReplay` files).
+
+Unlike :py:class:`mpyq.MPQArchive` it never reads the listfile,
+decrypts hash and block tables only when a file is first requested
+and reads (and decompresses) only the sectors of the requested file.
+"""
+import bz2
+import struct
+import zlib
+from functools import cached_property, lru_cache
+from typing import BinaryIO, Iterator, NamedTuple, Optional
+
+MPQ_FILE_IMPLODE = 0x00000100
+MPQ_FILE_COMPRESS = 0x00000200
+MPQ_FILE_ENCRYPTED = 0x00010000
+MPQ_FILE_SINGLE_UNIT = 0x01000000
+MPQ_FILE_SECTOR_CRC = 0x04000000
+MPQ_FILE_EXISTS = 0x80000000
+
+_HASH_TYPES = {"TABLE_OFFSET": 0, "HASH_A": 1, "HASH_B": 2, "TABLE": 3}
+
+_EMPTY_HASH_ENTRY = 0xFFFFFFFF
+_DELETED_HASH_ENTRY = 0xFFFFFFFE
+
+_READ_CHUNK_SIZE = 64 * 1024
+
+
+def _prepare_encryption_table() -> list[int]:
+    seed = 0x00100001
+    table = [0] * 0x500
+
+    for i in range(256):
+        index = i
+        for _ in range(5):
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            temp1 = (seed & 0xFFFF) << 0x10
+
+            seed = (seed * 125 + 3) % 0x2AAAAB
+            temp2 = seed & 0xFFFF
+
+            table[index] = temp1 | temp2
+            index += 0x100
+    return table
+
+
+ENCRYPTION_TABLE = _prepare_encryption_table()
+"""MPQ encryption table shared by the hash function and table decryption."""
+
+
+@lru_cache(maxsize=256)
+def mpq_hash(string: str, hash_type: str) -> int:
+    """
+    Hash a string using MPQ's hash function.
+
+    :param string: String to hash (file name or table key).
+    :param hash_type: One of "TABLE_OFFSET", "HASH_A", "HASH_B" or "TABLE".
+    """
+    seed1 = 0x7FED7FED
+    seed2 = 0xEEEEEEEE
+    offset = _HASH_TYPES[hash_type] << 8
+
+    for ch in string.upper().encode():
+        value = ENCRYPTION_TABLE[offset + ch]
+        seed1 = (value ^ (seed1 + seed2)) & 0xFFFFFFFF
+        seed2 = (ch + seed1 + seed2 + (seed2 << 5) + 3) & 0xFFFFFFFF
+
+    return seed1
+
+
+def decrypt(data: bytes, key: int) -> bytes:
+    """
+    Decrypt an MPQ hash table, block table or sector.
+    """
+    seed1 = key
+    seed2 = 0xEEEEEEEE
+    count = len(data) // 4
+    values = list(struct.unpack(f"<{count}I", data[: count * 4]))
+
+    for i, value in enumerate(values):
+        seed2 = (seed2 + ENCRYPTION_TABLE[0x400 + (seed1 & 0xFF)]) & 0xFFFFFFFF
+        value = (value ^ (seed1 + seed2)) & 0xFFFFFFFF
+
+        seed1 = (((~seed1 << 0x15) + 0x11111111) | (seed1 >> 0x0B)) & 0xFFFFFFFF
+        seed2 = (value + seed2 + (seed2 << 5) + 3) & 0xFFFFFFFF
+
+        values[i] = value
+
+    return struct.pack(f"<{count}I", *values)
+
+
+class HashTableEntry(NamedTuple):
+    hash_a: int
+    hash_b: int
+    locale: int
+    platform: int
+    block_table_index: int
+
+
+class BlockTableEntry(NamedTuple):
+    offset: int
+    archived_size: int
+    size: int
+    flags: int
+
+
+def _decompressor(compression_type: int):
+    """
+    Return an incremental decompressor for an MPQ compression type byte.
+    """
+    if compression_type == 2:
+        return zlib.decompressobj(15)
+    elif compression_type == 16:
+        return bz2.BZ2Decompressor()
+    raise RuntimeError("Unsupported compression type.")
+
+
+def _decompress(data: bytes) -> bytes:
+    """
+    Read the compression type and decompress sector data.
+    """
+    compression_type = data[0]
+    if compression_type == 0:
+        return data[1:]
+    return _decompressor(compression_type).decompress(data[1:])
+
+
+class MPQReader:
+    """
+    Seek-based reader for MPQ archives.
+
+    Exposes the same `header` dictionary and `read_file` method as :py:class:`mpyq.MPQArchive`.
+
+    :param fd: A binary file object supporting `seek` and `read`.
+    """
+
+    def __init__(self, fd: BinaryIO):
+        self.file = fd
+        self.header = self._read_header()
+        self.bytes_read = 0
+        """Number of archive bytes read by :py:meth:`read_file` / :py:meth:`iter_file` calls."""
+
+    def _read_at(self, offset: int, size: int) -> bytes:
+        self.file.seek(offset)
+        data = self.file.read(size)
+        if len(data) != size:
+            raise ValueError("Unexpected end of archive.")
+        return data
+
+    def _read_header(self) -> dict:
+        magic = self._read_at(0, 4)
+
+        if magic == b"MPQ\x1a":
+            offset = 0
+            user_data_header = None
+        elif magic == b"MPQ\x1b":
+            data = self._read_at(0, 16)
+            _, user_data_size, offset, user_data_header_size = struct.unpack(
+                "<4s3I", data
+            )
+            user_data_header = {
+                "magic": magic,
+                "user_data_size": user_data_size,
+                "mpq_header_offset": offset,
+                "user_data_header_size": user_data_header_size,
+                "content": self.file.read(user_data_header_size),
+            }
+        else:
+            raise ValueError("Invalid file header.")
+
+        (
+            magic,
+            header_size,
+            archive_size,
+            format_version,
+            sector_size_shift,
+            hash_table_offset,
+            block_table_offset,
+            hash_table_entries,
+            block_table_entries,
+        ) = struct.unpack("<4s2I2H4I", self._read_at(offset, 32))
+
+        if magic != b"MPQ\x1a":
+            raise ValueError("Invalid archive header.")
+
+        header = {
+            "magic": magic,
+            "header_size": header_size,
+            "archive_size": archive_size,
+            "format_version": format_version,
+            "sector_size_shift": sector_size_shift,
+            "hash_table_offset": hash_table_offset,
+            "block_table_offset": block_table_offset,
+            "hash_table_entries": hash_table_entries,
+            "block_table_entries": block_table_entries,
+            "offset": offset,
+        }
+        if user_data_header is not None:
+            header["user_data_header"] = user_data_header
+        return header
+
+    def _read_table(self, table_type: str) -> bytes:
+        entries = self.header[f"{table_type}_table_entries"]
+        data = self._read_at(
+            self.header[f"{table_type}_table_offset"] + self.header["offset"],
+            entries * 16,
+        )
+        return decrypt(data, mpq_hash(f"({table_type} table)", "TABLE"))
+
+    @cached_property
+    def hash_table(self) -> list[HashTableEntry]:
+        """Decrypted hash table. Read on first access."""
+        return [
+            HashTableEntry._make(entry)
+            for entry in struct.iter_unpack("<2I2HI", self._read_table("hash"))
+        ]
+
+    @cached_property
+    def block_table(self) -> list[BlockTableEntry]:
+        """Decrypted block table. Read on first access."""
+        return [
+            BlockTableEntry._make(entry)
+            for entry in struct.iter_unpack("<4I", self._read_table("block"))
+        ]
+
+    def get_hash_table_entry(self, filename: str) -> Optional[HashTableEntry]:
+        """
+        Get the hash table entry corresponding to a given filename.
+
+        Probes the hash table starting at the filename's table offset hash
+        instead of scanning the whole table.
+        """
+        hash_table = self.hash_table
+        if not hash_table:
+            return None
+
+        hash_a = mpq_hash(filename, "HASH_A")
+        hash_b = mpq_hash(filename, "HASH_B")
+        start = mpq_hash(filename, "TABLE_OFFSET") % len(hash_table)
+
+        for i in range(len(hash_table)):
+            entry = hash_table[(start + i) % len(hash_table)]
+            if entry.block_table_index == _EMPTY_HASH_ENTRY:
+                return None
+            if (
+                entry.hash_a == hash_a
+                and entry.hash_b == hash_b
+                and entry.block_table_index != _DELETED_HASH_ENTRY
+            ):
+                return entry
+        return None
+
+    def get_block_table_entry(self, filename: str) -> Optional[BlockTableEntry]:
+        """
+        Get the block table entry of an existing file.
+
+        :raises ValueError: If the file is encrypted.
+        """
+        hash_entry = self.get_hash_table_entry(filename)
+        if hash_entry is None:
+            return None
+        block_entry = self.block_table[hash_entry.block_table_index]
+        if not block_entry.flags & MPQ_FILE_EXISTS or block_entry.archived_size == 0:
+            return None
+        if block_entry.flags & MPQ_FILE_ENCRYPTED:
+            raise ValueError("encrypted MPQ files are not supported")
+        return block_entry
+
+    def iter_file(self, filename: str) -> Iterator[bytes]:
+        """
+        Read a file from the archive lazily, yielding decompressed chunks.
+
+        Multi-sector files are yielded sector by sector,
+        single unit files are decompressed incrementally.
+        Nothing is read from the archive until the iterator is advanced.
+
+        :raises KeyError: If the archive does not contain `filename`.
+        """
+        block_entry = self.get_block_table_entry(filename)
+        if block_entry is None:
+            raise KeyError(filename)
+
+        offset = block_entry.offset + self.header["offset"]
+
+        if block_entry.flags & MPQ_FILE_SINGLE_UNIT:
+            yield from self._iter_single_unit(block_entry, offset)
+        else:
+            yield from self._iter_sectors(block_entry, offset)
+
+    def _iter_single_unit(self, block_entry: BlockTableEntry, offset: int):
+        # single unit files are only compressed when at least one byte is gained
+        compressed = (
+            block_entry.flags & MPQ_FILE_COMPRESS
+            and block_entry.size > block_entry.archived_size
+        )
+        position = offset
+        end = offset + block_entry.archived_size
+        decompressor = None
+
+        if compressed:
+            compression_type = self._read_at(position, 1)[0]
+            self.bytes_read += 1
+            position += 1
+            if compression_type != 0:
+                decompressor = _decompressor(compression_type)
+
+        while position < end:
+            chunk = self._read_at(position, min(_READ_CHUNK_SIZE, end - position))
+            self.bytes_read += len(chunk)
+            position += len(chunk)
+            if decompressor is not None:
+                chunk = decompressor.decompress(chunk)
+            if chunk:
+                yield chunk
+
+    def _iter_sectors(self, block_entry: BlockTableEntry, offset: int):
+        sector_size = 512 << self.header["sector_size_shift"]
+        sectors = -(-block_entry.size // sector_size)
+        position_count = sectors + 1
+        if block_entry.flags & MPQ_FILE_SECTOR_CRC:
+            position_count += 1
+
+        positions = struct.unpack(
+            f"<{position_count}I", self._read_at(offset, 4 * position_count)
+        )
+        self.bytes_read += 4 * position_count
+
+        sector_bytes_left = block_entry.size
+        for i in range(sectors):
+            sector = self._read_at(
+                offset + positions[i], positions[i + 1] - positions[i]
+            )
+            self.bytes_read += len(sector)
+            if block_entry.flags & MPQ_FILE_COMPRESS and sector_bytes_left > len(
+                sector
+            ):
+                sector = _decompress(sector)
+            sector_bytes_left -= len(sector)
+            yield sector
+
+    def read_file(self, filename: str) -> Optional[bytes]:
+        """
+        Read a file from the archive.
+
+        :return: File contents or None if the archive does not contain `filename`.
+        """
+        try:
+            return b"".join(self.iter_file(filename))
+        except KeyError:
+            return None
@@ -0,0 +1,78 @@
+"""
+Protocols
+---------
+This module defines a registry of heroprotocol build modules.
+
+Protocol modules are large generated files and importing one takes a noticeable amount of time.
+The registry memoizes them per build, records how long each import took
+and allows importing builds ahead of time.
+"""
+import threading
+import time
+from types import ModuleType
+from typing import Iterable, Optional
+
+from heroprotocol.versions import build, latest
+
+
+class ProtocolRegistry:
+    """
+    Memoizing wrapper around :py:func:`heroprotocol.versions.build`.
+    """
+
+    def __init__(self):
+        self._protocols: dict[int, ModuleType] = {}
+        self._latest: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+        self.import_times: dict[int, float] = {}
+        """Time (in seconds) it took to import protocol module of a build."""
+
+    def latest(self) -> ModuleType:
+        """
+        Return the latest protocol module (used to decode replay headers).
+        """
+        if self._latest is None:
+            with self._lock:
+                if self._latest is None:
+                    self._latest = latest()
+        return self._latest
+
+    def get(self, base_build: int) -> ModuleType:
+        """
+        Return protocol module of a build, importing it if necessary.
+
+        :raises ImportError: If heroprotocol does not support the build.
+        """
+        protocol = self._protocols.get(base_build)
+        if protocol is not None:
+            return protocol
+
+        with self._lock:
+            if base_build not in self._protocols:
+                start = time.perf_counter()
+                self._protocols[base_build] = build(base_build)
+                self.import_times[base_build] = time.perf_counter() - start
+            return self._protocols[base_build]
+
+    def preload(self, base_builds: Iterable[int]) -> list[int]:
+        """
+        Import protocol modules of `base_builds` (and the latest protocol module).
+
+        :return: Builds that are not supported by heroprotocol.
+        """
+        self.latest()
+        unsupported = []
+        for base_build in base_builds:
+            try:
+                self.get(base_build)
+            except ImportError:
+                unsupported.append(base_build)
+        return unsupported
+
+    @property
+    def loaded_builds(self) -> list[int]:
+        return sorted(self._protocols)
+
+
+PROTOCOLS = ProtocolRegistry()
+"""Process-wide protocol registry."""
@@ -0,0 +1,207 @@
+"""
+Rate Limit
+----------
+This module defines token bucket rate limits persisted in the database,
+so that they hold across browser sessions and app processes.
+
+Every client (e.g. an IP address) has a bucket of up to `capacity` tokens per limiter,
+refilled with one token every `refill_seconds`. An action takes a token (or several, e.g. one per series
+created in bulk) and is denied if the bucket does not have enough.
+Clients without a known identity share the :py:data:`ANONYMOUS_CLIENT` bucket.
+A check is a single upsert of one `rate_limits` row on SQLite and PostgreSQL
+(a locked read and a write of the row on other databases), executed in the caller's transaction.
+"""
+import hashlib
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import (
+    Column,
+    Float,
+    MetaData,
+    String,
+    Table,
+    case,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+_metadata = MetaData()
+
+rate_limits_table = Table(
+    "rate_limits",
+    _metadata,
+    Column("key", String(64), primary_key=True),
+    Column("tokens", Float, nullable=False),
+    Column("updated_at", Float, nullable=False),
+)
+"""
+SQLAlchemy table holding a token bucket per limiter and client:
+number of tokens as of `updated_at` (Unix time of the last taken token).
+"""
+
+ANONYMOUS_CLIENT = "anonymous"
+"""Identity of clients whose identity is unknown."""
+
+_UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+class RateLimitExceeded(RuntimeError):
+    """
+    Raised when a client ran out of tokens.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            f"Too many requests, please try again in {retry_after:.0f} seconds."
+        )
+        self.retry_after = retry_after
+        """Seconds until the client gets a token."""
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket rate limiter.
+
+    :param name: Name of the limiter. Buckets of different limiters are independent.
+    :param capacity: Maximum number of tokens (actions allowed in a burst).
+    :param refill_seconds: Seconds it takes to get one token back.
+    """
+
+    def __init__(self, name: str, capacity: int, refill_seconds: float):
+        self.name = name
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.allowed = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, float]:
+        """
+        Numbers of allowed and denied actions in this process.
+        """
+        checks = self.allowed + self.denied
+        return {
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "deny_rate": self.denied / checks if checks else 0.0,
+        }
+
+    def _key(self, client_id: str) -> str:
+        """
+        Return the row key of a client (hashed, so that addresses are not stored).
+        """
+        digest = hashlib.blake2b(client_id.encode(), digest_size=16).hexdigest()
+        return f"{self.name}:{digest}"[:64]
+
+    def _upsert_stmt(self, upsert, key: str, now: float, tokens: int):
+        refilled = rate_limits_table.c.tokens + (
+            (now - rate_limits_table.c.updated_at) / self.refill_seconds
+        )
+        available = case((refilled > self.capacity, self.capacity), else_=refilled)
+        return (
+            upsert(rate_limits_table)
+            .values(key=key, tokens=self.capacity - tokens, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[rate_limits_table.c.key],
+                set_={"tokens": available - tokens, "updated_at": now},
+                where=available >= tokens,
+            )
+        )
+
+    def _take_locked(self, session: Session, key: str, now: float, tokens: int) -> bool:
+        """
+        Take tokens on databases without upserts, locking the row of the bucket until the end
+        of the transaction. Return whether the tokens were taken.
+        """
+        row = session.execute(self._bucket_stmt(key).with_for_update()).one_or_none()
+        if row is None:
+            try:
+                with session.begin_nested():
+                    session.execute(
+                        insert(rate_limits_table).values(
+                            key=key, tokens=self.capacity - tokens, updated_at=now
+                        )
+                    )
+                return True
+            except IntegrityError:
+                # a concurrent transaction created the bucket first
+                row = session.execute(self._bucket_stmt(key).with_for_update()).one()
+        available = self._available(row, now)
+        if available < tokens:
+            return False
+        session.execute(
+            update(rate_limits_table)
+            .where(rate_limits_table.c.key == key)
+            .values(tokens=available - tokens, updated_at=now)
+        )
+        return True
+
+    @staticmethod
+    def _bucket_stmt(key: str):
+        return select(rate_limits_table.c.tokens, rate_limits_table.c.updated_at).where(
+            rate_limits_table.c.key == key
+        )
+
+    def _available(self, row, now: float) -> float:
+        return min(
+            self.capacity, row.tokens + (now - row.updated_at) / self.refill_seconds
+        )
+
+    def _count(self, allowed: bool):
+        with self._lock:
+            if allowed:
+                self.allowed += 1
+            else:
+                self.denied += 1
+
+    def consume(self, session: Session, client_id: Optional[str], tokens: int = 1):
+        """
+        Take tokens of a client. Changes are committed with the caller's transaction.
+
+        :param client_id: Identity of the client, None for :py:data:`ANONYMOUS_CLIENT`.
+        :param tokens: Number of tokens to take.
+        :raises ValueError: If `tokens` is more than the capacity of the bucket.
+        :raises RateLimitExceeded: If the client does not have enough tokens left.
+        """
+        if tokens > self.capacity:
+            raise ValueError(
+                f"Cannot take {tokens} tokens at once, the {self.name} limit is {self.capacity}."
+            )
+        if client_id is None:
+            client_id = ANONYMOUS_CLIENT
+        now = time.time()
+        key = self._key(client_id)
+        upsert = _UPSERTS.get(session.get_bind().dialect.name)
+        if upsert is None:
+            allowed = self._take_locked(session, key, now, tokens)
+        else:
+            stmt = self._upsert_stmt(upsert, key, now, tokens)
+            allowed = session.execute(stmt).rowcount == 1
+        self._count(allowed)
+        if not allowed:
+            row = session.execute(self._bucket_stmt(key)).one()
+            retry_after = (tokens - self._available(row, now)) * self.refill_seconds
+            raise RateLimitExceeded(max(0.0, retry_after))
+
+    async def consume_async(
+        self, session: AsyncSession, client_id: Optional[str], tokens: int = 1
+    ):
+        """
+        Same as :py:meth:`consume` for an async session.
+        """
+        await session.run_sync(self.consume, client_id, tokens)
+
+
+CREATE_RATE_LIMITER = TokenBucketLimiter("create", capacity=3, refill_seconds=60)
+"""
+Process-wide limiter of series creation
+(see :py:meth:`~app.match_series_interface.MatchSeriesManager.create_new`).
+"""
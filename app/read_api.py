@@ -0,0 +1,258 @@
+"""
+Read API
+--------
+This module defines a small ASGI app serving bans of match series as JSON,
+e.g. for broadcast overlays, without going through the Streamlit pages::
+
+    python -m app api serve [--host HOST] [--port PORT] [--url URL]
+
+    GET /series/{id}[?wait=SECONDS]
+
+    200 {"id":"...","name":"ASH vs. Raiders","bans":["cho","gall"],"version":3}
+
+Responses carry an `ETag` with the series version. Requests with a matching `If-None-Match`
+get an empty `304 Not Modified`; if `wait` is passed too, the response is held until the series
+changes or `wait` seconds (at most :py:data:`MAX_WAIT`) pass (long polling).
+
+Encoded responses are cached for :py:data:`CACHE_TTL` seconds, so the database is queried
+at most once per series and interval however many overlays poll it.
+"""
+import asyncio
+import json
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+from uuid import UUID
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.async_match_series_interface import AsyncMatchSeriesManager
+from app.match_series_interface import MatchSeriesView
+from app.schema import SCHEMA_VERSION, get_schema_version
+
+CACHE_TTL = 1.0
+"""Seconds a response is served from memory before the series is reread from the database."""
+
+MAX_WAIT = 30.0
+"""Maximum seconds a long-polling request is held."""
+
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+"""Async drivers used for database URLs with synchronous (or default) drivers."""
+
+
+def async_database_url(url: str) -> str:
+    """
+    Return `url` with the driver replaced by an async one (see :py:data:`ASYNC_DRIVERS`).
+    """
+    url = make_url(url)
+    async_driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if async_driver is None or url.drivername == async_driver:
+        return url.render_as_string(hide_password=False)
+    return url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+class SeriesResponse:
+    """
+    Encoded response body of a series.
+    """
+
+    __slots__ = ("version", "etag", "body")
+
+    def __init__(self, view: MatchSeriesView):
+        self.version = view.version
+        self.etag = f'"{view.version}"'.encode()
+        self.body = json.dumps(
+            {
+                "id": view.id,
+                "name": view.name,
+                "bans": list(view.banned_heroes),
+                "version": view.version,
+            },
+            separators=(",", ":"),
+        ).encode()
+
+
+class SeriesResponseCache:
+    """
+    Cache of :py:class:`SeriesResponse` keyed by series ID (None for series that do not exist).
+
+    Concurrent misses for the same series wait for a single database query.
+
+    :param ttl: Seconds after which an entry is reloaded from the database.
+    :param max_entries: Maximum number of cached series.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL, max_entries: int = 4096):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, tuple[float, Optional[SeriesResponse]]] = {}
+        self._load_locks: dict[str, asyncio.Lock] = {}
+
+    async def get(
+        self, sessionmaker: async_sessionmaker, id: str
+    ) -> Optional[SeriesResponse]:
+        entry = self._entries.get(id)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        lock = self._load_locks.setdefault(id, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(id)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            async with sessionmaker() as session:
+                views = await AsyncMatchSeriesManager.get_views(session, [id])
+            response = SeriesResponse(views[id]) if id in views else None
+            if len(self._entries) >= self.max_entries and id not in self._entries:
+                # drop the entry closest to expiring
+                del self._entries[
+                    min(self._entries, key=lambda key: self._entries[key][0])
+                ]
+            self._entries[id] = (time.monotonic() + self.ttl, response)
+        self._load_locks.pop(id, None)
+        return response
+
+
+def _if_none_match(headers: list[tuple[bytes, bytes]]) -> set[bytes]:
+    """
+    Return entity tags listed in `If-None-Match` headers (without weak validator prefixes).
+    """
+    return {
+        tag.strip().removeprefix(b"W/")
+        for name, value in headers
+        if name == b"if-none-match"
+        for tag in value.split(b",")
+    }
+
+
+class ReadApi:
+    """
+    ASGI app serving match series (see module docstring).
+
+    :param engine: Async SQLAlchemy engine of the match series database.
+    :param cache: Response cache. Defaults to a new :py:class:`SeriesResponseCache`.
+    """
+
+    def __init__(
+        self, engine: AsyncEngine, cache: Optional[SeriesResponseCache] = None
+    ):
+        self.engine = engine
+        self.sessionmaker = async_sessionmaker(engine, expire_on_commit=False)
+        self.cache = cache or SeriesResponseCache()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                async with self.engine.connect() as connection:
+                    version = await connection.run_sync(get_schema_version)
+                if version != SCHEMA_VERSION:
+                    await send(
+                        {
+                            "type": "lifespan.startup.failed",
+                            "message": f"Database schema version is {version}, "
+                            f"expected {SCHEMA_VERSION}. Run `python -m app schema upgrade`.",
+                        }
+                    )
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope, send):
+        if scope["method"] not in ("GET", "HEAD"):
+            await _respond(send, 405, b'{"error":"method not allowed"}')
+            return
+        path = scope["path"].strip("/").split("/")
+        if len(path) != 2 or path[0] != "series":
+            await _respond(send, 404, b'{"error":"not found"}')
+            return
+        try:
+            UUID(path[1])
+        except ValueError:
+            await _respond(send, 404, b'{"error":"series not found"}')
+            return
+
+        query = parse_qs(scope["query_string"].decode("latin-1"))
+        try:
+            wait = min(float(query.get("wait", ["0"])[-1]), MAX_WAIT)
+        except ValueError:
+            await _respond(send, 400, b'{"error":"wait must be a number"}')
+            return
+
+        response = await self.cache.get(self.sessionmaker, path[1])
+        if response is None:
+            await _respond(send, 404, b'{"error":"series not found"}')
+            return
+
+        known_etags = _if_none_match(scope["headers"])
+        if response.etag in known_etags and wait > 0:
+            deadline = time.monotonic() + wait
+            while response is not None and response.etag in known_etags:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(self.cache.ttl, remaining))
+                response = await self.cache.get(self.sessionmaker, path[1])
+            if response is None:
+                await _respond(send, 404, b'{"error":"series not found"}')
+                return
+
+        if response.etag in known_etags:
+            await _respond(send, 304, b"", response.etag)
+        else:
+            await _respond(
+                send,
+                200,
+                b"" if scope["method"] == "HEAD" else response.body,
+                response.etag,
+                content_length=len(response.body),
+            )
+
+
+async def _respond(
+    send,
+    status: int,
+    body: bytes,
+    etag: Optional[bytes] = None,
+    content_length: Optional[int] = None,
+):
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"cache-control", b"no-cache"),
+        (b"access-control-allow-origin", b"*"),
+        (b"access-control-expose-headers", b"etag"),
+    ]
+    if etag is not None:
+        headers.append((b"etag", etag))
+    if status != 304:
+        headers.append(
+            (
+                b"content-length",
+                str(len(body) if content_length is None else content_length).encode(),
+            )
+        )
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+def create_app(url: str) -> ReadApi:
+    """
+    Create the app for a database URL (synchronous drivers are replaced by async ones).
+    """
+    return ReadApi(create_async_engine(async_database_url(url)))
@@ -0,0 +1,251 @@
+"""
+Replay Cache
+------------
+This module defines a content-addressed cache for results of hero extraction.
+
+Results are keyed by a hash of the replay bytes, so the same replay uploaded
+by different users (or resubmitted on rerun) is only parsed once.
+"""
+import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    Engine,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    delete,
+    func,
+    insert,
+    select,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+_metadata = MetaData()
+
+replay_cache_table = Table(
+    "replay_cache",
+    _metadata,
+    Column("replay_hash", String(32), primary_key=True),
+    Column("heroes", JSON, nullable=False),
+    Column("base_build", Integer, nullable=False),
+    Column("method", String(16), nullable=False),
+    Column("teams", JSON),
+    Column("last_used_at", DateTime, nullable=False, index=True),
+)
+"""SQLAlchemy table for persisted cache entries."""
+
+_UPSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def replay_hash(data: bytes) -> str:
+    """
+    Return a hex digest identifying replay contents.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class CachedExtraction(NamedTuple):
+    heroes: tuple[str, ...]
+    base_build: int
+    method: str
+    """Either "details" or "tracker_events"."""
+    teams: tuple[int, ...] = ()
+    """Team of every hero (empty if unknown)."""
+
+
+class CachedFailure(NamedTuple):
+    category: str
+    """Value of :py:class:`~app.heroes.ExtractionErrorCategory`."""
+    message: str
+
+
+class ReplayCache:
+    """
+    LRU cache of extraction results.
+
+    Entries are kept in memory and, if `engine` is passed, persisted to the `replay_cache` table
+    (created by :py:func:`app.schema.upgrade_schema`).
+    Failures that would repeat on every attempt (e.g. corrupt replays) are only kept in memory,
+    since they may disappear after updating heroprotocol.
+
+    :param engine: An optional SQLAlchemy engine to persist entries with.
+    :param max_entries: Maximum number of persisted entries.
+    :param max_memory_entries: Maximum number of entries kept in memory.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[Engine] = None,
+        max_entries: int = 10000,
+        max_memory_entries: int = 256,
+    ):
+        self.engine = engine
+        self.max_entries = max_entries
+        self.max_memory_entries = max_memory_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, CachedExtraction] = OrderedDict()
+        self._failures: OrderedDict[str, CachedFailure] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Hit and miss counters.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "failure_entries": len(self._failures),
+        }
+
+    def _remember(self, key: str, entry: CachedExtraction):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[CachedExtraction]:
+        """
+        Return a cached entry for a replay hash or None.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        if self.engine is not None:
+            with self.engine.begin() as conn:
+                row = conn.execute(
+                    select(
+                        replay_cache_table.c.heroes,
+                        replay_cache_table.c.base_build,
+                        replay_cache_table.c.method,
+                        replay_cache_table.c.teams,
+                    ).where(replay_cache_table.c.replay_hash == key)
+                ).one_or_none()
+                if row is not None:
+                    conn.execute(
+                        update(replay_cache_table)
+                        .where(replay_cache_table.c.replay_hash == key)
+                        .values(last_used_at=datetime.datetime.now())
+                    )
+            if row is not None:
+                entry = CachedExtraction(
+                    tuple(row.heroes),
+                    row.base_build,
+                    row.method,
+                    tuple(row.teams or ()),
+                )
+                self._remember(key, entry)
+                with self._lock:
+                    self.hits += 1
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def get_failure(self, key: str) -> Optional[CachedFailure]:
+        """
+        Return a cached failure for a replay hash or None.
+        """
+        with self._lock:
+            failure = self._failures.get(key)
+            if failure is not None:
+                self._failures.move_to_end(key)
+                self.hits += 1
+            return failure
+
+    def put_failure(self, key: str, failure: CachedFailure):
+        """
+        Store a failure in memory, evicting least recently used failures over `max_memory_entries`.
+        """
+        with self._lock:
+            self._failures[key] = failure
+            self._failures.move_to_end(key)
+            while len(self._failures) > self.max_memory_entries:
+                self._failures.popitem(last=False)
+
+    def recent_builds(self, limit: int = 5) -> list[int]:
+        """
+        Return base builds of the most recently used persisted entries.
+        """
+        if self.engine is None:
+            return sorted({entry.base_build for entry in self._memory.values()})
+
+        last_used_at = func.max(replay_cache_table.c.last_used_at)
+        with self.engine.connect() as conn:
+            return list(
+                conn.execute(
+                    select(replay_cache_table.c.base_build)
+                    .group_by(replay_cache_table.c.base_build)
+                    .order_by(last_used_at.desc())
+                    .limit(limit)
+                ).scalars()
+            )
+
+    def put(self, key: str, entry: CachedExtraction):
+        """
+        Store an entry, evicting least recently used entries over the limits.
+        """
+        self._remember(key, entry)
+
+        if self.engine is None:
+            return
+
+        values = {
+            "replay_hash": key,
+            "heroes": list(entry.heroes),
+            "base_build": entry.base_build,
+            "method": entry.method,
+            "teams": list(entry.teams),
+            "last_used_at": datetime.datetime.now(),
+        }
+        with self.engine.begin() as conn:
+            # the same replay may be stored by a concurrent upload
+            upsert = _UPSERTS.get(conn.dialect.name)
+            if upsert is not None:
+                stmt = (
+                    upsert(replay_cache_table)
+                    .values(values)
+                    .on_conflict_do_nothing(
+                        index_elements=[replay_cache_table.c.replay_hash]
+                    )
+                )
+                if conn.execute(stmt).rowcount != 1:
+                    return
+            else:
+                try:
+                    with conn.begin_nested():
+                        conn.execute(insert(replay_cache_table).values(values))
+                except IntegrityError:
+                    return
+            count = conn.execute(
+                select(func.count()).select_from(replay_cache_table)
+            ).scalar_one()
+            if count > self.max_entries:
+                oldest = (
+                    select(replay_cache_table.c.replay_hash)
+                    .order_by(replay_cache_table.c.last_used_at)
+                    .limit(count - self.max_entries)
+                )
+                conn.execute(
+                    delete(replay_cache_table).where(
+                        replay_cache_table.c.replay_hash.in_(oldest)
+                    )
+                )
@@ -0,0 +1,196 @@
+"""
+Replay Scan
+-----------
+This module extracts heroes from every `.StormReplay` file in a directory tree without Streamlit::
+
+    python -m app heroes scan DIR [--output FILE] [--manifest FILE] [--workers N]
+
+Replays are read and hashed in chunks of :py:data:`SCAN_CHUNK_SIZE` and parsed in the process pool
+of :py:func:`~app.heroes.extract_heroes_from_contents`, which replaces the pool if a worker dies.
+Results are streamed as JSON Lines, one object per replay in file order::
+
+    {"path": "season/1.StormReplay", "replay_hash": "...", "heroes": [...], "teams": [...], "base_build": 91756, "method": "details"}
+    {"path": "season/2.StormReplay", "replay_hash": "...", "error": "...", "error_category": "corrupt"}
+
+If a manifest file is passed, hashes of processed replays are appended to it
+after their result is written, and replays whose hash is already in the manifest are skipped.
+An interrupted scan can therefore be resumed by rerunning it with the same manifest
+(at worst, the last results before the interruption are written twice).
+Replays that failed for a transient reason (e.g. a crashed worker) are not added to the manifest,
+so resuming retries them.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from app.extraction_trace import emit_trace
+from app.heroes import (
+    ExtractionErrorCategory,
+    ExtractionResult,
+    extract_heroes_from_contents,
+)
+from app.replay_cache import replay_hash
+
+REPLAY_SUFFIX = ".stormreplay"
+
+SCAN_CHUNK_SIZE = 64
+"""Number of replays read into memory and parsed together."""
+
+
+@dataclass
+class ScanStats:
+    """
+    Summary of a :py:func:`scan_replays` call.
+    """
+
+    files: int = 0
+    """Replay files found."""
+    extracted: int = 0
+    """Replays heroes were extracted from."""
+    failed: int = 0
+    """Replays that could not be parsed."""
+    skipped: int = 0
+    """Replays skipped because they were already processed (listed in the manifest or duplicates)."""
+    seconds: float = 0.0
+
+
+def iter_replay_files(root: Path) -> Iterator[Path]:
+    """
+    Yield `.StormReplay` files in a directory tree in a stable (sorted) order.
+    """
+    for directory, directories, files in os.walk(root):
+        directories.sort()
+        for file_name in sorted(files):
+            if file_name.lower().endswith(REPLAY_SUFFIX):
+                yield Path(directory) / file_name
+
+
+def load_manifest(path: Path) -> set[str]:
+    """
+    Return hashes listed in a manifest file (empty if it does not exist).
+    """
+    try:
+        with open(path, "r") as fd:
+            return {line.strip() for line in fd if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def _result_fields(result: ExtractionResult) -> dict:
+    """
+    Return the JSON fields of an extraction result.
+    """
+    if not result.ok:
+        return {"error": result.message, "error_category": result.error.value}
+    return {
+        "heroes": list(result.heroes),
+        "teams": list(result.teams),
+        "base_build": result.base_build,
+        "method": result.method,
+    }
+
+
+def _scan_chunk(
+    paths: list[Path], processed: set[str], max_workers: Optional[int]
+) -> list[Optional[tuple[Optional[str], dict, bool]]]:
+    """
+    Read, hash and parse replays, skipping replays whose hash is in `processed` or repeats in the chunk.
+
+    :return: For every path, None if it is skipped or its hash, JSON fields of its result
+        and whether it failed for a transient reason.
+    """
+    results: list[Optional[tuple[Optional[str], dict, bool]]] = []
+    pending: dict[str, tuple[int, bytes]] = {}
+    for path in paths:
+        try:
+            data = path.read_bytes()
+        except OSError as exc:
+            error = ExtractionErrorCategory.READ
+            results.append(
+                (None, {"error": str(exc), "error_category": error.value}, True)
+            )
+            continue
+        key = replay_hash(data)
+        if key in processed or key in pending:
+            results.append(None)
+            continue
+        pending[key] = (len(results), data)
+        results.append(None)
+
+    extractions = extract_heroes_from_contents(
+        [data for _, data in pending.values()], max_workers
+    )
+    for (key, (index, _)), result in zip(pending.items(), extractions):
+        emit_trace(result.trace)
+        results[index] = (
+            key,
+            _result_fields(result),
+            not result.ok and result.error.transient,
+        )
+    return results
+
+
+def scan_replays(
+    root: Path,
+    output: TextIO,
+    manifest: Optional[Path] = None,
+    max_workers: Optional[int] = None,
+    progress: Optional[TextIO] = None,
+) -> ScanStats:
+    """
+    Extract heroes from every replay under `root` and write results to `output` as JSON Lines.
+
+    :param root: Directory to scan.
+    :param output: Text stream results are written to.
+    :param manifest: Optional file with hashes of processed replays (see module docstring).
+    :param max_workers: Number of worker processes. Replays are parsed in the current process if this is 1
+        and in the pool shared with :py:func:`~app.heroes.extract_heroes_from_replays` if this is None.
+    :param progress: Optional text stream to report progress to.
+    """
+    start = time.perf_counter()
+    stats = ScanStats()
+    processed = load_manifest(manifest) if manifest is not None else set()
+    paths = list(iter_replay_files(root))
+    stats.files = len(paths)
+
+    manifest_fd = open(manifest, "a") if manifest is not None else None
+    try:
+        for chunk_start in range(0, len(paths), SCAN_CHUNK_SIZE):
+            chunk = paths[chunk_start : chunk_start + SCAN_CHUNK_SIZE]
+            results = _scan_chunk(chunk, processed, max_workers)
+            for index, (path, scanned) in enumerate(
+                zip(chunk, results), start=chunk_start + 1
+            ):
+                if scanned is None:
+                    stats.skipped += 1
+                else:
+                    key, fields, transient = scanned
+                    if "error" in fields:
+                        stats.failed += 1
+                    else:
+                        stats.extracted += 1
+                    line = {
+                        "path": path.relative_to(root).as_posix(),
+                        "replay_hash": key,
+                    }
+                    output.write(json.dumps({**line, **fields}) + "\n")
+                    if key is not None and not transient:
+                        processed.add(key)
+                        if manifest_fd is not None:
+                            output.flush()
+                            manifest_fd.write(key + "\n")
+
+                if progress is not None and (index % 100 == 0 or index == stats.files):
+                    progress.write(
+                        f"{index}/{stats.files} replays, {stats.failed} failed, "
+                        f"{stats.skipped} skipped\n"
+                    )
+    finally:
+        if manifest_fd is not None:
+            manifest_fd.close()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
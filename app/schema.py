@@ -0,0 +1,261 @@
+"""
+Schema
+------
+This module manages the database schema: creating tables, recording the schema version
+and migrating databases created by older versions of the app.
+
+The schema is prepared once per process (see :py:func:`app.common.db_connection`)
+or explicitly before deploying with `python -m app schema upgrade`.
+"""
+from typing import Callable, Optional
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Connection,
+    Engine,
+    Integer,
+    JSON,
+    LargeBinary,
+    MetaData,
+    Table,
+    Uuid,
+    bindparam,
+    delete,
+    inspect,
+    insert,
+    select,
+    text,
+    update,
+)
+
+from app.ban_set import BanSet
+from app.heroes import HEROES_DICT
+from app.match_series_interface import _mapper_registry
+from app.rate_limit import rate_limits_table
+from app.replay_cache import replay_cache_table
+
+SCHEMA_VERSION = 7
+"""
+Version of the schema defined by this code.
+
+1. One Boolean column per hero in `match_series` (databases without `schema_version` table).
+2. Bans stored as a bitmask in `match_series.banned_mask`.
+3. Per-series edit counter in `match_series.version`.
+4. Team of every hero in `replay_cache.teams`.
+5. Append-only `ban_events` log; `match_series.banned_mask` is a snapshot as of `match_series.snapshot_version`.
+6. Token buckets of rate limits in `rate_limits`.
+7. Extraction cache in `replay_cache` (created by the cache itself before).
+"""
+
+schema_version_table = Table(
+    "schema_version",
+    _mapper_registry.metadata,
+    Column("version", Integer, nullable=False),
+)
+"""SQLAlchemy table holding a single row with the version of the database schema."""
+
+
+_LEGACY_COLUMN_POSTFIX = "_banned"
+
+
+def migrate_wide_ban_columns(connection: Connection) -> int:
+    """
+    Move bans stored in legacy `{hero_name}_banned` columns of the `match_series` table
+    into the `banned_mask` column and drop the legacy columns.
+
+    Does nothing if the legacy columns do not exist.
+
+    :param connection: SQLAlchemy connection. The caller is responsible for committing.
+    :return: Number of migrated series.
+    """
+    columns = {
+        column["name"] for column in inspect(connection).get_columns("match_series")
+    }
+    legacy_columns = sorted(
+        column
+        for column in columns
+        if column.endswith(_LEGACY_COLUMN_POSTFIX)
+        and column.removesuffix(_LEGACY_COLUMN_POSTFIX) in HEROES_DICT
+    )
+    if not legacy_columns:
+        return 0
+
+    if "banned_mask" not in columns:
+        column_type = LargeBinary().compile(dialect=connection.dialect)
+        connection.execute(
+            text(f"ALTER TABLE match_series ADD COLUMN banned_mask {column_type}")
+        )
+
+    legacy_table = Table(
+        "match_series",
+        MetaData(),
+        Column("id", Uuid(as_uuid=False), primary_key=True),
+        Column("banned_mask", LargeBinary),
+        *(Column(column, Boolean) for column in legacy_columns),
+    )
+
+    masks = [
+        {
+            "series_id": row.id,
+            "mask": BanSet(
+                column.removesuffix(_LEGACY_COLUMN_POSTFIX)
+                for column in legacy_columns
+                if getattr(row, column)
+            ).to_bytes(),
+        }
+        for row in connection.execute(select(legacy_table))
+    ]
+    if masks:
+        connection.execute(
+            update(legacy_table)
+            .where(legacy_table.c.id == bindparam("series_id"))
+            .values(banned_mask=bindparam("mask")),
+            masks,
+        )
+
+    for column in legacy_columns:
+        connection.execute(text(f'ALTER TABLE match_series DROP COLUMN "{column}"'))
+    return len(masks)
+
+
+def add_series_version_column(connection: Connection):
+    """
+    Add the `version` column to the `match_series` table if it does not exist.
+
+    :param connection: SQLAlchemy connection. The caller is responsible for committing.
+    """
+    columns = {
+        column["name"] for column in inspect(connection).get_columns("match_series")
+    }
+    if "version" not in columns:
+        connection.execute(
+            text(
+                "ALTER TABLE match_series "
+                "ADD COLUMN version INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+
+
+def add_replay_cache_teams_column(connection: Connection):
+    """
+    Add the `teams` column to the `replay_cache` table if the table exists without it.
+
+    :param connection: SQLAlchemy connection. The caller is responsible for committing.
+    """
+    if not inspect(connection).has_table("replay_cache"):
+        return
+    columns = {
+        column["name"] for column in inspect(connection).get_columns("replay_cache")
+    }
+    if "teams" not in columns:
+        column_type = JSON().compile(dialect=connection.dialect)
+        connection.execute(
+            text(f"ALTER TABLE replay_cache ADD COLUMN teams {column_type}")
+        )
+
+
+def add_snapshot_version_column(connection: Connection):
+    """
+    Add the `snapshot_version` column to the `match_series` table if it does not exist.
+
+    Bans of existing series are all in `banned_mask`, so their snapshot is as of their current version.
+
+    :param connection: SQLAlchemy connection. The caller is responsible for committing.
+    """
+    columns = {
+        column["name"] for column in inspect(connection).get_columns("match_series")
+    }
+    if "snapshot_version" not in columns:
+        connection.execute(
+            text(
+                "ALTER TABLE match_series "
+                "ADD COLUMN snapshot_version INTEGER NOT NULL DEFAULT 0"
+            )
+        )
+        connection.execute(text("UPDATE match_series SET snapshot_version = version"))
+
+
+def create_rate_limits_table(connection: Connection):
+    """
+    Create the `rate_limits` table if it does not exist.
+
+    :param connection: SQLAlchemy connection. The caller is responsible for committing.
+    """
+    rate_limits_table.create(connection, checkfirst=True)
+
+
+def create_replay_cache_table(connection: Connection):
+    """
+    Create the `replay_cache` table if it does not exist.
+
+    :param connection: SQLAlchemy connection. The caller is responsible for committing.
+    """
+    replay_cache_table.create(connection, checkfirst=True)
+
+
+_MIGRATIONS: dict[int, Callable[[Connection], object]] = {
+    1: migrate_wide_ban_columns,
+    2: add_series_version_column,
+    3: add_replay_cache_teams_column,
+    4: add_snapshot_version_column,
+    5: create_rate_limits_table,
+    6: create_replay_cache_table,
+}
+"""Functions migrating a database from a version (key) to the next one."""
+
+
+def get_schema_version(connection: Connection) -> Optional[int]:
+    """
+    Return version of the database schema or None if it is not recorded.
+    """
+    if not inspect(connection).has_table(schema_version_table.name):
+        return None
+    return connection.execute(select(schema_version_table.c.version)).scalar()
+
+
+def upgrade_schema(engine: Engine) -> int:
+    """
+    Create missing tables, migrate the database to :py:data:`SCHEMA_VERSION` and record the version.
+
+    Databases without a recorded version are treated as version 1
+    (migrations are no-ops for freshly created tables).
+
+    :raises RuntimeError: If the database schema is newer than this code.
+    :return: Schema version before the upgrade (None for databases without a recorded version).
+    """
+    with engine.begin() as connection:
+        previous_version = get_schema_version(connection)
+        version = previous_version or 1
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Database schema version {version} is newer than the supported "
+                f"version {SCHEMA_VERSION}. Please update the app."
+            )
+
+        _mapper_registry.metadata.create_all(connection)
+
+        for from_version in range(version, SCHEMA_VERSION):
+            _MIGRATIONS[from_version](connection)
+
+        if previous_version != SCHEMA_VERSION:
+            connection.execute(delete(schema_version_table))
+            connection.execute(
+                insert(schema_version_table).values(version=SCHEMA_VERSION)
+            )
+    return previous_version
+
+
+def check_schema_version(engine: Engine):
+    """
+    Verify that the database schema matches :py:data:`SCHEMA_VERSION`.
+
+    :raises RuntimeError: If it does not.
+    """
+    with engine.connect() as connection:
+        version = get_schema_version(connection)
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version is {version}, expected {SCHEMA_VERSION}. "
+            "Run `python -m app schema upgrade`."
+        )
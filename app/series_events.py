@@ -0,0 +1,117 @@
+"""
+Series Events
+-------------
+This module defines an in-process publish / subscribe mechanism for match series changes.
+
+Every series has a version that :py:meth:`~app.match_series_interface.MatchSeriesManager.set_hero_bans`
+increments and publishes here.
+Viewers subscribe to a series (:py:meth:`SeriesVersionBroker.subscribe`) with the version they show
+and are called back once a newer version is published, instead of rereading the series on every rerun.
+
+Changes made by other processes are picked up by a background poller
+(see :py:func:`app.common.rerun_on_series_change`) that reads the version column of
+:py:meth:`SeriesVersionBroker.subscribed_series` and publishes newer versions here.
+"""
+import threading
+from typing import Callable, Optional
+
+
+class SeriesVersionBroker:
+    """
+    Latest known version of every series with one-shot subscriptions to newer versions.
+    """
+
+    def __init__(self):
+        self._versions: dict[str, int] = {}
+        self._subscriptions: dict[
+            str, dict[str, tuple[int, Callable[[int], None]]]
+        ] = {}
+        """Version and callback of every subscriber by series ID and subscriber key."""
+        self._subscribed: dict[str, str] = {}
+        """Series ID by subscriber key."""
+        self._lock = threading.Lock()
+
+    def publish(self, series_id: str, version: int):
+        """
+        Record a version of a series and call its subscribers.
+
+        Versions older than the latest known version are ignored.
+        """
+        with self._lock:
+            if version <= self._versions.get(series_id, -1):
+                return
+            self._versions[series_id] = version
+            subscriptions = self._subscriptions.get(series_id, {})
+            callbacks = []
+            for key, (known_version, callback) in list(subscriptions.items()):
+                if version > known_version:
+                    del subscriptions[key]
+                    del self._subscribed[key]
+                    callbacks.append(callback)
+            if not subscriptions:
+                self._subscriptions.pop(series_id, None)
+        for callback in callbacks:
+            callback(version)
+
+    def subscribe(
+        self,
+        key: str,
+        series_id: str,
+        version: int,
+        callback: Callable[[int], None],
+    ):
+        """
+        Call `callback` with the new version once a version newer than `version` is published
+        (right away if it already was). The callback is called once, in the publishing thread.
+
+        :param key: Subscriber (e.g. a browser session). A subscriber follows one series at a time,
+            subscribing again replaces its previous subscription.
+        """
+        with self._lock:
+            self._unsubscribe(key)
+            latest = self._versions.get(series_id, version)
+            if latest <= version:
+                self._subscriptions.setdefault(series_id, {})[key] = (version, callback)
+                self._subscribed[key] = series_id
+                return
+        callback(latest)
+
+    def unsubscribe(self, key: str):
+        """
+        Cancel the subscription of a subscriber (if any).
+        """
+        with self._lock:
+            self._unsubscribe(key)
+
+    def _unsubscribe(self, key: str):
+        series_id = self._subscribed.pop(key, None)
+        if series_id is None:
+            return
+        subscriptions = self._subscriptions[series_id]
+        del subscriptions[key]
+        if not subscriptions:
+            del self._subscriptions[series_id]
+
+    def subscribers(self) -> list[str]:
+        """
+        Return keys of current subscribers.
+        """
+        with self._lock:
+            return list(self._subscribed)
+
+    def subscribed_series(self) -> list[str]:
+        """
+        Return IDs of series with subscribers.
+        """
+        with self._lock:
+            return list(self._subscriptions)
+
+    def latest(self, series_id: str) -> Optional[int]:
+        """
+        Return the latest known version of a series or None if nothing was published yet.
+        """
+        return self._versions.get(series_id)
+
+
+SERIES_EVENTS = SeriesVersionBroker()
+"""Process-wide :py:class:`SeriesVersionBroker`."""
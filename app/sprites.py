@@ -0,0 +1,217 @@
+"""
+Sprites
+-------
+This module packs the icons in `static/` into sprite sheets,
+so that the hero grid needs a single image request instead of one per hero.
+
+Sheets are generated at every size in :py:data:`SPRITE_SIZES` in WebP and PNG
+together with a JSON map of tile positions and file sizes.
+Viewers only download the sheet of the size bucket covering the selected icon size,
+in WebP if their browser supports it.
+The map records a fingerprint of `heroes.json` and of the packed icons;
+:py:func:`get_sprite_map` regenerates the sheets when the fingerprint is outdated
+and `python -m app sprites build` does so explicitly.
+
+Generation is deterministic: the same inputs always produce byte-identical sheets.
+"""
+import hashlib
+import json
+import math
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+from app.heroes import HEROES_DICT, __heroes_file_path__
+
+STATIC_DIR = Path(__file__).parent.parent / "static"
+"""Directory served by Streamlit under `app/static/`."""
+
+SPRITES_DIR = STATIC_DIR / "sprites"
+"""Directory with generated sprite sheets."""
+
+SPRITE_SIZES = (64, 96, 128, 152)
+"""Tile sizes (in pixels) of generated sheets. Covers the `Icon size` slider range (60-152px)."""
+
+SPRITE_FORMATS = {
+    "webp": {"quality": 85, "method": 6},
+    "png": {"optimize": True},
+}
+"""Formats of generated sheets (in order of preference) with Pillow save options."""
+
+PNG_PALETTE_COLORS = 256
+"""
+Number of colors PNG sheets are quantized to.
+Truecolor PNG sheets are larger than the separate icons, which would defeat the fallback.
+"""
+
+SPRITE_MAP_FILE = "sprites.json"
+
+_GENERATOR_VERSION = 3
+"""Bump to regenerate sheets after changing the generator."""
+
+_build_lock = threading.Lock()
+
+
+def sprite_sources(static_dir: Path = STATIC_DIR) -> list[Path]:
+    """
+    Return icons to pack: hero icons in `HEROES_DICT` order followed by other PNG files sorted by name.
+    """
+    hero_files = [static_dir / f"{hero['name']}.png" for hero in HEROES_DICT.values()]
+    other_files = sorted(set(static_dir.glob("*.png")) - set(hero_files))
+    return [path for path in hero_files if path.exists()] + other_files
+
+
+def sprite_fingerprint(
+    static_dir: Path = STATIC_DIR, heroes_file: Path = __heroes_file_path__
+) -> str:
+    """
+    Return a hash of everything the sheets are generated from.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(
+        f"{_GENERATOR_VERSION}:{SPRITE_SIZES}:{SPRITE_FORMATS}:{PNG_PALETTE_COLORS}".encode()
+    )
+    digest.update(heroes_file.read_bytes())
+    for path in sprite_sources(static_dir):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _square_icon(icon: Image.Image) -> Image.Image:
+    """
+    Center a non-square icon on a transparent square canvas, so that resizing does not distort it.
+    """
+    width, height = icon.size
+    if width == height:
+        return icon
+    side = max(width, height)
+    canvas = Image.new("RGBA", (side, side))
+    canvas.paste(icon, ((side - width) // 2, (side - height) // 2))
+    return canvas
+
+
+def build_sprite_sheets(
+    static_dir: Path = STATIC_DIR,
+    out_dir: Path = SPRITES_DIR,
+    heroes_file: Path = __heroes_file_path__,
+) -> dict:
+    """
+    Generate sprite sheets and the sprite map in `out_dir`.
+
+    Icons are placed on a square grid in :py:func:`sprite_sources` order and resized to each tile size
+    (non-square icons are padded with transparency first).
+    PNG sheets are quantized to :py:data:`PNG_PALETTE_COLORS` colors.
+
+    :return: The sprite map with keys `fingerprint`, `columns`, `rows`,
+        `sheets` (tile size -> format -> file name), `tiles` (icon name without extension -> [column, row]),
+        `bytes` (file name -> size of the file) and `source_bytes` (total size of the packed icons).
+    """
+    sources = sprite_sources(static_dir)
+    columns = math.ceil(math.sqrt(len(sources)))
+    rows = math.ceil(len(sources) / columns)
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    icons = [_square_icon(Image.open(path).convert("RGBA")) for path in sources]
+    sheets = {}
+    file_sizes = {}
+    for size in SPRITE_SIZES:
+        sheet = Image.new("RGBA", (columns * size, rows * size))
+        for index, icon in enumerate(icons):
+            row, column = divmod(index, columns)
+            sheet.paste(
+                icon.resize((size, size), Image.LANCZOS), (column * size, row * size)
+            )
+        sheets[str(size)] = {}
+        palette_sheet = sheet.quantize(
+            PNG_PALETTE_COLORS, method=Image.Quantize.FASTOCTREE
+        )
+        for image_format, save_options in SPRITE_FORMATS.items():
+            file_name = f"heroes_{size}.{image_format}"
+            image = palette_sheet if image_format == "png" else sheet
+            image.save(out_dir / file_name, **save_options)
+            sheets[str(size)][image_format] = file_name
+            file_sizes[file_name] = (out_dir / file_name).stat().st_size
+
+    for path in out_dir.glob("heroes_*"):
+        if path.name not in file_sizes:
+            path.unlink()
+
+    sprite_map = {
+        "fingerprint": sprite_fingerprint(static_dir, heroes_file),
+        "columns": columns,
+        "rows": rows,
+        "sheets": sheets,
+        "tiles": {
+            path.stem: list(reversed(divmod(index, columns)))
+            for index, path in enumerate(sources)
+        },
+        "bytes": file_sizes,
+        "source_bytes": sum(path.stat().st_size for path in sources),
+    }
+    with open(out_dir / SPRITE_MAP_FILE, "w") as fd:
+        json.dump(sprite_map, fd, indent=2)
+        fd.write("\n")
+    return sprite_map
+
+
+def load_sprite_map(out_dir: Path = SPRITES_DIR) -> Optional[dict]:
+    """
+    Return the sprite map or None if sheets were not generated yet.
+    """
+    try:
+        with open(out_dir / SPRITE_MAP_FILE, "r") as fd:
+            return json.load(fd)
+    except FileNotFoundError:
+        return None
+
+
+def sprite_sheets_up_to_date(
+    static_dir: Path = STATIC_DIR,
+    out_dir: Path = SPRITES_DIR,
+    heroes_file: Path = __heroes_file_path__,
+) -> bool:
+    """
+    Return whether the generated sheets match current icons and `heroes.json`.
+    """
+    sprite_map = load_sprite_map(out_dir)
+    return sprite_map is not None and sprite_map["fingerprint"] == sprite_fingerprint(
+        static_dir, heroes_file
+    )
+
+
+def sprite_size_report(sprite_map: dict) -> list[str]:
+    """
+    Return lines comparing download size of every sheet with downloading all icons separately.
+    """
+    source_bytes = sprite_map["source_bytes"]
+    lines = [f"separate icons: {source_bytes:>9} bytes"]
+    for size, files in sprite_map["sheets"].items():
+        for image_format, file_name in files.items():
+            sheet_bytes = sprite_map["bytes"][file_name]
+            lines.append(
+                f"{size:>4}px {image_format:<4}: {sheet_bytes:>9} bytes, "
+                f"saves {source_bytes - sheet_bytes:>9} bytes "
+                f"({1 - sheet_bytes / source_bytes:.0%})"
+            )
+    return lines
+
+
+@lru_cache(maxsize=1)
+def get_sprite_map() -> Optional[dict]:
+    """
+    Return the sprite map of :py:data:`SPRITES_DIR`, regenerating outdated sheets first.
+
+    :return: The sprite map or None if the sheets are outdated and cannot be written
+        (callers should fall back to individual icons).
+    """
+    with _build_lock:
+        if sprite_sheets_up_to_date():
+            return load_sprite_map()
+        try:
+            return build_sprite_sheets()
+        except OSError:
+            return None
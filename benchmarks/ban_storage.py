@@ -0,0 +1,261 @@
+"""
+Compare the legacy wide ban storage (one Boolean column per hero)
+with the `banned_mask` bitmask snapshot and the `ban_events` log.
+
+Usage::
+
+    python -m benchmarks.ban_storage [--series N] [--bans N] [--edits N]
+
+Every series is seeded with the same sequence of `--edits` edits in both layouts
+(one hero banned per edit, and one unbanned once `--bans` heroes are banned).
+The bitmask layout is edited through :py:meth:`~app.match_series_interface.MatchSeriesManager.set_hero_bans`,
+so the default number of edits leaves a tail of `ban_events` past the last snapshot
+(taken every :py:data:`~app.match_series_interface.SNAPSHOT_INTERVAL` versions)
+that loads through :py:meth:`~app.match_series_interface.MatchSeriesManager.get_view` have to replay.
+
+Reports database size per series, load latency of a series with its bans
+and the number of statements / bound parameters a `set_hero_bans` call sends.
+
+The bitmask layout pays for its edit history on writes and in size: an edit bumps the version
+and appends one `ban_events` row per changed hero (several statements and parameters),
+while the wide layout updates its hero columns with a single statement,
+and the event log grows with every edit.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import Boolean, Column, DateTime, Table, Text, Uuid, create_engine
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, registry
+from sqlalchemy.sql import func
+
+from app.heroes import HEROES_DICT
+from app.match_series_interface import (
+    SNAPSHOT_INTERVAL,
+    MatchSeries,
+    MatchSeriesManager,
+    MatchSeriesViewCache,
+    _mapper_registry,
+    generate_uuid,
+)
+
+_legacy_registry = registry()
+
+
+class LegacyMatchSeries:
+    """The match series model before bans were normalized."""
+
+    def _ban(self, hero):
+        setattr(self, hero + "_banned", True)
+
+    def _unban(self, hero):
+        setattr(self, hero + "_banned", False)
+
+    @property
+    def banned_heroes(self):
+        return {hero for hero in HEROES_DICT if getattr(self, hero + "_banned")}
+
+
+_legacy_registry.map_imperatively(
+    LegacyMatchSeries,
+    Table(
+        "match_series",
+        _legacy_registry.metadata,
+        Column("id", Uuid(as_uuid=False), primary_key=True, default=generate_uuid),
+        Column("created_at", DateTime, default=func.now()),
+        Column("name", Text),
+        Column("edit_key", Uuid(as_uuid=False), default=generate_uuid),
+        *(
+            Column(hero + "_banned", Boolean, default=False)
+            for hero in sorted(HEROES_DICT)
+        ),
+    ),
+)
+
+STORAGES = {
+    "wide": (_legacy_registry.metadata, LegacyMatchSeries),
+    "bitmask": (_mapper_registry.metadata, MatchSeries),
+}
+
+
+@contextmanager
+def _count_statements(engine):
+    counts = {"statements": 0, "parameters": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        counts["statements"] += 1
+        rows = parameters if many else [parameters]
+        counts["parameters"] += sum(len(row) for row in rows)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counts
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _edit_plans(series_count, bans_per_series, edits_per_series):
+    """
+    Return `(ban_hero, unban_hero or None)` edits of every series.
+    """
+    heroes = sorted(HEROES_DICT)
+    rng = random.Random(0)
+    plans = []
+    for _ in range(series_count):
+        banned = []
+        plan = []
+        for _ in range(edits_per_series):
+            hero = rng.choice([hero for hero in heroes if hero not in banned])
+            unban = None
+            if len(banned) >= bans_per_series:
+                unban = banned.pop(rng.randrange(len(banned)))
+            banned.append(hero)
+            plan.append((hero, unban))
+        plans.append(plan)
+    return plans
+
+
+def _fast_sqlite_engine(path):
+    """
+    Return an engine that does not sync every commit to disk, so seeding many edits is quick.
+    """
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA synchronous = OFF")
+
+    return engine
+
+
+def _seed_wide(session, plans):
+    ids = []
+    for index, plan in enumerate(plans):
+        series = LegacyMatchSeries(name=f"series {index}")
+        session.add(series)
+        session.commit()
+        for hero, unban in plan:
+            series._ban(hero)
+            if unban is not None:
+                series._unban(unban)
+            session.commit()
+        ids.append(series.id)
+    return ids
+
+
+def _seed_bitmask(session, plans):
+    created = MatchSeriesManager.create_many(
+        session,
+        [(f"series {index}", []) for index in range(len(plans))],
+        limiter=None,
+    )
+    for match_series, plan in zip(created, plans):
+        manager = MatchSeriesManager(session, match_series.id, match_series.edit_key)
+        for hero, unban in plan:
+            manager.set_hero_bans([hero], [unban] if unban is not None else [])
+    return [match_series.id for match_series in created]
+
+
+def _load_wide(session, series_id):
+    stmt = select(LegacyMatchSeries).where(LegacyMatchSeries.id == series_id)
+    return session.scalars(stmt).one().banned_heroes
+
+
+def _load_bitmask(session, series_id):
+    # a new cache for every load, so that every load reads the database
+    return MatchSeriesManager.get_view(
+        session, series_id, MatchSeriesViewCache()
+    ).banned_heroes
+
+
+def _measure(storage, plans):
+    metadata, model = STORAGES[storage]
+    seed, load_series = {
+        "wide": (_seed_wide, _load_wide),
+        "bitmask": (_seed_bitmask, _load_bitmask),
+    }[storage]
+    heroes = sorted(HEROES_DICT)
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        engine = _fast_sqlite_engine(path)
+        metadata.create_all(engine)
+
+        with Session(engine, expire_on_commit=False) as session:
+            ids = seed(session, plans)
+            edit_keys = dict(session.execute(select(model.id, model.edit_key)).all())
+        engine.dispose()
+        size = os.path.getsize(path)
+
+        engine = create_engine(f"sqlite:///{path}")
+        sample = rng.sample(ids, min(200, len(ids)))
+
+        start = time.perf_counter()
+        for series_id in sample:
+            with Session(engine) as session:
+                load_series(session, series_id)
+        load = (time.perf_counter() - start) / len(sample)
+
+        with Session(engine) as session:
+            series_id = sample[0]
+            if storage == "bitmask":
+                manager = MatchSeriesManager(session, series_id, edit_keys[series_id])
+                banned = manager.match_series.banned_heroes
+                with _count_statements(engine) as counts:
+                    manager.set_hero_bans(
+                        [hero for hero in heroes if hero not in banned][:2], []
+                    )
+            else:
+                series = session.scalars(
+                    select(model).where(model.id == series_id)
+                ).one()
+                banned = series.banned_heroes
+                with _count_statements(engine) as counts:
+                    for hero in [hero for hero in heroes if hero not in banned][:2]:
+                        series._ban(hero)
+                    session.commit()
+        engine.dispose()
+
+    return {
+        "storage": storage,
+        "bytes_per_series": size / len(plans),
+        "load_ms": load * 1000,
+        **counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--series", type=int, default=2000)
+    parser.add_argument("--bans", type=int, default=12, help="Bans per series.")
+    parser.add_argument(
+        "--edits",
+        type=int,
+        default=SNAPSHOT_INTERVAL + SNAPSHOT_INTERVAL // 2,
+        help="Edits per series.",
+    )
+    args = parser.parse_args()
+
+    plans = _edit_plans(args.series, args.bans, args.edits)
+    for storage in STORAGES:
+        result = _measure(storage, plans)
+        print(
+            f"{result['storage']:>10}: "
+            f"{result['bytes_per_series']:7.1f} bytes/series, "
+            f"load {result['load_ms']:6.3f} ms, "
+            f"set_hero_bans: {result['statements']} statements, "
+            f"{result['parameters']} parameters"
+        )
+    print(
+        "bitmask edits bump the version and append a ban_events row per changed hero, "
+        "so they send more statements and the event log grows with every edit."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compare rendering the View page hero grid and stylesheet by string concatenation on every rerun
+with the memoized rendering of :py:mod:`app.hero_grid`.
+
+Usage::
+
+    python -m benchmarks.hero_grid [--reruns N]
+
+Reports render time per rerun for a no-op rerun, a rerun after a name filter keystroke
+and a rerun after a new ban.
+"""
+import argparse
+import random
+import time
+
+from app.ban_set import BanSet
+from app.hero_grid import _hero_grid, hero_grid, hero_grid_style, hero_tile
+from app.heroes import HEROES_DICT, search_heroes
+
+
+def _image_with_tooltip(img, tooltip, ban=False, filtered=False):
+    ban_image = (
+        '<img class= "image ban" src="app/static/ban.png" alt="ban image">'
+        if ban
+        else ""
+    )
+    return (
+        f'<div class="hoverable{" filtered" if filtered else ""}">'
+        f'<img class="image" src="{img}" alt="{tooltip}">'
+        + ban_image
+        + f'<div class="tooltip">{tooltip.replace("-", " ")}</div>'
+        "</div>"
+    )
+
+
+def _legacy_render(banned_heroes, name_filter, image_width):
+    """The View page rendering before memoization (grid + stylesheet)."""
+    unfiltered_images = ""
+    filtered_images = ""
+    name_matches = search_heroes(name_filter) if name_filter else None
+
+    for hero_name, hero in HEROES_DICT.items():
+        filtered = name_matches is not None and hero_name not in name_matches
+        image = _image_with_tooltip(
+            f"app/static/{hero['name']}.png",
+            hero["name"],
+            hero_name in banned_heroes,
+            filtered,
+        )
+        if filtered:
+            filtered_images += image
+        else:
+            unfiltered_images += image
+    html = '<div class="heroes">' + unfiltered_images + filtered_images + "</div>"
+
+    style = f"""
+.hoverable {{
+    width: {image_width}px;
+}}
+.hoverable .image {{
+    width: {image_width}px;
+}}
+"""
+    return html, style
+
+
+def _memoized_render(banned_heroes, name_filter, image_width):
+    html = hero_grid(
+        banned_heroes,
+        name_matches=search_heroes(name_filter) if name_filter else None,
+    )
+    return html, hero_grid_style(image_width, True, False)
+
+
+def _clear_caches():
+    for function in (_hero_grid, hero_tile, hero_grid_style, search_heroes):
+        function.cache_clear()
+
+
+def _scenarios(reruns: int):
+    rng = random.Random(0)
+    heroes = list(HEROES_DICT)
+    banned = BanSet(rng.sample(heroes, 20))
+    names = [hero["name"] for hero in HEROES_DICT.values()]
+
+    yield "no-op rerun", [(banned, "", 90)] * reruns
+
+    keystrokes = [rng.choice(names)[: rng.randint(1, 4)] for _ in range(reruns)]
+    yield "name filter", [(banned, keystroke, 90) for keystroke in keystrokes]
+
+    bans = [banned | BanSet(rng.sample(heroes, 2)) for _ in range(reruns)]
+    yield "new ban", [(ban_set, "", 90) for ban_set in bans]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--reruns", type=int, default=2000)
+    args = parser.parse_args()
+
+    for scenario, reruns in _scenarios(args.reruns):
+        results = []
+        for render in (_legacy_render, _memoized_render):
+            _clear_caches()
+            start = time.perf_counter()
+            for rerun in reruns:
+                render(*rerun)
+            results.append((time.perf_counter() - start) / len(reruns) * 1e6)
+        print(
+            f"{scenario:>12}: "
+            f"concatenation {results[0]:7.1f} us/rerun, "
+            f"memoized {results[1]:7.1f} us/rerun"
+        )
+
+
+if __name__ == "__main__":
+    main()
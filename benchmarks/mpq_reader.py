@@ -0,0 +1,119 @@
+"""
+Compare :py:class:`app.mpq.MPQReader` with :py:class:`mpyq.MPQArchive`.
+
+Each reader extracts `replay.details` from every replay in a fresh process,
+so peak RSS values are not polluted by the other reader.
+
+Usage::
+
+    python -m benchmarks.mpq_reader [REPLAY ...]
+
+Replays default to the contents of `REPLAY_DIR`;
+if it is not set synthetic replays are generated.
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+
+def _open_mpyq(data):
+    import mpyq
+
+    return mpyq.MPQArchive(BytesIO(data))
+
+
+def _open_mpq_reader(data):
+    from app.mpq import MPQReader
+
+    return MPQReader(BytesIO(data))
+
+
+READERS = {"mpyq": _open_mpyq, "MPQReader": _open_mpq_reader}
+
+
+def _measure(reader_name, replays, repeat):
+    from heroprotocol.versions import build, latest
+
+    open_archive = READERS[reader_name]
+    # import protocol modules beforehand to keep them out of the measurements
+    latest_protocol = latest()
+    for data in replays:
+        archive = open_archive(data)
+        header = latest_protocol.decode_replay_header(
+            archive.header["user_data_header"]["content"]
+        )
+        build(header["m_version"]["m_baseBuild"])
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data in replays:
+            archive = open_archive(data)
+            header = latest_protocol.decode_replay_header(
+                archive.header["user_data_header"]["content"]
+            )
+            protocol = build(header["m_version"]["m_baseBuild"])
+            protocol.decode_replay_details(archive.read_file("replay.details"))
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return {
+        "reader": reader_name,
+        "seconds_per_replay": elapsed / (repeat * len(replays)),
+        "traced_peak_kib": traced_peak / 1024,
+        "peak_rss_kib": rss_after,
+        "peak_rss_growth_kib": rss_after - rss_before,
+    }
+
+
+def _load_replays(paths):
+    if not paths:
+        load_dotenv()
+        replay_dir = Path(os.getenv("REPLAY_DIR", ""))
+        if os.getenv("REPLAY_DIR") and replay_dir.is_dir():
+            paths = sorted(replay_dir.iterdir())
+    if paths:
+        return [Path(path).read_bytes() for path in paths]
+
+    from tests.replay_factory import make_replay
+
+    return [make_replay(trailing_events=20000, single_unit=False) for _ in range(5)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("replays", nargs="*", help="Paths to `.StormReplay` files.")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    replays = _load_replays(args.replays)
+    print(
+        f"{len(replays)} replays, "
+        f"{sum(map(len, replays)) / len(replays) / 1024:.0f} KiB on average"
+    )
+
+    context = multiprocessing.get_context("spawn")
+    for reader_name in READERS:
+        with context.Pool(1) as pool:
+            result = pool.apply(_measure, (reader_name, replays, args.repeat))
+        print(
+            f"{result['reader']:>10}: "
+            f"{result['seconds_per_replay'] * 1000:8.3f} ms/replay, "
+            f"traced peak {result['traced_peak_kib']:9.1f} KiB, "
+            f"peak RSS {result['peak_rss_kib']} KiB "
+            f"(+{result['peak_rss_growth_kib']} KiB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
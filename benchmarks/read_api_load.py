@@ -0,0 +1,231 @@
+"""
+Load-test the JSON read API (:py:mod:`app.read_api`) with simulated overlays.
+
+Starts the API in a subprocess on a temporary SQLite database with one series
+and runs `--clients` overlays on keep-alive connections, each polling the series once per `--interval` seconds
+with `If-None-Match` (or long-polling it with `--long-poll`) while the series is edited every `--edit-interval` seconds.
+
+Usage::
+
+    python -m benchmarks.read_api_load [--clients N] [--duration SECONDS] [--interval SECONDS]
+        [--edit-interval SECONDS] [--long-poll] [--port PORT]
+
+Reports requests per second, response statuses, latency percentiles
+and CPU seconds used by the server process while the overlays ran (Linux only).
+"""
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.heroes import HEROES_DICT
+from app.match_series_interface import MatchSeriesManager
+from app.schema import upgrade_schema
+
+
+async def _get(reader, writer, path, etag):
+    """
+    Send a GET request on a keep-alive connection and return status and ETag of the response.
+    """
+    headers = f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+    if etag is not None:
+        headers += f"If-None-Match: {etag}\r\n"
+    writer.write((headers + "\r\n").encode())
+    await writer.drain()
+
+    status_line = await reader.readline()
+    status = int(status_line.split()[1])
+    response_etag = None
+    content_length = 0
+    while (line := await reader.readline()) != b"\r\n":
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.lower() == "etag":
+            response_etag = value.strip()
+        elif name.lower() == "content-length":
+            content_length = int(value)
+    await reader.readexactly(content_length)
+    return status, response_etag
+
+
+async def _overlay(port, path, interval, long_poll, deadline, stats):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    etag = None
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status, response_etag = await _get(
+                reader, writer, f"{path}?wait={interval}" if long_poll else path, etag
+            )
+            stats["latencies"].append(time.perf_counter() - start)
+            stats["statuses"][status] += 1
+            etag = response_etag or etag
+            if not long_poll:
+                await asyncio.sleep(interval)
+    finally:
+        writer.close()
+
+
+async def _run_clients(port, path, clients, interval, long_poll, duration):
+    stats = {"latencies": [], "statuses": Counter()}
+    deadline = time.monotonic() + duration
+    # spread the first requests over the interval like independent overlays would
+    await asyncio.gather(
+        *(
+            _start_overlay(
+                index * interval / clients,
+                port,
+                path,
+                interval,
+                long_poll,
+                deadline,
+                stats,
+            )
+            for index in range(clients)
+        )
+    )
+    return stats
+
+
+async def _start_overlay(delay, *args):
+    await asyncio.sleep(delay)
+    await _overlay(*args)
+
+
+def _wait_for_server(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("The API server did not start.")
+
+
+def _cpu_seconds(pid):
+    """
+    Return CPU seconds (user and system) used by a process so far or None if unknown.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as fd:
+            # fields after the executable name, which may contain spaces
+            fields = fd.read().rpartition(")")[2].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _edit_periodically(engine, series_id, edit_key, interval, stop):
+    heroes = list(HEROES_DICT)
+    index = 0
+    with Session(engine) as session:
+        manager = MatchSeriesManager(session, series_id, edit_key)
+        while not stop.wait(interval):
+            manager.set_hero_bans([heroes[index % len(heroes)]], [])
+            index += 1
+
+
+def run(clients, duration, interval, edit_interval, long_poll, port):
+    """
+    Start the server, run the overlays and return measurements.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite:///{os.path.join(directory, 'match_series.db')}"
+        engine = create_engine(url)
+        upgrade_schema(engine)
+        with Session(engine) as session:
+            series = MatchSeriesManager.create_new(
+                session, "load test", [], limiter=None
+            )
+            series_id, edit_key = series.id, series.edit_key
+
+        server = subprocess.Popen(
+            [sys.executable, "-m", "app", "api", "serve", "--url", url]
+            + ["--port", str(port)]
+        )
+        stop = threading.Event()
+        editor = threading.Thread(
+            target=_edit_periodically,
+            args=(engine, series_id, edit_key, edit_interval, stop),
+        )
+        try:
+            _wait_for_server(port)
+            editor.start()
+            start = time.perf_counter()
+            start_cpu = _cpu_seconds(server.pid)
+            stats = asyncio.run(
+                _run_clients(
+                    port, f"/series/{series_id}", clients, interval, long_poll, duration
+                )
+            )
+            end_cpu = _cpu_seconds(server.pid)
+            elapsed = time.perf_counter() - start
+        finally:
+            stop.set()
+            if editor.is_alive():
+                editor.join()
+            server.send_signal(signal.SIGINT)
+            server.wait()
+
+    latencies = sorted(stats["latencies"])
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "statuses": dict(stats["statuses"]),
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+        "server_cpu_seconds": (
+            end_cpu - start_cpu
+            if start_cpu is not None and end_cpu is not None
+            else None
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="Seconds between polls."
+    )
+    parser.add_argument(
+        "--edit-interval", type=float, default=5.0, help="Seconds between edits."
+    )
+    parser.add_argument("--long-poll", action="store_true")
+    parser.add_argument("--port", type=int, default=8599)
+    args = parser.parse_args()
+
+    results = run(
+        args.clients,
+        args.duration,
+        args.interval,
+        args.edit_interval,
+        args.long_poll,
+        args.port,
+    )
+    print(
+        f"{results['requests']} requests ({results['requests_per_second']:.1f}/s), "
+        f"statuses {results['statuses']}, "
+        f"p50 {results['p50_ms']:.2f} ms, p95 {results['p95_ms']:.2f} ms"
+    )
+    cpu_seconds = results["server_cpu_seconds"]
+    if cpu_seconds is not None:
+        print(
+            f"server CPU {cpu_seconds:.2f} s ({cpu_seconds / args.duration:.1%} of a core, "
+            f"{cpu_seconds / results['requests'] * 1e6:.0f} µs/request)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Measure replay parsing stages on synthetic replays.
+
+Fixtures are generated with :py:mod:`tests.replay_factory` (no real replays needed)
+in three sizes for several base builds.
+Every stage is timed on every fixture; peak traced memory is measured in a separate pass,
+so that tracing does not distort the timings.
+
+Usage::
+
+    python -m benchmarks.replay_parsing [--repeat N] [--builds BUILD ...]
+        [--output results.json] [--compare baseline.json] [--write-fixtures DIR]
+
+Results are saved as JSON together with the commit they were measured on;
+`--compare` prints the change of median latencies against an earlier result file.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from importlib.metadata import version
+from io import BytesIO
+from pathlib import Path
+
+from app.heroes import (
+    extract_draft_from_replay,
+    extract_heroes_from_details,
+    extract_heroes_from_replay,
+    extract_heroes_from_tracker_events,
+    get_archive_protocol,
+)
+from app.protocols import PROTOCOLS
+from tests.replay_factory import make_replay
+
+FIXTURES = {
+    "small": {"trailing_events": 100},
+    "medium": {"trailing_events": 5000},
+    "large": {"leading_events": 2000, "trailing_events": 50000, "single_unit": False},
+}
+"""Fixture sizes (keyword arguments of :py:func:`tests.replay_factory.make_replay`)."""
+
+DEFAULT_BUILDS = (91756, 89566, 77662)
+
+
+def _open(data):
+    return get_archive_protocol(BytesIO(data))
+
+
+def _stage_get_archive_protocol(data):
+    with _open(data):
+        pass
+
+
+def _stage_details(data):
+    with _open(data) as (archive, protocol):
+        start = time.perf_counter()
+        extract_heroes_from_details(archive, protocol)
+        return time.perf_counter() - start
+
+
+def _stage_tracker_events(data):
+    with _open(data) as (archive, protocol):
+        start = time.perf_counter()
+        extract_heroes_from_tracker_events(archive, protocol)
+        return time.perf_counter() - start
+
+
+def _stage_end_to_end(data):
+    extract_heroes_from_replay(BytesIO(data))
+
+
+def _stage_draft(data):
+    extract_draft_from_replay(BytesIO(data))
+
+
+STAGES = {
+    "get_archive_protocol": _stage_get_archive_protocol,
+    "extract_heroes_from_details": _stage_details,
+    "extract_heroes_from_tracker_events": _stage_tracker_events,
+    "extract_heroes_from_replay": _stage_end_to_end,
+    "extract_draft_from_replay": _stage_draft,
+}
+"""Stages to measure. Stages returning a duration exclude opening the archive from the measurement."""
+
+
+def make_fixtures(builds):
+    """
+    Return `{(fixture name, base build): replay bytes}`.
+    """
+    return {
+        (name, base_build): make_replay(base_build=base_build, **kwargs)
+        for name, kwargs in FIXTURES.items()
+        for base_build in builds
+    }
+
+
+def _measure(stage, data, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        duration = stage(data)
+        durations.append(
+            duration if duration is not None else time.perf_counter() - start
+        )
+
+    tracemalloc.start()
+    stage(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    durations.sort()
+    median = statistics.median(durations)
+    return {
+        "median_ms": median * 1000,
+        "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000,
+        "replays_per_second": 1 / median if median else None,
+        "peak_memory_kib": peak / 1024,
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(builds, repeat):
+    """
+    Measure every stage on every fixture.
+
+    :return: JSON serializable results.
+    """
+    fixtures = make_fixtures(builds)
+    # import protocol modules beforehand to keep them out of the measurements
+    PROTOCOLS.preload(builds)
+
+    results = []
+    for (name, base_build), data in fixtures.items():
+        for stage_name, stage in STAGES.items():
+            results.append(
+                {
+                    "fixture": name,
+                    "base_build": base_build,
+                    "size_bytes": len(data),
+                    "stage": stage_name,
+                    **_measure(stage, data, repeat),
+                }
+            )
+
+    return {
+        "meta": {
+            "commit": _commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "heroprotocol": version("heroprotocol"),
+            "repeat": repeat,
+            "protocol_import_seconds": {
+                str(base_build): PROTOCOLS.import_times.get(base_build)
+                for base_build in builds
+            },
+        },
+        "results": results,
+    }
+
+
+def _key(result):
+    return result["fixture"], result["base_build"], result["stage"]
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Return lines describing the change of median latencies against `baseline`.
+
+    Changes above `threshold` (relative) are marked.
+    """
+    baseline_results = {_key(result): result for result in baseline["results"]}
+    lines = [
+        f"compared with {baseline['meta'].get('commit')} "
+        f"({baseline['meta'].get('created_at')})"
+    ]
+    for result in current["results"]:
+        before = baseline_results.get(_key(result))
+        if before is None:
+            continue
+        change = result["median_ms"] / before["median_ms"] - 1
+        mark = (
+            " REGRESSION"
+            if change > threshold
+            else " improvement"
+            if change < -threshold
+            else ""
+        )
+        lines.append(
+            f"{result['fixture']:>6} {result['base_build']} {result['stage']:<35} "
+            f"{before['median_ms']:8.3f} -> {result['median_ms']:8.3f} ms "
+            f"({change:+.0%}){mark}"
+        )
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--builds", type=int, nargs="+", default=list(DEFAULT_BUILDS))
+    parser.add_argument("--output", default="replay_parsing.json")
+    parser.add_argument("--compare", help="Earlier result file to compare with.")
+    parser.add_argument(
+        "--write-fixtures",
+        metavar="DIR",
+        help="Write the generated fixtures to DIR as .StormReplay files and exit.",
+    )
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        directory = Path(args.write_fixtures)
+        directory.mkdir(parents=True, exist_ok=True)
+        for (name, base_build), data in make_fixtures(args.builds).items():
+            (directory / f"{name}_{base_build}.StormReplay").write_bytes(data)
+        return
+
+    results = run(args.builds, args.repeat)
+    for result in results["results"]:
+        print(
+            f"{result['fixture']:>6} {result['base_build']} "
+            f"({result['size_bytes'] / 1024:7.1f} KiB) {result['stage']:<35} "
+            f"median {result['median_ms']:8.3f} ms, p95 {result['p95_ms']:8.3f} ms, "
+            f"{result['replays_per_second']:8.1f} replays/s, "
+            f"peak {result['peak_memory_kib']:8.1f} KiB"
+        )
+
+    with open(args.output, "w") as fd:
+        json.dump(results, fd, indent=2)
+    print(f"Results saved to {args.output}.")
+
+    if args.compare:
+        with open(args.compare) as fd:
+            print("\n".join(compare(json.load(fd), results)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
-from datetime import datetime, timedelta
-
 import streamlit as st
 
-from app import HEROES_DICT, clean_hero_name, MatchSeriesManager, db_connection
+from app import (
+    CREATE_RATE_LIMITER,
+    HEROES_DICT,
+    MatchSeriesManager,
+    RateLimitExceeded,
+    clean_hero_name,
+    client_id,
+    db_connection,
+    is_admin,
+)
+from app.bulk_series import parse_series_file, series_links_csv
 
 
 st.set_page_config(
@@ -16,12 +24,17 @@ ERROR_MESSAGE = (
     "See full list of heroes at https://heroesofthestorm.blizzard.com/en-us/heroes/.",
 )
 
-SPAM_MESSAGE = "Please wait. You can only create a match series once every minute."
-
-SPAM_DELTA = timedelta(minutes=1)
+is_admin_page = is_admin()
 
 st.experimental_set_query_params()
 
+if is_admin_page:
+    stats = CREATE_RATE_LIMITER.stats
+    st.caption(
+        f"Series creation in this process: {stats['allowed']} allowed, "
+        f"{stats['denied']} rate limited ({stats['deny_rate']:.0%})."
+    )
+
 if "match_series_data" not in st.session_state:
     st.session_state["match_series_data"] = None
 
@@ -52,11 +65,6 @@ def on_pre_banned_heroes():
     )
 
     if len(incorrect_names) == 0:
-        if "last_game_created_at" in st.session_state:
-            if datetime.now() - st.session_state["last_game_created_at"] < SPAM_DELTA:
-                st.session_state["match_series_data"] = SPAM_MESSAGE
-                return
-        st.session_state["last_game_created_at"] = datetime.now()
         st.session_state["match_series_data"] = {
             "name": st.session_state["series_name"],
             "pre_banned_heroes": {hero_name[1] for hero_name in parsed_hero_names},
@@ -84,26 +92,79 @@ if submit:
     match_series_data = st.session_state["match_series_data"]
     if isinstance(match_series_data, dict):
         with db_connection() as session:
-            match_series = MatchSeriesManager.create_new(
-                session,
-                match_series_data["name"],
-                match_series_data["pre_banned_heroes"],
-            )
-            st.success(
-                f"Success! Number of banned heroes: {len(match_series.banned_heroes)}."
-            )
-
-            st.markdown(
-                f"[Link with Edit permissions](/View_Match_Series?id={match_series.id}"
-                f"&edit_key={match_series.edit_key})"
-                f" &mdash; this link allows to view and edit bans."
-            )
-
-            st.markdown(
-                f"[Link with View permissions](/View_Match_Series?id={match_series.id})"
-                f" &mdash; this link allows to view bans."
-            )
+            try:
+                match_series = MatchSeriesManager.create_new(
+                    session,
+                    match_series_data["name"],
+                    match_series_data["pre_banned_heroes"],
+                    client_id=client_id(),
+                )
+            except RateLimitExceeded as error:
+                st.warning(str(error))
+            else:
+                st.success(
+                    f"Success! Number of banned heroes: {len(match_series.banned_heroes)}."
+                )
+
+                st.markdown(
+                    f"[Link with Edit permissions](/View_Match_Series?id={match_series.id}"
+                    f"&edit_key={match_series.edit_key})"
+                    f" &mdash; this link allows to view and edit bans."
+                )
+
+                st.markdown(
+                    f"[Link with View permissions](/View_Match_Series?id={match_series.id})"
+                    f" &mdash; this link allows to view bans."
+                )
     elif isinstance(match_series_data, str):
         st.warning(match_series_data)
     else:
         st.error("Something went wrong, please reload the page and submit an issue.")
+
+
+# bulk creation is not rate limited, so it is only offered to admins
+if is_admin_page:
+    with st.expander("Create many match series"):
+        bulk_form = st.form("new_match_series_bulk", clear_on_submit=True)
+
+        series_file = bulk_form.file_uploader(
+            "Series list",
+            type=["csv", "json"],
+            help="CSV file with `name` and `pre_bans` (semicolon separated hero names) columns "
+            'or JSON list of `{"name": ..., "pre_bans": [...]}` objects.',
+        )
+        common_pre_bans = bulk_form.text_area(
+            "Pre-banned heroes in every series",
+            help="New-line separated list of hero names.",
+            height=100,
+        )
+        bulk_submit = bulk_form.form_submit_button("Create")
+
+        if bulk_submit:
+            if series_file is None:
+                st.warning("Please upload a series list.")
+            else:
+                try:
+                    specs = parse_series_file(
+                        series_file.name,
+                        series_file.getvalue().decode("utf-8"),
+                        common_pre_bans.split("\n"),
+                    )
+                except (ValueError, UnicodeDecodeError) as error:
+                    st.warning(f"Could not read the series list: {error}")
+                else:
+                    with db_connection() as session:
+                        created = MatchSeriesManager.create_many(
+                            session,
+                            [(spec.name, spec.pre_banned_heroes) for spec in specs],
+                            limiter=None,
+                        )
+                    st.success(f"Success! Created {len(created)} match series.")
+                    st.download_button(
+                        "Download links",
+                        series_links_csv(
+                            created, st.secrets.get("links", {}).get("base_url", "")
+                        ),
+                        file_name="match_series_links.csv",
+                        mime="text/csv",
+                    )
@@ -1,15 +1,31 @@
+from typing import Optional
+
 import streamlit as st
 from st_keyup import st_keyup
 from sqlalchemy.exc import NoResultFound
 
 from app import (
-    extract_heroes_from_replay,
-    HEROES_DICT,
+    BAN,
+    BAN_FILTERS,
+    BanEvent,
+    BanSet,
+    EditConflictError,
+    extract_heroes_from_replays,
+    GameBans,
     HERO_ROLES,
-    clean_hero_name,
     MatchSeriesManager,
+    MatchSeriesView,
     align_headers,
     db_connection,
+    preload_protocols,
+    replay_cache,
+    rerun_on_series_change,
+    hero_grid,
+    hero_grid_style,
+    search_heroes,
+    stop_following_series,
+    TRACE_SUMMARY,
+    is_admin,
 )
 
 st.set_page_config(
@@ -18,47 +34,34 @@ st.set_page_config(
     initial_sidebar_state="expanded",
 )
 
+preload_protocols()
 
-def image_with_tooltip(img, tooltip, ban: bool = False, filtered: bool = False):
-    """
-    Return HTML image with a tooltip and an optional ban cross.
-
-    :param img: Image source.
-    :param tooltip: Tooltip text.
-    :param ban: Whether to add a ban cross.
-    :param filtered: Whether this image should have `filtered` class.
-    """
-    ban_image = (
-        '<img class= "image ban" src="app/static/ban.png" alt="ban image">'
-        if ban
-        else ""
-    )
 
-    image_hover = (
-        f'<div class="hoverable{" filtered" if filtered else ""}">'
-        f'<img class="image" src="{img}" alt="{tooltip}">'
-        + ban_image
-        + f'<div class="tooltip">{tooltip.replace("-", " ")}</div>'
-        '</div>'
-    )
+LIVE_UPDATES_SETTINGS = st.secrets.get("live_updates", {})
 
-    return image_hover
+# number of ban events per page of the ban history
+HISTORY_PAGE_SIZE = 20
 
 
-def view_match_series(manager: MatchSeriesManager):
+def view_match_series(
+    match_series: MatchSeriesView, manager: Optional[MatchSeriesManager] = None
+) -> bool:
     """
-    Show match series view for a match series defined by `manager`.
+    Show match series view for a match series.
+
+    :param match_series: Series to show.
+    :param manager: Manager of the series if the user provided an edit key.
+    :return: Whether the user wants to follow live updates.
     """
-    match_series = manager.match_series
     banned_heroes = match_series.banned_heroes
-    edit_permission = manager.edit_permission
+    edit_permission = manager is not None and manager.edit_permission
 
     filters = st.columns(3)
 
     with filters[0]:
         ban_filter = st.select_slider(
             "Which heroes to display",
-            ["Banned Only", "All", "Available Only"],
+            BAN_FILTERS,
             value="All",
         )
         if ban_filter == "Banned Only":
@@ -86,25 +89,34 @@ def view_match_series(manager: MatchSeriesManager):
         "Hide filters", value=False, help="Hide all filters above the match series name"
     )
 
+    live_updates = st.sidebar.checkbox(
+        "Live updates",
+        value=LIVE_UPDATES_SETTINGS.get("enabled", False),
+        help="Show new bans as soon as they are made without reloading the page",
+    )
+
     if edit_permission:
         st.sidebar.title("Edit Bans")
         form = st.sidebar.form("upload_form", clear_on_submit=True)
 
         def process_uploaded_files():
-            heroes_to_ban = set()
-            heroes_to_unban = set()
+            games = []
 
             uploaded_files = st.session_state["file_uploader"]
-            for file in uploaded_files:
-                hero_list = extract_heroes_from_replay(file)
-                if isinstance(hero_list, str):
-                    form.error(hero_list)
-                    return
+            results = extract_heroes_from_replays(uploaded_files, replay_cache())
+            for file, result in zip(uploaded_files, results):
+                if result.ok:
+                    games.append(GameBans(result.heroes, result.replay_hash))
                 else:
-                    heroes_to_ban.update(hero_list)
-            heroes_to_ban.update(st.session_state["ban_heroes"])
-            heroes_to_unban.update(st.session_state["unban_heroes"])
-            manager.set_hero_bans(heroes_to_ban, heroes_to_unban)
+                    form.error(f"{file.name}: {result.message}")
+            try:
+                manager.set_hero_bans(
+                    st.session_state["ban_heroes"],
+                    st.session_state["unban_heroes"],
+                    games,
+                )
+            except EditConflictError as error:
+                form.error(str(error))
 
         form.file_uploader(
             "Upload replay(s) to ban heroes from",
@@ -115,7 +127,7 @@ def view_match_series(manager: MatchSeriesManager):
         form.write("Manual Edits")
         form.multiselect(
             "Choose heroes to ban",
-            options=set(HEROES_DICT.keys()) - banned_heroes,
+            options=BanSet.all() - banned_heroes,
             help="Choose heroes to ban in addition to the heroes from the replay(s)",
             key="ban_heroes",
         )
@@ -127,54 +139,41 @@ def view_match_series(manager: MatchSeriesManager):
         )
         form.form_submit_button("Submit", on_click=process_uploaded_files)
 
-    def display_heroes():
-        unfiltered_images = ""
-        filtered_images = ""
-
-        for hero_name, hero in HEROES_DICT.items():
-            filtered = False
-
-            clean_filter = clean_hero_name(name_filter)
-            if role_filter and hero["role"] not in role_filter:
-                filtered = True
-            if ban_filter == "Banned Only" and hero_name not in banned_heroes:
-                continue
-            if ban_filter == "Available Only" and hero_name in banned_heroes:
-                continue
-            if (
-                name_filter
-                and not (
-                    hero_name.startswith(clean_filter)  # catches 'azmo' in 'azmodan'
-                    or any(
-                        name_part.startswith(clean_filter)
-                        for name_part in hero["name"].split("-")
-                    )  # catches 'ham' in 'sgt-hammer'; also assume no one would want to search for "lost v"
-                )
-            ):
-                filtered = True
+        games = MatchSeriesManager.get_games(manager.session, match_series.id)
 
-            add_cross = hero_name in banned_heroes
-            if ban_filter == "Banned Only" and not display_cross_over_banned:
-                add_cross = False
+        def rollback_game():
+            try:
+                manager.rollback_game(st.session_state["rollback_game"])
+            except EditConflictError as error:
+                st.sidebar.error(str(error))
 
-            image = image_with_tooltip(
-                f"app/static/{hero['name']}.png", hero["name"], add_cross, filtered
+        if games:
+            st.sidebar.selectbox(
+                "Undo game",
+                list(reversed(games)),
+                help="Unban heroes banned by the replay of a game",
+                key="rollback_game",
             )
-
-            if filtered:
-                filtered_images += image
-            else:
-                unfiltered_images += image
-        html_image_list = (
-            '<div class="heroes">' + unfiltered_images + filtered_images + "</div>"
+            st.sidebar.button("Undo", on_click=rollback_game)
+
+    def display_heroes(banned_heroes: BanSet):
+        html_image_list = hero_grid(
+            banned_heroes,
+            ban_filter,
+            cross_out_banned=ban_filter != "Banned Only" or display_cross_over_banned,
+            role_filter=role_filter,
+            name_matches=search_heroes(name_filter) if name_filter else None,
         )
 
         st.write(html_image_list, unsafe_allow_html=True)
 
     st.title(match_series.name, anchor="name")
-    st.title(f"Banned Heroes Count: {len(banned_heroes)}", anchor="banned-hero-count")
 
-    display_heroes()
+    st.title(
+        f"Banned Heroes Count: {len(match_series.banned_heroes)}",
+        anchor="banned-hero-count",
+    )
+    display_heroes(match_series.banned_heroes)
 
     #############################
     # STYLING
@@ -182,85 +181,94 @@ def view_match_series(manager: MatchSeriesManager):
 
     align_headers()
 
-    hide_filters_style = 'div[data-testid="stHorizontalBlock"]{display: none;}'
+    st.write(
+        hero_grid_style(image_width, grey_out_filtered, hide_filters),
+        unsafe_allow_html=True,
+    )
 
-    if grey_out_filtered:
-        grey_out_filtered_style = """
-.filtered {
-    opacity: 0.3;
-}
-"""
-    else:
-        grey_out_filtered_style = """
-.filtered {
-    display: none;
-}
-"""
-
-    heroes_style = f"""
-.heroes {{
-    display: flex;
-    flex-direction: row;
-    flex-wrap: wrap;
-}}
-.hoverable {{
-    display: flex;
-    float: left;
-    position: relative;
-    margin: 6px;
-    width: {image_width}px;
-}}
-.hoverable .image {{
-    width: {image_width}px;
-    border-width: 3px;
-    border-style: solid;
-    border-color: black;
-}}
-.hoverable .ban {{
-    position: absolute;
-    margin-top: -100px;
-    margin-left: -100px;
-    top: 100px;
-    left: 100px;
-    opacity: 0.8;
-}}
-.hoverable .tooltip {{
-    opacity: 0;
-    position: absolute;
-    margin-top: -100px;
-    margin-left: -100px;
-    top: 100px;
-    left: 100px;
-    transition: opacity 0.5s;
-    background-color: rgba(0, 0, 0, 0.8);
-    color: #fff;
-    font-size: 18px;
-    text-align: center;
-}}
-.hoverable:hover .tooltip {{
-    opacity: 1;
-}}
-"""
-    hide_image_button_style = """
-button[title="View fullscreen"]{
-    visibility: hidden;
-}
-"""
-
-    style = f"""
-<style>
-{hide_filters_style if hide_filters else ""}
-{hide_image_button_style}
-{heroes_style}
-{grey_out_filtered_style}
-</style>
-"""
-
-    st.write(style, unsafe_allow_html=True)
+    return live_updates
+
+
+def show_extraction_summary():
+    """
+    Show timings of recent replay extractions in this process (admin only).
+    """
+    summary = TRACE_SUMMARY.summary()
+    with st.sidebar.expander("Replay extraction"):
+        st.write(f"Last {summary['traces']} extractions")
+        if not summary["traces"]:
+            return
+        st.write(
+            "Methods: "
+            + ", ".join(
+                f"{method} {count}" for method, count in summary["methods"].items()
+            )
+        )
+        st.write(f"Mean bytes read: {summary['mean_bytes_read']:.0f}")
+        st.table(
+            [
+                {
+                    "stage": stage,
+                    **{key: round(value, 2) for key, value in values.items()},
+                }
+                for stage, values in summary["stages"].items()
+            ]
+        )
+        if summary["base_builds"]:
+            st.write(
+                "Base builds: "
+                + ", ".join(
+                    f"{base_build} ({count})"
+                    for base_build, count in summary["base_builds"].most_common()
+                )
+            )
+        for error, count in summary["errors"].most_common(5):
+            st.caption(f"{count}× {error}")
+
+
+@st.cache_data(max_entries=1024, show_spinner=False)
+def ban_history_page(
+    series_id: str, version: int, before: Optional[int]
+) -> list[BanEvent]:
+    """
+    Return a page of ban events of a series shared by all viewers of its `version`
+    (edits create new versions, so cached pages never go stale).
+    """
+    with db_connection() as session:
+        return MatchSeriesManager.get_history(
+            session, series_id, before, HISTORY_PAGE_SIZE
+        )
+
+
+def show_ban_history(match_series: MatchSeriesView):
+    """
+    Show ban events of a series, newest first, a page at a time.
+    """
+    # `before` cursors of the pages leading to the current one
+    pages = st.session_state.setdefault(f"history_pages_{match_series.id}", [None])
+    with st.sidebar.expander("Ban history"):
+        events = ban_history_page(match_series.id, match_series.version, pages[-1])
+        for event in events:
+            source = f"game {event.game}" if event.game is not None else "manual"
+            st.caption(
+                f"{event.created_at:%Y-%m-%d %H:%M} "
+                f"{'banned' if event.op == BAN else 'unbanned'} "
+                f"{event.hero} ({source})"
+            )
+        newer, older = st.columns(2)
+        if newer.button("Newer", disabled=len(pages) == 1):
+            pages.pop()
+            st.rerun()
+        if older.button("Older", disabled=len(events) < HISTORY_PAGE_SIZE):
+            pages.append(events[-1].id)
+            st.rerun()
 
 
 query_params = st.experimental_get_query_params()
 
+if is_admin():
+    show_extraction_summary()
+
 if "id" in query_params:
     edit_keys = query_params.get("edit_key", [])
     if len(edit_keys) > 0:
@@ -269,12 +277,30 @@ if "id" in query_params:
         edit_key = None
     with db_connection() as session:
         try:
-            match_series_manager = MatchSeriesManager(
-                session, query_params["id"][-1], edit_key
-            )
+            if edit_key is None:
+                match_series_manager = None
+                match_series_view = MatchSeriesManager.get_view(
+                    session, query_params["id"][-1]
+                )
+            else:
+                match_series_manager = MatchSeriesManager(
+                    session, query_params["id"][-1], edit_key
+                )
+                match_series_view = MatchSeriesView.from_match_series(
+                    match_series_manager.match_series
+                )
 
-            view_match_series(match_series_manager)
+            live_updates = view_match_series(match_series_view, match_series_manager)
+            show_ban_history(match_series_view)
         except NoResultFound:
             st.error("Could not find a match series with that id.")
+            live_updates = False
+
+    # rerun the page once another viewer or process edits the series
+    # (memoized grid rendering keeps reruns cheap)
+    if live_updates:
+        rerun_on_series_change(match_series_view.id, match_series_view.version)
+    else:
+        stop_following_series()
 else:
     st.info("You need a link with series ID in order to view it.")
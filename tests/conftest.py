@@ -1,8 +1,18 @@
 import pytest
 from dotenv import load_dotenv
 
+from app.extraction_trace import add_trace_hook, remove_trace_hook
+
 load_dotenv()
 
 
 def pytest_configure():
     pytest.shared = {}
+
+
+@pytest.fixture
+def traces():
+    traces = []
+    add_trace_hook(traces.append)
+    yield traces
+    remove_trace_hook(traces.append)
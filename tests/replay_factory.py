@@ -0,0 +1,609 @@
+"""
+Helpers for building synthetic `.StormReplay` files.
+
+Replays are encoded with the typeinfos of a heroprotocol build
+and packed into an MPQ archive, so they can be read by both :py:mod:`mpyq` and :py:mod:`app.mpq`.
+"""
+import bz2
+import struct
+import zlib
+from io import BytesIO
+
+from heroprotocol.versions import build
+
+from app.heroes import HEROES_DICT
+from app.mpq import (
+    ENCRYPTION_TABLE,
+    MPQ_FILE_COMPRESS,
+    MPQ_FILE_EXISTS,
+    MPQ_FILE_SINGLE_UNIT,
+    mpq_hash,
+)
+
+DEFAULT_BUILD = 91756
+
+DEFAULT_HEROES = [
+    "abathur",
+    "alarak",
+    "anduin",
+    "blaze",
+    "cho",
+    "gall",
+    "liming",
+    "murky",
+    "sgthammer",
+    "zeratul",
+]
+
+
+class VersionedEncoder:
+    """
+    Inverse of :py:class:`heroprotocol.decoders.VersionedDecoder`.
+    """
+
+    def __init__(self, typeinfos):
+        self._typeinfos = typeinfos
+        self._buffer = bytearray()
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
+
+    def instance(self, typeid, value):
+        typeinfo = self._typeinfos[typeid]
+        getattr(self, typeinfo[0])(value, *typeinfo[1])
+
+    def _vint(self, value):
+        negative = value < 0
+        value = abs(value)
+        byte = ((value & 0x3F) << 1) | negative
+        value >>= 6
+        while value:
+            self._buffer.append(byte | 0x80)
+            byte = value & 0x7F
+            value >>= 7
+        self._buffer.append(byte)
+
+    def _array(self, value, bounds, typeid):
+        self._buffer.append(0)
+        self._vint(len(value))
+        for item in value:
+            self.instance(typeid, item)
+
+    def _bitarray(self, value, bounds):
+        length, data = value
+        self._buffer.append(1)
+        self._vint(length)
+        self._buffer += data
+
+    def _blob(self, value, bounds):
+        self._buffer.append(2)
+        self._vint(len(value))
+        self._buffer += value
+
+    def _bool(self, value):
+        self._buffer += bytes((6, int(value)))
+
+    def _choice(self, value, bounds, fields):
+        ((name, field_value),) = value.items()
+        tag = next(tag for tag, field in fields.items() if field[0] == name)
+        self._buffer.append(3)
+        self._vint(tag)
+        self.instance(fields[tag][1], field_value)
+
+    def _fourcc(self, value):
+        self._buffer.append(7)
+        self._buffer += value
+
+    def _int(self, value, bounds):
+        self._buffer.append(9)
+        self._vint(value)
+
+    def _null(self, value):
+        pass
+
+    def _optional(self, value, typeid):
+        self._buffer += bytes((4, value is not None))
+        if value is not None:
+            self.instance(typeid, value)
+
+    def _real32(self, value):
+        self._buffer.append(7)
+        self._buffer += struct.pack(">f", value)
+
+    def _real64(self, value):
+        self._buffer.append(8)
+        self._buffer += struct.pack(">d", value)
+
+    def _struct(self, value, fields):
+        if (
+            len(fields) == 1
+            and fields[0][0] == "__parent"
+            and not isinstance(value, dict)
+        ):
+            present = [(fields[0], value)]
+        else:
+            present = [
+                (field, value if field[0] == "__parent" else value[field[0]])
+                for field in fields
+                if field[0] == "__parent" or field[0] in value
+            ]
+        self._buffer.append(5)
+        self._vint(len(present))
+        for field, field_value in present:
+            self._vint(field[2])
+            self.instance(field[1], field_value)
+
+
+class BitPackedEncoder:
+    """
+    Inverse of :py:class:`heroprotocol.decoders.BitPackedDecoder`.
+    """
+
+    def __init__(self, typeinfos):
+        self._typeinfos = typeinfos
+        self._buffer = bytearray()
+        self._bits = 0
+        """Bits used in the last byte of the buffer (0 if it is full)."""
+
+    def getvalue(self) -> bytes:
+        return bytes(self._buffer)
+
+    def instance(self, typeid, value):
+        typeinfo = self._typeinfos[typeid]
+        getattr(self, typeinfo[0])(value, *typeinfo[1])
+
+    def _write_bits(self, value, bits):
+        while bits:
+            if self._bits == 0:
+                self._buffer.append(0)
+            copy_bits = min(bits, 8 - self._bits)
+            bits -= copy_bits
+            self._buffer[-1] |= ((value >> bits) & ((1 << copy_bits) - 1)) << self._bits
+            self._bits = (self._bits + copy_bits) % 8
+
+    def _array(self, value, bounds, typeid):
+        self._int(len(value), bounds)
+        for item in value:
+            self.instance(typeid, item)
+
+    def _bitarray(self, value, bounds):
+        length, data = value
+        self._int(length, bounds)
+        self._write_bits(data, length)
+
+    def _blob(self, value, bounds):
+        self._int(len(value), bounds)
+        self._bits = 0
+        self._buffer += value
+
+    def _bool(self, value):
+        self._int(int(value), (0, 1))
+
+    def _choice(self, value, bounds, fields):
+        ((name, field_value),) = value.items()
+        tag = next(tag for tag, field in fields.items() if field[0] == name)
+        self._int(tag, bounds)
+        self.instance(fields[tag][1], field_value)
+
+    def _fourcc(self, value):
+        self._write_bits(struct.unpack("!I", value)[0], 32)
+
+    def _int(self, value, bounds):
+        self._write_bits(value - bounds[0], bounds[1])
+
+    def _null(self, value):
+        pass
+
+    def _optional(self, value, typeid):
+        self._bool(value is not None)
+        if value is not None:
+            self.instance(typeid, value)
+
+    def _struct(self, value, fields):
+        for field in fields:
+            if field[0] == "__parent":
+                self.instance(field[1], value)
+            else:
+                self.instance(field[1], value[field[0]])
+
+
+def default_value(typeinfos, typeid):
+    """
+    Return the smallest valid value of a type (e.g. to fill fields a test does not care about).
+    """
+    kind, arguments = typeinfos[typeid]
+    if kind == "_struct":
+        value = {}
+        for name, field_typeid, _ in arguments[0]:
+            field_value = default_value(typeinfos, field_typeid)
+            if name == "__parent" and isinstance(field_value, dict):
+                value.update(field_value)
+            elif name == "__parent":
+                return field_value
+            else:
+                value[name] = field_value
+        return value
+    if kind == "_array":
+        (minimum, _), item_typeid = arguments
+        return [default_value(typeinfos, item_typeid)] * minimum
+    if kind == "_blob":
+        return b"\x00" * arguments[0][0]
+    if kind == "_bitarray":
+        return arguments[0][0], 0
+    if kind == "_choice":
+        name, field_typeid = next(iter(arguments[1].values()))
+        return {name: default_value(typeinfos, field_typeid)}
+    if kind == "_int":
+        return arguments[0][0]
+    if kind == "_bool":
+        return False
+    if kind == "_fourcc":
+        return b"\x00" * 4
+    return None
+
+
+def encode_header(protocol, base_build, elapsed_game_loops=20000):
+    encoder = VersionedEncoder(protocol.typeinfos)
+    encoder.instance(
+        protocol.replay_header_typeid,
+        {
+            "m_signature": b"Heroes of the Storm replay\x1b11",
+            "m_version": {
+                "m_flags": 1,
+                "m_major": 2,
+                "m_minor": 55,
+                "m_revision": 4,
+                "m_build": base_build,
+                "m_baseBuild": base_build,
+            },
+            "m_type": 2,
+            "m_elapsedGameLoops": elapsed_game_loops,
+            "m_useScaledTime": False,
+            "m_dataBuildNum": base_build,
+        },
+    )
+    return encoder.getvalue()
+
+
+def encode_details(protocol, hero_names, title=b"Cursed Hollow"):
+    players = [
+        {
+            "m_name": f"Player{index}".encode(),
+            "m_toon": {
+                "m_region": 2,
+                "m_programId": b"Hero",
+                "m_realm": 1,
+                "m_name": b"",
+                "m_id": index,
+            },
+            "m_race": b"",
+            "m_color": {"m_a": 255, "m_r": 0, "m_g": 66, "m_b": 255},
+            "m_control": 2,
+            "m_teamId": index // 5,
+            "m_handicap": 100,
+            "m_observe": 0,
+            "m_result": 1 if index < 5 else 2,
+            "m_workingSetSlotId": index,
+            "m_hero": hero_name.encode(),
+        }
+        for index, hero_name in enumerate(hero_names)
+    ]
+    encoder = VersionedEncoder(protocol.typeinfos)
+    encoder.instance(
+        protocol.game_details_typeid,
+        {
+            "m_playerList": players,
+            "m_title": title,
+            "m_difficulty": b"",
+            "m_thumbnail": {"m_file": b"ReplaysPreviewImage.tga"},
+            "m_isBlizzardMap": True,
+            "m_timeUTC": 133000000000000000,
+            "m_timeLocalOffset": 0,
+            "m_description": b"",
+            "m_imageFilePath": b"",
+            "m_mapFileName": b"",
+            "m_cacheHandles": [],
+            "m_miniSave": False,
+            "m_gameSpeed": 4,
+            "m_defaultDifficulty": 7,
+            "m_modPaths": None,
+        },
+    )
+    return encoder.getvalue()
+
+
+def _field_typeid(typeinfos, typeid, *names):
+    """
+    Return the type id of a (nested) struct field.
+    """
+    for name in names:
+        typeid = next(
+            field_typeid
+            for field_name, field_typeid, _ in typeinfos[typeid][1][0]
+            if field_name == name
+        )
+    return typeid
+
+
+def encode_init_data(protocol, hero_names, amm_id=None):
+    """
+    Encode init data with a lobby slot per hero (5 per team) and game mode `amm_id`.
+    """
+    typeinfos = protocol.typeinfos
+    init_data = default_value(typeinfos, protocol.replay_initdata_typeid)
+    lobby = init_data["m_syncLobbyState"]
+    game_options = lobby["m_gameDescription"]["m_gameOptions"]
+    if "m_ammId" in game_options:
+        game_options["m_ammId"] = amm_id
+
+    slots_typeid = _field_typeid(
+        typeinfos,
+        protocol.replay_initdata_typeid,
+        "m_syncLobbyState",
+        "m_lobbyState",
+        "m_slots",
+    )
+    slot_typeid = typeinfos[slots_typeid][1][1]
+    lobby["m_lobbyState"]["m_slots"] = [
+        {
+            **default_value(typeinfos, slot_typeid),
+            "m_userId": index,
+            "m_teamId": index // 5,
+            "m_hero": hero_name.encode(),
+            "m_workingSetSlotId": index,
+        }
+        for index, hero_name in enumerate(hero_names)
+    ]
+
+    encoder = BitPackedEncoder(typeinfos)
+    encoder.instance(protocol.replay_initdata_typeid, init_data)
+    return encoder.getvalue()
+
+
+def _tracker_event_id(protocol, name):
+    return next(
+        event_id
+        for event_id, (_, typename) in protocol.tracker_event_types.items()
+        if typename == name
+    )
+
+
+def encode_tracker_events(
+    protocol,
+    player_spawned_names,
+    leading_events=0,
+    trailing_events=0,
+    bans=(),
+    picks=(),
+):
+    """
+    Encode tracker events: draft events followed by one PlayerSpawned stat event per hero
+    surrounded by `leading_events` and `trailing_events` other stat events.
+
+    :param bans: Hero ids and (1-based) teams of HeroBanned events.
+    :param picks: Hero ids and player ids of HeroPicked events.
+    """
+    encoder = VersionedEncoder(protocol.typeinfos)
+
+    def event(name, value):
+        event_id = _tracker_event_id(protocol, name)
+        encoder.instance(protocol.svaruint32_typeid, {"m_uint6": 1})
+        encoder.instance(protocol.tracker_eventid_typeid, event_id)
+        encoder.instance(protocol.tracker_event_types[event_id][0], value)
+
+    for hero_id, team in bans:
+        event(
+            "NNet.Replay.Tracker.SHeroBannedEvent",
+            {"m_hero": hero_id.encode(), "m_controllingTeam": team},
+        )
+    for hero_id, player_id in picks:
+        event(
+            "NNet.Replay.Tracker.SHeroPickedEvent",
+            {"m_hero": hero_id.encode(), "m_controllingPlayer": player_id},
+        )
+
+    stat_event_id = _tracker_event_id(protocol, "NNet.Replay.Tracker.SStatGameEvent")
+    stat_typeid = protocol.tracker_event_types[stat_event_id][0]
+
+    def stat_event(name, string_data, int_data=None):
+        encoder.instance(protocol.svaruint32_typeid, {"m_uint6": 1})
+        encoder.instance(protocol.tracker_eventid_typeid, stat_event_id)
+        encoder.instance(
+            stat_typeid,
+            {
+                "m_eventName": name,
+                "m_stringData": string_data,
+                "m_intData": int_data,
+                "m_fixedData": None,
+            },
+        )
+
+    def filler(count):
+        for index in range(count):
+            stat_event(
+                b"GatesOpen", [{"m_key": b"Index", "m_value": str(index).encode()}]
+            )
+
+    filler(leading_events)
+    for player_id, name in enumerate(player_spawned_names, start=1):
+        stat_event(
+            b"PlayerSpawned",
+            [{"m_key": b"Hero", "m_value": name.encode()}],
+            [{"m_key": b"PlayerID", "m_value": player_id}],
+        )
+    filler(trailing_events)
+    return encoder.getvalue()
+
+
+def _encrypt(data, key):
+    seed1 = key
+    seed2 = 0xEEEEEEEE
+    result = BytesIO()
+
+    for (value,) in struct.iter_unpack("<I", data):
+        seed2 = (seed2 + ENCRYPTION_TABLE[0x400 + (seed1 & 0xFF)]) & 0xFFFFFFFF
+        encrypted = (value ^ (seed1 + seed2)) & 0xFFFFFFFF
+
+        seed1 = (((~seed1 << 0x15) + 0x11111111) | (seed1 >> 0x0B)) & 0xFFFFFFFF
+        seed2 = (value + seed2 + (seed2 << 5) + 3) & 0xFFFFFFFF
+
+        result.write(struct.pack("<I", encrypted))
+    return result.getvalue()
+
+
+def _compress(data, compression):
+    if compression == "bz2":
+        return b"\x10" + bz2.compress(data)
+    return b"\x02" + zlib.compress(data)
+
+
+def write_mpq(
+    files: dict,
+    user_data: bytes = b"",
+    single_unit=True,
+    compression="bz2",
+    sector_size_shift=3,
+) -> bytes:
+    """
+    Pack `files` (a name -> contents dictionary) into an MPQ archive with a user data header.
+    """
+    files = {"(listfile)": "\r\n".join(files).encode(), **files}
+    sector_size = 512 << sector_size_shift
+
+    mpq_header_size = 44
+    user_data_size = 16 + len(user_data)
+    header_offset = -(-user_data_size // 512) * 512
+
+    blocks = b""
+    block_table = []
+    for contents in files.values():
+        if single_unit:
+            data = _compress(contents, compression)
+            if len(data) >= len(contents):
+                data = contents
+            flags = MPQ_FILE_EXISTS | MPQ_FILE_COMPRESS | MPQ_FILE_SINGLE_UNIT
+        else:
+            sectors = []
+            for start in range(0, len(contents), sector_size):
+                sector = contents[start : start + sector_size]
+                compressed = _compress(sector, compression)
+                sectors.append(compressed if len(compressed) < len(sector) else sector)
+            positions = [4 * (len(sectors) + 1)]
+            for sector in sectors:
+                positions.append(positions[-1] + len(sector))
+            data = struct.pack(f"<{len(positions)}I", *positions) + b"".join(sectors)
+            flags = MPQ_FILE_EXISTS | MPQ_FILE_COMPRESS
+        block_table.append(
+            (mpq_header_size + len(blocks), len(data), len(contents), flags)
+        )
+        blocks += data
+
+    hash_table_size = 1
+    while hash_table_size < 2 * len(files):
+        hash_table_size *= 2
+    hash_table = [
+        (0xFFFFFFFF, 0xFFFFFFFF, 0xFFFF, 0xFFFF, 0xFFFFFFFF)
+    ] * hash_table_size
+    for block_index, name in enumerate(files):
+        position = mpq_hash(name, "TABLE_OFFSET") % hash_table_size
+        while hash_table[position][4] != 0xFFFFFFFF:
+            position = (position + 1) % hash_table_size
+        hash_table[position] = (
+            mpq_hash(name, "HASH_A"),
+            mpq_hash(name, "HASH_B"),
+            0,
+            0,
+            block_index,
+        )
+
+    hash_table_offset = mpq_header_size + len(blocks)
+    block_table_offset = hash_table_offset + 16 * hash_table_size
+    archive_size = block_table_offset + 16 * len(block_table)
+
+    hash_table_data = _encrypt(
+        b"".join(struct.pack("<2I2HI", *entry) for entry in hash_table),
+        mpq_hash("(hash table)", "TABLE"),
+    )
+    block_table_data = _encrypt(
+        b"".join(struct.pack("<4I", *entry) for entry in block_table),
+        mpq_hash("(block table)", "TABLE"),
+    )
+
+    user_data_header = (
+        struct.pack("<4s3I", b"MPQ\x1b", 512, header_offset, len(user_data)) + user_data
+    )
+    mpq_header = struct.pack(
+        "<4s2I2H4I",
+        b"MPQ\x1a",
+        mpq_header_size,
+        archive_size,
+        1,
+        sector_size_shift,
+        hash_table_offset,
+        block_table_offset,
+        hash_table_size,
+        len(block_table),
+    ) + struct.pack("<q2h", 0, 0, 0)
+
+    return (
+        user_data_header.ljust(header_offset, b"\x00")
+        + mpq_header
+        + blocks
+        + hash_table_data
+        + block_table_data
+    )
+
+
+def _draft_id(hero):
+    return HEROES_DICT[hero]["player_spawned_name"].removeprefix("Hero")
+
+
+def make_replay(
+    hero_names=DEFAULT_HEROES,
+    base_build=DEFAULT_BUILD,
+    details_hero_names=None,
+    leading_events=0,
+    trailing_events=0,
+    bans=(),
+    picks=(),
+    amm_id=50091,
+    elapsed_game_loops=20000,
+    **mpq_kwargs,
+) -> bytes:
+    """
+    Build a `.StormReplay` file.
+
+    :param hero_names: Heroes (keys of `HEROES_DICT`) played in the replay.
+    :param base_build: heroprotocol build used to encode the replay.
+    :param details_hero_names:
+        Hero names stored in `replay.details` (localized in real replays).
+        Defaults to the names of `hero_names`.
+    :param leading_events: Number of tracker events before the PlayerSpawned events.
+    :param trailing_events: Number of tracker events after the PlayerSpawned events.
+    :param bans: Banned heroes (keys of `HEROES_DICT`) and their (0-based) teams in ban order.
+    :param picks: Picked heroes and indexes of the picking players in pick order.
+    :param amm_id: Game mode stored in `replay.initData`.
+    :param elapsed_game_loops: Game length stored in the header.
+    :param mpq_kwargs: Keyword arguments for :py:func:`write_mpq`.
+    """
+    protocol = build(base_build)
+    if details_hero_names is None:
+        details_hero_names = [HEROES_DICT[hero]["name"] for hero in hero_names]
+
+    files = {
+        "replay.details": encode_details(protocol, details_hero_names),
+        "replay.tracker.events": encode_tracker_events(
+            protocol,
+            [HEROES_DICT[hero]["player_spawned_name"] for hero in hero_names],
+            leading_events,
+            trailing_events,
+            [(_draft_id(hero), team + 1) for hero, team in bans],
+            [(_draft_id(hero), index + 1) for hero, index in picks],
+        ),
+        "replay.initData": encode_init_data(protocol, details_hero_names, amm_id),
+    }
+    return write_mpq(
+        files,
+        encode_header(protocol, base_build, elapsed_game_loops),
+        **mpq_kwargs,
+    )
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.async_match_series_interface import AsyncMatchSeriesManager  # noqa: E402
+from app.match_series_interface import (  # noqa: E402
+    SERIES_VIEW_CACHE,
+    GameBans,
+    MatchSeriesManager,
+    _mapper_registry,
+)
+
+
+@pytest.fixture()
+def database(tmp_path):
+    path = tmp_path / "series.db"
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+    async def create_tables():
+        async with engine.begin() as connection:
+            await connection.run_sync(_mapper_registry.metadata.create_all)
+
+    asyncio.run(create_tables())
+    yield engine, path
+    asyncio.run(engine.dispose())
+
+
+@pytest.mark.parametrize("expire_on_commit", [True, False])
+def test_load_and_edit(database, expire_on_commit):
+    engine, path = database
+    async_session = async_sessionmaker(engine, expire_on_commit=expire_on_commit)
+
+    async def run():
+        async with async_session() as session:
+            series = await AsyncMatchSeriesManager.create_new(
+                session, "q1", ["anduin", "cho"], limiter=None
+            )
+            series_id, edit_key = series.id, series.edit_key
+
+        async with async_session() as session:
+            viewer = await AsyncMatchSeriesManager.load(session, series_id)
+            assert viewer.match_series.banned_heroes == {"anduin", "cho", "gall"}
+            with pytest.raises(RuntimeError):
+                await viewer.set_hero_bans(["rexxar"], [])
+
+            manager = await AsyncMatchSeriesManager.load(session, series_id, edit_key)
+            await manager.set_hero_bans(["rexxar"], ["anduin"])
+            await manager.set_hero_bans([], [], [GameBans(["blaze"], "a" * 32)])
+            assert manager.match_series.banned_heroes == {
+                "cho",
+                "gall",
+                "rexxar",
+                "blaze",
+            }
+            assert manager.match_series.version == 2
+
+            with pytest.raises(NoResultFound):
+                await AsyncMatchSeriesManager.load(session, "missing")
+        return series_id
+
+    series_id = asyncio.run(run())
+
+    with Session(create_engine(f"sqlite:///{path}")) as session:
+        assert MatchSeriesManager.get_games(session, series_id) == [1]
+        assert MatchSeriesManager(session, series_id).match_series.banned_heroes == {
+            "cho",
+            "gall",
+            "rexxar",
+            "blaze",
+        }
+    SERIES_VIEW_CACHE.invalidate(series_id)
+
+
+def test_get_views(database):
+    engine, _ = database
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def run():
+        async with async_session() as session:
+            created = [
+                await AsyncMatchSeriesManager.create_new(
+                    session, f"q{index}", [hero], limiter=None
+                )
+                for index, hero in enumerate(["anduin", "blaze", "rexxar"])
+            ]
+            manager = await AsyncMatchSeriesManager.load(
+                session, created[1].id, created[1].edit_key
+            )
+            await manager.set_hero_bans(["deathwing"], ["blaze"])
+
+            views = await AsyncMatchSeriesManager.get_views(
+                session, [series.id for series in created] + ["missing", created[0].id]
+            )
+        assert set(views) == {series.id for series in created}
+        assert views[created[0].id].banned_heroes == {"anduin"}
+        assert views[created[1].id].banned_heroes == {"deathwing"}
+        assert views[created[1].id].version == 1
+        assert views[created[2].id].name == "q2"
+
+    asyncio.run(run())
+
+
+def test_concurrent_edits(database):
+    engine, _ = database
+    async_session = async_sessionmaker(engine, expire_on_commit=False)
+    heroes = ["anduin", "blaze", "brightwing", "deathwing", "rexxar", "tracer"]
+
+    async def edit(series_id, edit_key, hero):
+        async with async_session() as session:
+            manager = await AsyncMatchSeriesManager.load(session, series_id, edit_key)
+            await manager.set_hero_bans([hero], [])
+
+    async def run():
+        async with async_session() as session:
+            series = await AsyncMatchSeriesManager.create_new(
+                session, "q1", [], limiter=None
+            )
+        await asyncio.gather(
+            *(edit(series.id, series.edit_key, hero) for hero in heroes)
+        )
+        async with async_session() as session:
+            manager = await AsyncMatchSeriesManager.load(session, series.id)
+            assert manager.match_series.banned_heroes == set(heroes)
+            assert manager.match_series.version == len(heroes)
+
+    asyncio.run(run())
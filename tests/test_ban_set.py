@@ -0,0 +1,53 @@
+import pytest
+
+from app.ban_set import BanSet
+from app.heroes import HEROES_DICT
+
+
+def test_set_semantics():
+    bans = BanSet(["zuljin", "abathur"])
+
+    assert bans == {"abathur", "zuljin"}
+    assert {"abathur", "zuljin"} == bans
+    assert list(bans) == ["abathur", "zuljin"]
+    assert len(bans) == 2
+    assert "abathur" in bans
+    assert "anduin" not in bans
+    assert "not a hero" not in bans
+    assert hash(bans) == hash(frozenset({"abathur", "zuljin"}))
+
+
+def test_operations():
+    bans = BanSet(["abathur", "anduin"])
+
+    assert bans | {"blaze"} == {"abathur", "anduin", "blaze"}
+    assert {"blaze"} | bans == {"abathur", "anduin", "blaze"}
+    assert bans - ["abathur"] == {"anduin"}
+    assert set(HEROES_DICT) - bans == set(HEROES_DICT) - {"abathur", "anduin"}
+    assert isinstance(set(HEROES_DICT) - bans, BanSet)
+    assert bans & BanSet(["anduin", "blaze"]) == {"anduin"}
+    assert bans.union(["blaze"], ["zuljin"]) == {"abathur", "anduin", "blaze", "zuljin"}
+    assert bans.difference(["abathur"], ["anduin"]) == BanSet()
+    assert list(BanSet.all()) == list(HEROES_DICT)
+    assert list(BanSet.all() - bans) == [
+        hero for hero in HEROES_DICT if hero not in {"abathur", "anduin"}
+    ]
+
+
+def test_cho_gall():
+    assert BanSet(["cho"]) == {"cho", "gall"}
+    assert BanSet(["abathur", "gall"]) - ["cho"] == {"abathur"}
+    assert BanSet(["abathur"]) | ["gall"] == {"abathur", "cho", "gall"}
+    assert BanSet.from_mask(BanSet(["cho"]).mask) == {"cho", "gall"}
+
+
+def test_serialization():
+    assert BanSet.from_bytes(BanSet.all().to_bytes()) == BanSet.all()
+    assert BanSet().to_bytes() == b""
+    assert BanSet.from_bytes(b"") == BanSet()
+    assert BanSet.from_mask(BanSet.all().mask | 1 << 1000) == BanSet.all()
+
+
+def test_unknown_hero():
+    with pytest.raises(ValueError):
+        BanSet(["not a hero"])
@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from app.__main__ import main
+from app.bulk_series import (
+    MAX_BULK_SERIES,
+    parse_series_csv,
+    parse_series_file,
+    parse_series_json,
+    series_links_csv,
+)
+from app.match_series_interface import MatchSeriesManager, match_series_table
+from app.schema import upgrade_schema
+
+
+def test_parse_series_csv():
+    specs = parse_series_csv(
+        "name,pre_bans\nASH vs. Raiders,cho;Li-Ming\n Winners Final ,\n",
+        ["Sgt. Hammer"],
+    )
+
+    assert [spec.name for spec in specs] == ["ASH vs. Raiders", "Winners Final"]
+    assert specs[0].pre_banned_heroes == {"cho", "gall", "liming", "sgthammer"}
+    assert specs[1].pre_banned_heroes == {"sgthammer"}
+
+    assert parse_series_csv("name\nA\n")[0].pre_banned_heroes == set()
+
+
+def test_parse_series_json():
+    specs = parse_series_json(
+        json.dumps([{"name": "A", "pre_bans": ["Kel'Thuzad"]}, "B"]), ["abathur"]
+    )
+
+    assert [spec.name for spec in specs] == ["A", "B"]
+    assert specs[0].pre_banned_heroes == {"kelthuzad", "abathur"}
+    assert specs[1].pre_banned_heroes == {"abathur"}
+    assert parse_series_file("series.JSON", '["A"]')[0].name == "A"
+
+
+@pytest.mark.parametrize(
+    "file_name,text",
+    [
+        ("series.csv", "title\nA\n"),
+        ("series.csv", "name,pre_bans\nA,not a hero\n"),
+        ("series.csv", "name\n\n,\n"),
+        ("series.csv", "name\n" + "a" * 51 + "\n"),
+        ("series.json", '{"name": "A"}'),
+        ("series.json", '[{"name": "A", "pre_bans": "cho"}]'),
+        ("series.json", "[1]"),
+        ("series.csv", "name\n" + "A\n" * (MAX_BULK_SERIES + 1)),
+        ("series.json", json.dumps(["A"] * (MAX_BULK_SERIES + 1))),
+    ],
+)
+def test_parse_series_errors(file_name, text):
+    with pytest.raises(ValueError):
+        parse_series_file(file_name, text)
+
+
+def test_create_many_and_links():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    specs = parse_series_csv("name,pre_bans\nA,cho\nB,\n")
+
+    with Session(engine) as session:
+        created = MatchSeriesManager.create_many(
+            session,
+            [(spec.name, spec.pre_banned_heroes) for spec in specs],
+            limiter=None,
+        )
+        assert MatchSeriesManager.create_many(session, [], limiter=None) == []
+
+        for match_series in created:
+            manager = MatchSeriesManager(
+                session, match_series.id, match_series.edit_key
+            )
+            assert manager.edit_permission
+            assert manager.match_series.name == match_series.name
+            assert manager.match_series.banned_heroes == match_series.banned_heroes
+            assert manager.match_series.version == 0
+            assert manager.match_series.created_at is not None
+
+    rows = list(csv.DictReader(io.StringIO(series_links_csv(created, "http://x/"))))
+    assert [row["name"] for row in rows] == ["A", "B"]
+    assert rows[0]["banned_heroes"] == "2"
+    assert rows[1]["view_link"] == f"http://x/View_Match_Series?id={created[1].id}"
+    assert rows[1]["edit_link"] == (
+        f"http://x/View_Match_Series?id={created[1].id}&edit_key={created[1].edit_key}"
+    )
+
+
+def test_cli(tmp_path, capsys):
+    url = f"sqlite:///{tmp_path / 'match_series.db'}"
+    series_file = tmp_path / "series.json"
+    series_file.write_text(json.dumps([f"Match {index}" for index in range(120)]))
+    links_file = tmp_path / "links.csv"
+
+    main(["schema", "upgrade", "--url", url])
+    main(
+        [
+            "series",
+            "create",
+            str(series_file),
+            "--pre-bans",
+            "cho",
+            "abathur",
+            "--output",
+            str(links_file),
+            "--base-url",
+            "",
+            "--url",
+            url,
+        ]
+    )
+    assert "Created 120 match series" in capsys.readouterr().out
+
+    rows = list(csv.DictReader(links_file.open()))
+    assert len(rows) == 120
+    assert rows[0]["view_link"].startswith("/View_Match_Series?id=")
+    assert {row["banned_heroes"] for row in rows} == {"3"}
+
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        count = connection.execute(
+            select(func.count()).select_from(match_series_table)
+        ).scalar_one()
+    assert count == 120
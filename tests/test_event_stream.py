@@ -0,0 +1,44 @@
+from io import BytesIO
+
+import pytest
+
+from app.event_stream import StreamStats, iter_tracker_events
+from app.heroes import extract_heroes_from_tracker_events, get_archive_protocol
+from tests.replay_factory import DEFAULT_HEROES, make_replay
+
+
+@pytest.mark.parametrize("single_unit", [True, False])
+def test_same_events_as_full_decode(single_unit):
+    replay = BytesIO(
+        make_replay(leading_events=100, trailing_events=200, single_unit=single_unit)
+    )
+
+    with get_archive_protocol(replay) as (archive, protocol):
+        expected = list(
+            protocol.decode_replay_tracker_events(
+                archive.read_file("replay.tracker.events")
+            )
+        )
+        stats = StreamStats()
+        events = list(iter_tracker_events(archive, protocol, stats))
+
+    assert events == expected
+    assert stats.events_decoded == len(expected)
+    assert stats.bytes_decoded == stats.file_size
+
+
+@pytest.mark.parametrize("single_unit", [True, False])
+def test_early_exit(single_unit):
+    replay = BytesIO(
+        make_replay(leading_events=100, trailing_events=20000, single_unit=single_unit)
+    )
+
+    with get_archive_protocol(replay) as (archive, protocol):
+        stats = StreamStats()
+        heroes = extract_heroes_from_tracker_events(archive, protocol, stats=stats)
+
+    assert heroes == DEFAULT_HEROES
+    assert stats.events_decoded == 110
+    assert stats.bytes_decoded < stats.file_size / 100
+    if not single_unit:
+        assert stats.bytes_decompressed < stats.file_size / 100
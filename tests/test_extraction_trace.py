@@ -0,0 +1,111 @@
+from io import BytesIO
+
+import pytest
+
+from app.extraction_trace import (
+    ExtractionTrace,
+    TraceSummary,
+    add_trace_hook,
+    emit_trace,
+    remove_trace_hook,
+)
+from app.heroes import extract_heroes_from_replay, extract_heroes_from_replays
+from app.replay_cache import ReplayCache
+from tests.replay_factory import DEFAULT_BUILD, DEFAULT_HEROES, make_replay
+
+
+def test_details_trace(traces):
+    result = extract_heroes_from_replay(BytesIO(make_replay()))
+    assert result.heroes == tuple(DEFAULT_HEROES)
+
+    (trace,) = traces
+    assert trace.method == "details"
+    assert trace.base_build == DEFAULT_BUILD
+    assert trace.error is None
+    assert trace.bytes_read > 0
+    assert list(trace.stages) == [
+        "mpq_open",
+        "header_decode",
+        "protocol_import",
+        "details",
+    ]
+    assert trace.total == pytest.approx(sum(trace.stages.values()))
+    assert result.trace is trace
+
+
+def test_tracker_events_trace(traces):
+    data = make_replay(details_hero_names=["Unknown"] * 10)
+
+    assert extract_heroes_from_replay(BytesIO(data)).heroes == tuple(DEFAULT_HEROES)
+    assert traces[0].method == "tracker_events"
+    assert "tracker_events" in traces[0].stages
+
+
+def test_cache_and_error_traces(traces):
+    cache = ReplayCache()
+    data = make_replay()
+    extract_heroes_from_replay(BytesIO(data), cache)
+    extract_heroes_from_replay(BytesIO(data), cache)
+    error = extract_heroes_from_replay(BytesIO(b"not a replay"))
+
+    assert [trace.method for trace in traces] == ["details", "cache", None]
+    assert "read" in traces[0].stages and "cache_lookup" in traces[0].stages
+    assert traces[1].base_build == DEFAULT_BUILD
+    assert "details" not in traces[1].stages
+    assert traces[2].error == error.error.value == "corrupt"
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_batch_traces(traces, max_workers):
+    replays = [BytesIO(make_replay()), BytesIO(b"not a replay"), "missing"]
+
+    extract_heroes_from_replays(replays, max_workers=max_workers)
+
+    assert len(traces) == 3
+    assert sorted(trace.method or "failed" for trace in traces) == [
+        "details",
+        "failed",
+        "failed",
+    ]
+    (success,) = [trace for trace in traces if trace.method == "details"]
+    assert {"read", "details"} <= set(success.stages)
+    assert success.bytes_read > 0
+
+
+def test_failing_hook_is_ignored(traces):
+    def failing_hook(trace):
+        raise RuntimeError
+
+    add_trace_hook(failing_hook)
+    try:
+        emit_trace(ExtractionTrace())
+    finally:
+        remove_trace_hook(failing_hook)
+    assert len(traces) == 1
+
+
+def test_summary():
+    summary = TraceSummary(max_traces=3)
+    assert summary.summary()["traces"] == 0
+
+    for index in range(4):
+        summary.record(
+            ExtractionTrace(
+                stages={"details": 0.001 * (index + 1)},
+                bytes_read=100,
+                method="details" if index else None,
+                base_build=DEFAULT_BUILD,
+                error=None if index else "error",
+            )
+        )
+
+    result = summary.summary()
+    assert result["traces"] == 3
+    assert result["methods"] == {"details": 3}
+    assert result["errors"] == {}
+    assert result["base_builds"] == {DEFAULT_BUILD: 3}
+    assert result["mean_bytes_read"] == 100
+    assert result["stages"]["details"]["count"] == 3
+    assert result["stages"]["details"]["mean_ms"] == pytest.approx(3)
+    assert result["stages"]["details"]["max_ms"] == pytest.approx(4)
+    assert set(result["stages"]) == {"total", "details"}
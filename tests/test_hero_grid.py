@@ -0,0 +1,49 @@
+from app.ban_set import BanSet
+from app.hero_grid import _hero_grid, hero_grid, hero_grid_style, hero_tile
+from app.heroes import HEROES_DICT
+
+
+def test_hero_tile():
+    tile = hero_tile("sgthammer", ban=True, filtered=True)
+
+    assert tile.startswith('<div class="hoverable filtered">')
+    assert "sgt-hammer" in tile
+    assert 'class="image ban' in tile
+    assert '<div class="tooltip">sgt hammer</div>' in tile
+    assert 'class="image ban' not in hero_tile("sgthammer")
+
+
+def test_hero_grid():
+    banned = BanSet(["abathur", "zuljin"])
+
+    grid = hero_grid(banned)
+    assert grid.count('class="hoverable') == len(HEROES_DICT)
+    assert grid.count('class="image ban') == 2
+
+    grid = hero_grid(banned, "Banned Only", cross_out_banned=False)
+    assert grid.count('class="hoverable') == 2
+    assert 'class="image ban' not in grid
+
+    grid = hero_grid(banned, "Available Only")
+    assert grid.count('class="hoverable') == len(HEROES_DICT) - 2
+
+    # filtered heroes go last
+    grid = hero_grid(banned, name_matches=frozenset({"zuljin"}))
+    assert grid.index("zuljin") < grid.index("abathur")
+    assert grid.count("hoverable filtered") == len(HEROES_DICT) - 1
+
+    grid = hero_grid(banned, role_filter=["tank"])
+    tanks = [hero for hero in HEROES_DICT.values() if hero["role"] == "tank"]
+    assert grid.count('class="hoverable"') == len(tanks)
+
+
+def test_hero_grid_is_memoized():
+    banned = BanSet(["abathur"])
+    hero_grid(banned, role_filter=["tank", "healer"])
+    hits = _hero_grid.cache_info().hits
+
+    grid = hero_grid(BanSet(["abathur"]), role_filter=["healer", "tank"])
+    assert _hero_grid.cache_info().hits == hits + 1
+    assert hero_grid_style(90, True, False) is hero_grid_style(90, True, False)
+    assert "width: 90px" in hero_grid_style(90, True, False)
+    assert grid
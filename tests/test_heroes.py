@@ -0,0 +1,263 @@
+import os
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+import pytest
+
+from app.heroes import (
+    DRAFT_NAMES_MAP,
+    HEROES_DICT,
+    UNSUCCESSFUL_EXTRACTION_MESSAGE,
+    _get_executor,
+    DraftPick,
+    ExtractionErrorCategory,
+    clean_hero_name,
+    extract_draft_from_replay,
+    extract_heroes_from_replay,
+    extract_heroes_from_replays,
+    search_heroes,
+)
+from app.protocols import PROTOCOLS
+from app.replay_cache import ReplayCache, replay_hash
+from tests.replay_factory import DEFAULT_BUILD, DEFAULT_HEROES, make_replay
+
+OTHER_HEROES = ["ana", "zarya", "varian", "uther", "tyrael"] * 2
+
+
+@pytest.mark.parametrize("max_workers", [None, 1, 2])
+def test_batch_extraction(max_workers, tmp_path):
+    path = tmp_path / "replay.StormReplay"
+    path.write_bytes(make_replay(OTHER_HEROES))
+    replays = [
+        BytesIO(make_replay()),
+        BytesIO(b"not a replay"),
+        str(path),
+        str(tmp_path / "missing.StormReplay"),
+    ]
+
+    results = extract_heroes_from_replays(replays, max_workers=max_workers)
+
+    assert results[0].heroes == tuple(DEFAULT_HEROES)
+    assert results[0].teams == (0,) * 5 + (1,) * 5
+    assert results[1].message == (
+        extract_heroes_from_replay(BytesIO(b"not a replay")).message
+    )
+    assert results[1].error == ExtractionErrorCategory.CORRUPT
+    assert results[2].heroes == tuple(OTHER_HEROES)
+    assert results[3].error == ExtractionErrorCategory.READ
+    assert results[3].error.transient
+    assert [result.replay_hash for result in results] == [
+        replay_hash(replays[0].getvalue()),
+        replay_hash(b"not a replay"),
+        replay_hash(path.read_bytes()),
+        None,
+    ]
+
+
+def test_batch_extraction_while_protocols_load():
+    # a thread importing protocol modules (e.g. preload_protocols) holds the registry lock,
+    # which workers must not inherit
+    replays = [BytesIO(make_replay()), BytesIO(make_replay(OTHER_HEROES))]
+    results = []
+    with PROTOCOLS._lock:
+        thread = threading.Thread(
+            target=lambda: results.extend(
+                extract_heroes_from_replays(replays, max_workers=2)
+            ),
+            daemon=True,
+        )
+        thread.start()
+        thread.join(timeout=60)
+
+    assert [result.heroes for result in results] == [
+        tuple(DEFAULT_HEROES),
+        tuple(OTHER_HEROES),
+    ]
+
+
+def test_batch_extraction_after_worker_died():
+    # a worker dying (e.g. out of memory) breaks the shared pool
+    future = _get_executor().submit(os._exit, 1)
+    with pytest.raises(BrokenProcessPool):
+        future.result()
+
+    results = extract_heroes_from_replays(
+        [BytesIO(make_replay()), BytesIO(make_replay(OTHER_HEROES))]
+    )
+
+    assert [result.heroes for result in results] == [
+        tuple(DEFAULT_HEROES),
+        tuple(OTHER_HEROES),
+    ]
+    assert ExtractionErrorCategory.WORKER_CRASHED.transient
+
+
+def test_batch_extraction_cache():
+    cache = ReplayCache()
+    data = make_replay()
+
+    results = extract_heroes_from_replays([BytesIO(data), BytesIO(data)], cache)
+
+    assert [result.heroes for result in results] == [tuple(DEFAULT_HEROES)] * 2
+    (result,) = extract_heroes_from_replays([BytesIO(data)], cache)
+    assert result.heroes == tuple(DEFAULT_HEROES)
+    assert result.teams == results[0].teams
+    assert result.method == "cache"
+    assert cache.stats["hits"] == 1
+    assert result.replay_hash == results[0].replay_hash == replay_hash(data)
+
+
+def test_error_categories(monkeypatch):
+    def unsupported_build(base_build):
+        raise ImportError(f"Unsupported base build: {base_build}")
+
+    result = extract_heroes_from_replay(
+        BytesIO(make_replay(DEFAULT_HEROES[:9], details_hero_names=["Unknown"] * 9))
+    )
+    assert result.error == ExtractionErrorCategory.INCOMPLETE
+    assert result.message == UNSUCCESSFUL_EXTRACTION_MESSAGE
+    assert result.heroes == result.teams == ()
+
+    monkeypatch.setattr(PROTOCOLS, "get", unsupported_build)
+    result = extract_heroes_from_replay(BytesIO(make_replay()))
+    assert result.error == ExtractionErrorCategory.UNSUPPORTED_BUILD
+    assert result.base_build == DEFAULT_BUILD
+    assert not result.error.transient
+
+
+def test_failures_are_cached():
+    cache = ReplayCache()
+    data = b"not a replay"
+
+    first = extract_heroes_from_replay(BytesIO(data), cache)
+    second = extract_heroes_from_replay(BytesIO(data), cache)
+
+    assert first.error == second.error == ExtractionErrorCategory.CORRUPT
+    assert second.message == first.message
+    assert "mpq_open" not in second.timings
+    assert cache.stats["failure_entries"] == 1
+    assert cache.stats["hits"] == 1
+
+    missing = extract_heroes_from_replay("missing.StormReplay", cache)
+    assert missing.error == ExtractionErrorCategory.READ
+    assert cache.stats["failure_entries"] == 1
+
+
+def test_tracker_events_teams():
+    result = extract_heroes_from_replay(
+        BytesIO(make_replay(details_hero_names=["Unknown"] * 10))
+    )
+
+    assert result.method == "tracker_events"
+    assert result.heroes == tuple(DEFAULT_HEROES)
+    assert result.teams == (0,) * 5 + (1,) * 5
+
+
+def _linear_search(query):
+    clean_query = clean_hero_name(query)
+    return {
+        hero_name
+        for hero_name, hero in HEROES_DICT.items()
+        if hero_name.startswith(clean_query)
+        or any(
+            name_part.startswith(clean_query) for name_part in hero["name"].split("-")
+        )
+    }
+
+
+def test_search_heroes_matches_linear_search():
+    queries = {"", "1", "The ", "Sgt. Ham", "zz", "lúcio"}
+    for hero_name, hero in HEROES_DICT.items():
+        for name in (hero_name, *hero["name"].split("-")):
+            queries.update(name[:length] for length in range(1, len(name) + 1))
+
+    for query in queries:
+        assert search_heroes(query) >= _linear_search(query), query
+
+
+def test_search_heroes_aliases():
+    assert search_heroes("ming") == {"liming"}
+    assert search_heroes("KTZ") == {"kelthuzad"}
+    assert search_heroes("sgt") == {"sgthammer"}
+    assert search_heroes("ham") == {"sgthammer"}
+    assert search_heroes("azmo") == {"azmodan"}
+    assert search_heroes("") == set(HEROES_DICT)
+
+
+@pytest.mark.parametrize("base_build", [DEFAULT_BUILD, 77662])
+def test_extract_draft(traces, base_build):
+    bans = [("blaze", 0), ("dva", 1), ("lostvikings", 0), ("liming", 1)]
+    picks = [(hero, index) for index, hero in enumerate(DEFAULT_HEROES)]
+    data = make_replay(
+        base_build=base_build,
+        bans=bans,
+        picks=picks,
+        amm_id=50091,
+        elapsed_game_loops=16 * 1200,
+        trailing_events=1000,
+    )
+
+    result = extract_draft_from_replay(BytesIO(data))
+
+    assert result.ok
+    assert result.heroes == tuple(DEFAULT_HEROES)
+    assert result.teams == (0,) * 5 + (1,) * 5
+    assert result.method == "details"
+    assert result.base_build == base_build
+    assert result.map_name == "Cursed Hollow"
+    assert result.game_length == 1200
+    assert result.game_mode == 50091
+    assert result.bans == tuple(DraftPick(hero, team) for hero, team in bans)
+    assert result.picks == tuple(DraftPick(hero, index // 5) for hero, index in picks)
+
+    (trace,) = traces
+    assert list(trace.stages) == [
+        "mpq_open",
+        "header_decode",
+        "protocol_import",
+        "details",
+        "init_data",
+        "tracker_events",
+    ]
+
+
+def test_extract_draft_single_pass(monkeypatch):
+    decoded = []
+    for name in ("decode_replay_details", "decode_replay_initdata"):
+        decode = getattr(PROTOCOLS.get(DEFAULT_BUILD), name)
+        monkeypatch.setattr(
+            PROTOCOLS.get(DEFAULT_BUILD),
+            name,
+            lambda contents, name=name, decode=decode: decoded.append(name)
+            or decode(contents),
+        )
+    data = make_replay(
+        details_hero_names=["Unknown"] * 10,
+        bans=[("blaze", 0)],
+        trailing_events=50000,
+        single_unit=False,
+    )
+
+    result = extract_draft_from_replay(BytesIO(data))
+
+    assert result.method == "tracker_events"
+    assert result.heroes == tuple(DEFAULT_HEROES)
+    assert result.bans == (DraftPick("blaze", 0),)
+    assert sorted(decoded) == ["decode_replay_details", "decode_replay_initdata"]
+    # tracker events after the spawn of the heroes are never read
+    assert result.trace.bytes_read < len(data) / 2
+
+
+def test_extract_draft_errors():
+    result = extract_draft_from_replay(BytesIO(b"not a replay"))
+
+    assert result.error == ExtractionErrorCategory.CORRUPT
+    assert result.bans == result.picks == ()
+    assert result.map_name is None
+
+
+def test_draft_names():
+    assert DRAFT_NAMES_MAP["Firebat"] == "blaze"
+    assert DRAFT_NAMES_MAP["DVa"] == "dva"
+    assert DRAFT_NAMES_MAP["Abathur"] == "abathur"
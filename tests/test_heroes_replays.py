@@ -8,6 +8,7 @@ from app.heroes import (
     extract_heroes_from_details,
     extract_heroes_from_tracker_events,
 )
+from app.replay_scan import iter_replay_files
 
 REPLAY_DIR = Path(os.getenv("REPLAY_DIR"))
 
@@ -29,7 +30,8 @@ def get_replay_details(replay):
 
 
 @pytest.mark.parametrize(
-    "replay", list(map(str, REPLAY_DIR.iterdir())) if REPLAY_DIR.exists() else []
+    "replay",
+    list(map(str, iter_replay_files(REPLAY_DIR))) if REPLAY_DIR.exists() else [],
 )
 class TestReplayExtractorFunctions:
     def test_heroes_extraction_from_details(self, replay):
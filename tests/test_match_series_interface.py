@@ -1,8 +1,34 @@
-from sqlalchemy import create_engine
+from sqlalchemy import Boolean, Column, DateTime, MetaData, Table, Text, Uuid
+from sqlalchemy import create_engine, inspect, insert
+from sqlalchemy.exc import NoResultFound
 from sqlalchemy.orm import Session
+from sqlalchemy.orm.exc import StaleDataError
+import os
+import threading
+import time
+
 import pytest
 
-from app.match_series_interface import MatchSeriesManager, _mapper_registry
+from app.ban_set import BanSet
+from app.heroes import HEROES_DICT
+from app.match_series_interface import (
+    BAN,
+    MAX_EDIT_ATTEMPTS,
+    SERIES_VIEW_CACHE,
+    SERIES_EVENTS,
+    SNAPSHOT_INTERVAL,
+    UNBAN,
+    EditConflictError,
+    GameBans,
+    MatchSeriesManager,
+    MatchSeriesViewCache,
+    _mapper_registry,
+)
+from app.schema import (
+    add_series_version_column,
+    add_snapshot_version_column,
+    migrate_wide_ban_columns,
+)
 
 
 @pytest.fixture()
@@ -23,7 +49,7 @@ def session():
 @pytest.fixture()
 def match_series_list(pre_bans, session):
     yield [
-        MatchSeriesManager.create_new(session, name, pre_banned_heroes)
+        MatchSeriesManager.create_new(session, name, pre_banned_heroes, limiter=None)
         for name, pre_banned_heroes in pre_bans.items()
     ]
 
@@ -140,3 +166,330 @@ def test_cho_gall(pre_bans, session, match_series_list):
         "blaze",
         "anduin",
     }
+
+
+def test_unknown_hero(pre_bans, session, match_series_list):
+    manager = MatchSeriesManager(
+        session, match_series_list[0].id, match_series_list[0].edit_key
+    )
+
+    with pytest.raises(ValueError):
+        manager.set_hero_bans(["not a hero"], [])
+
+
+def test_migrate_wide_ban_columns(pre_bans):
+    engine = create_engine("sqlite://")
+    legacy_table = Table(
+        "match_series",
+        MetaData(),
+        Column("id", Uuid(as_uuid=False), primary_key=True),
+        Column("created_at", DateTime),
+        Column("name", Text),
+        Column("edit_key", Uuid(as_uuid=False)),
+        *(Column(hero + "_banned", Boolean) for hero in sorted(HEROES_DICT)),
+    )
+    legacy_table.create(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(legacy_table),
+            [
+                {
+                    "id": f"00000000-0000-0000-0000-00000000000{index}",
+                    "name": name,
+                    **{hero + "_banned": hero in bans for hero in HEROES_DICT},
+                }
+                for index, (name, bans) in enumerate(pre_bans.items())
+            ],
+        )
+
+    with engine.begin() as conn:
+        assert migrate_wide_ban_columns(conn) == 3
+    with engine.begin() as conn:
+        assert migrate_wide_ban_columns(conn) == 0
+
+    columns = {column["name"] for column in inspect(engine).get_columns("match_series")}
+    assert columns == {"id", "created_at", "name", "edit_key", "banned_mask"}
+
+    with engine.begin() as conn:
+        add_series_version_column(conn)
+        add_snapshot_version_column(conn)
+    _mapper_registry.metadata.create_all(engine)
+    with Session(engine) as session:
+        for index, bans in enumerate(pre_bans.values()):
+            manager = MatchSeriesManager(
+                session, f"00000000-0000-0000-0000-00000000000{index}"
+            )
+            assert manager.match_series.banned_heroes == bans
+
+
+def test_view_cache(pre_bans, session, match_series_list):
+    cache = MatchSeriesViewCache()
+    series_id = match_series_list[1].id
+
+    for _ in range(3):
+        view = MatchSeriesManager.get_view(session, series_id, cache)
+        assert view.name == "q2"
+        assert view.banned_heroes == pre_bans["q2"]
+
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 1
+    assert cache.stats["db_queries"] == 1
+
+    for missing_id in ["missing1", "missing2"]:
+        with pytest.raises(NoResultFound):
+            cache.get(session, missing_id)
+    # load locks are dropped after every load, including failed ones
+    assert cache._load_locks == {}
+
+
+def test_view_cache_ttl(pre_bans, session, match_series_list):
+    cache = MatchSeriesViewCache(ttl=0.01)
+    series_id = match_series_list[0].id
+
+    cache.get(session, series_id)
+    time.sleep(0.02)
+    cache.get(session, series_id)
+    assert cache.stats["db_queries"] == 2
+
+
+def test_view_cache_invalidated_by_bans(pre_bans, session, match_series_list):
+    series_id = match_series_list[0].id
+    assert MatchSeriesManager.get_view(session, series_id).banned_heroes == set()
+
+    manager = MatchSeriesManager(session, series_id, match_series_list[0].edit_key)
+    manager.set_hero_bans(["rexxar"], [])
+
+    view = MatchSeriesManager.get_view(session, series_id)
+    assert view.banned_heroes == {"rexxar"}
+    assert view.version == 1
+    SERIES_VIEW_CACHE.invalidate(series_id)
+
+
+def test_view_cache_single_query_on_concurrent_misses(tmp_path, pre_bans):
+    engine = create_engine(f"sqlite:///{tmp_path / 'series.db'}")
+    _mapper_registry.metadata.create_all(engine)
+    with Session(engine) as session:
+        series_id = MatchSeriesManager.create_new(session, "q1", set(), limiter=None).id
+
+    cache = MatchSeriesViewCache()
+    barrier = threading.Barrier(8)
+    views = []
+
+    def load():
+        with Session(engine) as thread_session:
+            barrier.wait()
+            views.append(cache.get(thread_session, series_id))
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(views) == 8
+    assert all(view.name == "q1" for view in views)
+    assert cache.stats["db_queries"] == 1
+    assert cache._load_locks == {}
+
+
+def test_versions(pre_bans, session, match_series_list):
+    series_id = match_series_list[0].id
+    assert MatchSeriesManager.get_version(session, series_id) == 0
+
+    manager = MatchSeriesManager(session, series_id, match_series_list[0].edit_key)
+    manager.set_hero_bans(["rexxar"], [])
+    manager.set_hero_bans([], ["rexxar"])
+
+    assert MatchSeriesManager.get_version(session, series_id) == 2
+    assert SERIES_EVENTS.latest(series_id) == 2
+
+
+def test_ban_events(pre_bans, session, match_series_list):
+    series = match_series_list[1]
+    manager = MatchSeriesManager(session, series.id, series.edit_key)
+    manager.set_hero_bans(["anduin", "rexxar"], ["blaze"])
+    manager.set_hero_bans(["rexxar"], [])
+
+    history = MatchSeriesManager.get_history(session, series.id)
+    assert [(event.version, event.hero, event.op) for event in history] == [
+        (1, "blaze", UNBAN),
+        (1, "rexxar", BAN),
+        (0, "blaze", BAN),
+        (0, "anduin", BAN),
+    ]
+    assert MatchSeriesManager.get_version(session, series.id) == 1
+
+
+def test_snapshots(pre_bans, session, match_series_list):
+    series = match_series_list[0]
+    manager = MatchSeriesManager(session, series.id, series.edit_key)
+    manager.set_hero_bans(["anduin"], [])
+    for index in range(SNAPSHOT_INTERVAL):
+        manager.set_hero_bans(
+            *((["rexxar"], []) if index % 2 == 0 else ([], ["rexxar"]))
+        )
+
+    assert series.snapshot_version == SNAPSHOT_INTERVAL
+    assert series.version == SNAPSHOT_INTERVAL + 1
+    assert BanSet.from_bytes(series._banned_mask) == {"anduin", "rexxar"}
+
+    session.expunge_all()
+    SERIES_VIEW_CACHE.invalidate(series.id)
+    assert MatchSeriesManager(session, series.id).match_series.banned_heroes == {
+        "anduin"
+    }
+    assert MatchSeriesManager.get_view(session, series.id).banned_heroes == {"anduin"}
+    SERIES_VIEW_CACHE.invalidate(series.id)
+
+
+def test_rollback_game(pre_bans, session, match_series_list):
+    series = match_series_list[1]
+    manager = MatchSeriesManager(session, series.id, series.edit_key)
+    manager.set_hero_bans(
+        [], [], [GameBans(["anduin", "rexxar"], "a" * 32), GameBans(["cho"], "b" * 32)]
+    )
+    manager.set_hero_bans([], [], [GameBans(["deathwing", "rexxar"])])
+    assert MatchSeriesManager.get_games(session, series.id) == [1, 2, 3]
+
+    game_events = [
+        (event.game, event.hero, event.replay_hash)
+        for event in MatchSeriesManager.get_history(session, series.id)
+        if event.game is not None
+    ]
+    assert game_events == [
+        (3, "deathwing", None),
+        (2, "gall", "b" * 32),
+        (2, "cho", "b" * 32),
+        (1, "rexxar", "a" * 32),
+    ]
+
+    manager.set_hero_bans([], ["anduin"])
+    assert manager.rollback_game(2) == {"cho", "gall"}
+    assert manager.rollback_game(1) == {"rexxar"}
+    assert manager.rollback_game(1) == set()
+    assert manager.match_series.banned_heroes == {"blaze", "deathwing"}
+    assert MatchSeriesManager.get_view(session, series.id).banned_heroes == {
+        "blaze",
+        "deathwing",
+    }
+    SERIES_VIEW_CACHE.invalidate(series.id)
+
+    with pytest.raises(RuntimeError):
+        MatchSeriesManager(session, series.id).rollback_game(3)
+
+
+def test_history_pagination(pre_bans, session, match_series_list):
+    series = match_series_list[0]
+    manager = MatchSeriesManager(session, series.id, series.edit_key)
+    heroes = sorted(HEROES_DICT)[:7]
+    for hero in heroes:
+        manager.set_hero_bans([hero], [])
+
+    pages = []
+    before = None
+    while page := MatchSeriesManager.get_history(session, series.id, before, limit=3):
+        pages.append([event.hero for event in page])
+        before = page[-1].id
+    assert pages == [heroes[:3:-1], heroes[3:0:-1], heroes[:1]]
+
+
+def test_stale_manager_merges_edits(pre_bans, session, match_series_list):
+    series = match_series_list[1]
+    first = MatchSeriesManager(session, series.id, series.edit_key)
+    with Session(session.get_bind()) as other_session:
+        second = MatchSeriesManager(other_session, series.id, series.edit_key)
+        second.set_hero_bans(["rexxar"], ["anduin"])
+
+    first.set_hero_bans(["deathwing"], ["blaze"])
+
+    assert first.match_series.banned_heroes == {"rexxar", "deathwing"}
+    assert first.match_series.version == 2
+    assert [
+        (event.version, event.hero, event.op)
+        for event in MatchSeriesManager.get_history(session, series.id, limit=4)
+    ] == [
+        (2, "blaze", UNBAN),
+        (2, "deathwing", BAN),
+        (1, "anduin", UNBAN),
+        (1, "rexxar", BAN),
+    ]
+
+
+def test_edit_conflict_error(pre_bans, session, match_series_list, monkeypatch):
+    series = match_series_list[0]
+    manager = MatchSeriesManager(session, series.id, series.edit_key)
+    attempts = []
+
+    def conflicting_commit():
+        attempts.append(1)
+        raise StaleDataError()
+
+    monkeypatch.setattr(session, "commit", conflicting_commit)
+    monkeypatch.setattr("app.match_series_interface.EDIT_RETRY_DELAY", 0)
+    with pytest.raises(EditConflictError):
+        manager.set_hero_bans(["rexxar"], [])
+    assert len(attempts) == MAX_EDIT_ATTEMPTS
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def stress_engine(request, tmp_path):
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path / 'series.db'}"
+    else:
+        url = os.environ.get("MATCH_SERIES_TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("MATCH_SERIES_TEST_POSTGRES_URL is not set")
+    engine = create_engine(url)
+    _mapper_registry.metadata.create_all(engine)
+    yield engine
+    if request.param != "sqlite":
+        _mapper_registry.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def test_concurrent_edits(stress_engine):
+    threads_count = 8
+    edits = 5
+    # cho and gall are banned together
+    heroes = sorted(set(HEROES_DICT) - {"cho", "gall"})
+    pre_banned_heroes = heroes[:threads_count]
+    with Session(stress_engine) as session:
+        series = MatchSeriesManager.create_new(
+            session, "stress", pre_banned_heroes, limiter=None
+        )
+        series_id, edit_key = series.id, series.edit_key
+
+    barrier = threading.Barrier(threads_count)
+    errors = []
+
+    def edit(index):
+        try:
+            with Session(stress_engine) as thread_session:
+                manager = MatchSeriesManager(thread_session, series_id, edit_key)
+                barrier.wait()
+                for edit_index in range(edits):
+                    hero = heroes[threads_count + index * edits + edit_index]
+                    manager.set_hero_bans(
+                        [hero], [pre_banned_heroes[index]] if edit_index == 0 else []
+                    )
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [
+        threading.Thread(target=edit, args=(index,)) for index in range(threads_count)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with Session(stress_engine) as session:
+        manager = MatchSeriesManager(session, series_id)
+        assert manager.match_series.version == threads_count * edits
+        assert manager.match_series.banned_heroes == set(
+            heroes[threads_count : threads_count * (edits + 1)]
+        )
+        history = MatchSeriesManager.get_history(session, series_id, limit=1000)
+        assert len(history) == threads_count * (edits + 2)
+    SERIES_VIEW_CACHE.invalidate(series_id)
@@ -0,0 +1,85 @@
+from io import BytesIO
+
+import mpyq
+import pytest
+
+from app.heroes import (
+    extract_heroes_from_details,
+    extract_heroes_from_replay,
+    extract_heroes_from_tracker_events,
+    get_archive_protocol,
+)
+from app.mpq import MPQ_FILE_ENCRYPTED, MPQReader
+from tests.replay_factory import DEFAULT_HEROES, make_replay, write_mpq
+
+FILES = {
+    "replay.details": b"details" * 100,
+    "replay.tracker.events": bytes(range(256)) * 50 + b"tail",
+    "replay.initData": b"\x00\x01",
+    "empty": b"x",
+}
+
+
+@pytest.mark.parametrize("compression", ["bz2", "zlib"])
+@pytest.mark.parametrize("single_unit", [True, False])
+def test_matches_mpyq(compression, single_unit):
+    data = write_mpq(
+        FILES, b"user data", single_unit=single_unit, compression=compression
+    )
+
+    reader = MPQReader(BytesIO(data))
+    archive = mpyq.MPQArchive(BytesIO(data))
+
+    assert reader.header["user_data_header"] == archive.header["user_data_header"]
+    for name, contents in FILES.items():
+        assert reader.read_file(name) == archive.read_file(name) == contents
+    assert reader.read_file("missing") is None
+
+
+def test_lazy_tables():
+    reader = MPQReader(BytesIO(write_mpq(FILES, b"user data")))
+
+    assert "hash_table" not in reader.__dict__
+    assert "block_table" not in reader.__dict__
+    assert reader.bytes_read == 0
+
+    reader.read_file("replay.initData")
+    assert reader.bytes_read < 16
+
+
+def test_iter_file_is_chunked():
+    reader = MPQReader(BytesIO(write_mpq(FILES, single_unit=False)))
+
+    chunks = list(reader.iter_file("replay.tracker.events"))
+    assert len(chunks) > 1
+    assert b"".join(chunks) == FILES["replay.tracker.events"]
+
+    with pytest.raises(KeyError):
+        next(reader.iter_file("missing"))
+
+
+def test_invalid_file():
+    with pytest.raises(ValueError):
+        MPQReader(BytesIO(b"not a replay"))
+
+
+def test_encrypted_file():
+    reader = MPQReader(BytesIO(write_mpq(FILES)))
+    index = reader.get_hash_table_entry("replay.details").block_table_index
+    entry = reader.block_table[index]
+    reader.block_table[index] = entry._replace(flags=entry.flags | MPQ_FILE_ENCRYPTED)
+
+    with pytest.raises(ValueError, match="encrypted"):
+        reader.read_file("replay.details")
+
+
+@pytest.mark.parametrize("single_unit", [True, False])
+def test_synthetic_replay(single_unit):
+    replay = BytesIO(make_replay(single_unit=single_unit))
+
+    with get_archive_protocol(replay) as (archive, protocol):
+        assert extract_heroes_from_details(archive, protocol) == DEFAULT_HEROES
+        assert extract_heroes_from_tracker_events(archive, protocol) == DEFAULT_HEROES
+
+    replay.seek(0)
+    assert extract_heroes_from_replay(replay).heroes == tuple(DEFAULT_HEROES)
@@ -0,0 +1,41 @@
+import pytest
+from streamlit.testing.v1 import AppTest
+
+ADMIN_KEY = "secret"
+
+
+@pytest.fixture
+def create_page(tmp_path):
+    app = AppTest.from_file("pages/Create_Match_Series.py", default_timeout=60)
+    app.secrets["connections"] = {
+        "match_series": {"url": f"sqlite:///{tmp_path / 'match_series.db'}"}
+    }
+    app.secrets["admin"] = {"key": ADMIN_KEY}
+    return app
+
+
+def test_create_page_keeps_admin_access_on_reruns(create_page):
+    create_page.query_params["admin_key"] = ADMIN_KEY
+    create_page.run()
+    assert not create_page.exception
+    # the page clears query parameters on the first run
+    assert "admin_key" not in create_page.query_params
+
+    (bulk_submit,) = [
+        button for button in create_page.button if button.label == "Create"
+    ]
+    bulk_submit.click().run()
+    assert not create_page.exception
+    assert "Please upload a series list." in [
+        warning.value for warning in create_page.warning
+    ]
+    # rate limit stats are still shown to the admin
+    assert "rate limited" in create_page.caption[0].value
+
+
+def test_create_page_without_admin_key(create_page):
+    create_page.query_params["admin_key"] = "wrong"
+    create_page.run()
+    assert not create_page.exception
+    assert [button.label for button in create_page.button] == ["Submit"]
+    assert not create_page.caption
@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine
+
+from app.protocols import ProtocolRegistry
+from app.replay_cache import CachedExtraction, ReplayCache
+from app.schema import upgrade_schema
+
+
+def test_memoized():
+    registry = ProtocolRegistry()
+
+    protocol = registry.get(91756)
+
+    assert registry.get(91756) is protocol
+    assert registry.loaded_builds == [91756]
+    assert set(registry.import_times) == {91756}
+    assert registry.latest() is registry.latest()
+
+
+def test_preload():
+    registry = ProtocolRegistry()
+
+    assert registry.preload([91756, 1, 29406]) == [1]
+    assert registry.loaded_builds == [29406, 91756]
+
+
+def test_recent_builds():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    cache = ReplayCache(engine)
+
+    for key, base_build in [("a", 29406), ("b", 91756), ("c", 29406)]:
+        cache.put(key, CachedExtraction(("abathur",) * 10, base_build, "details"))
+
+    assert cache.recent_builds() == [29406, 91756]
+    assert cache.recent_builds(1) == [29406]
@@ -0,0 +1,126 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+import app.rate_limit
+from app.match_series_interface import MatchSeriesManager, match_series_table
+from app.rate_limit import RateLimitExceeded, TokenBucketLimiter, rate_limits_table
+from app.schema import upgrade_schema
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'series.db'}")
+    upgrade_schema(engine)
+    return engine
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(app.rate_limit.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["upsert", "locked row"])
+def dialect_path(request, monkeypatch):
+    if request.param == "locked row":
+        # take the path of databases without upserts
+        monkeypatch.setattr(app.rate_limit, "_UPSERTS", {})
+    return request.param
+
+
+def test_burst_and_refill(engine, clock, dialect_path):
+    limiter = TokenBucketLimiter("test", capacity=3, refill_seconds=60)
+
+    with Session(engine) as session:
+        for _ in range(3):
+            limiter.consume(session, "1.2.3.4")
+        session.commit()
+
+        with pytest.raises(RateLimitExceeded) as error:
+            limiter.consume(session, "1.2.3.4")
+        assert error.value.retry_after == pytest.approx(60)
+        session.rollback()
+
+        clock[0] += 45
+        with pytest.raises(RateLimitExceeded) as error:
+            limiter.consume(session, "1.2.3.4")
+        assert error.value.retry_after == pytest.approx(15)
+        session.rollback()
+
+        # other clients and limiters have their own buckets
+        limiter.consume(session, "5.6.7.8")
+        TokenBucketLimiter("other", capacity=1, refill_seconds=60).consume(
+            session, "1.2.3.4"
+        )
+
+        clock[0] += 15
+        limiter.consume(session, "1.2.3.4")
+        session.commit()
+
+        # a long pause refills the bucket only up to its capacity
+        clock[0] += 3600
+        for _ in range(3):
+            limiter.consume(session, "1.2.3.4")
+        with pytest.raises(RateLimitExceeded):
+            limiter.consume(session, "1.2.3.4")
+
+        assert session.scalar(select(func.count()).select_from(rate_limits_table)) == 3
+
+    assert limiter.stats == {"allowed": 8, "denied": 3, "deny_rate": 3 / 11}
+
+
+def test_create_new_enforces_limit(engine, clock):
+    limiter = TokenBucketLimiter("create", capacity=3, refill_seconds=60)
+
+    with Session(engine) as session:
+        MatchSeriesManager.create_new(session, "q1", ["cho"], "1.2.3.4", limiter)
+        # one token per series
+        MatchSeriesManager.create_many(
+            session, [("q2", []), ("q3", [])], "1.2.3.4", limiter
+        )
+        with pytest.raises(RateLimitExceeded):
+            MatchSeriesManager.create_new(session, "q4", [], "1.2.3.4", limiter)
+        with pytest.raises(ValueError):
+            MatchSeriesManager.create_many(
+                session, [("q5", [])] * 4, "5.6.7.8", limiter
+            )
+
+        # clients with unknown identities share a bucket
+        MatchSeriesManager.create_many(session, [("q6", []), ("q7", [])], None, limiter)
+        MatchSeriesManager.create_new(session, "q8", [], limiter=limiter)
+        with pytest.raises(RateLimitExceeded):
+            MatchSeriesManager.create_new(session, "q9", [], limiter=limiter)
+
+        # trusted callers are not limited
+        MatchSeriesManager.create_new(session, "q10", [], limiter=None)
+
+        names = session.scalars(select(match_series_table.c.name)).all()
+        assert sorted(names) == ["q1", "q10", "q2", "q3", "q6", "q7", "q8"]
+
+
+def test_concurrent_sessions(engine):
+    # SQLite ignores FOR UPDATE, so only the upsert is checked for concurrency
+    limiter = TokenBucketLimiter("test", capacity=5, refill_seconds=3600)
+    results = []
+
+    def consume():
+        with Session(engine) as session:
+            try:
+                limiter.consume(session, "1.2.3.4")
+                session.commit()
+                results.append(True)
+            except RateLimitExceeded:
+                results.append(False)
+
+    threads = [threading.Thread(target=consume) for _ in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 5
+    assert limiter.stats["denied"] == 7
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+pytest.importorskip("aiosqlite")
+
+from app.match_series_interface import SERIES_VIEW_CACHE, MatchSeriesManager  # noqa: E402
+from app.read_api import ReadApi, async_database_url, create_app  # noqa: E402
+from app.schema import upgrade_schema  # noqa: E402
+
+
+@pytest.fixture()
+def database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'series.db'}"
+    engine = create_engine(url)
+    upgrade_schema(engine)
+    with Session(engine) as session:
+        series = MatchSeriesManager.create_new(
+            session, "q1", ["anduin", "cho"], limiter=None
+        )
+        series_id, edit_key = series.id, series.edit_key
+    yield url, engine, series_id, edit_key
+    SERIES_VIEW_CACHE.invalidate(series_id)
+
+
+async def request(app: ReadApi, path: str, query: str = "", etag: bytes = None):
+    headers = [(b"if-none-match", etag)] if etag is not None else []
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query.encode(),
+        "headers": headers,
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start, body = messages
+    return start["status"], dict(start["headers"]), body["body"]
+
+
+def test_async_database_url():
+    assert async_database_url("sqlite:///match_series.db") == (
+        "sqlite+aiosqlite:///match_series.db"
+    )
+    assert async_database_url("postgresql+psycopg2://user:secret@db/series") == (
+        "postgresql+asyncpg://user:secret@db/series"
+    )
+    assert async_database_url("mysql+aiomysql://db/series") == (
+        "mysql+aiomysql://db/series"
+    )
+
+
+def test_get_series(database):
+    url, _, series_id, _ = database
+    app = create_app(url)
+
+    async def run():
+        status, headers, body = await request(app, f"/series/{series_id}")
+        assert status == 200
+        assert headers[b"etag"] == b'"0"'
+        assert headers[b"content-type"] == b"application/json"
+        assert json.loads(body) == {
+            "id": series_id,
+            "name": "q1",
+            "bans": ["anduin", "cho", "gall"],
+            "version": 0,
+        }
+        assert b" " not in body.replace(b"q1", b"")
+
+        status, headers, body = await request(
+            app, f"/series/{series_id}", etag=b'W/"0"'
+        )
+        assert (status, body) == (304, b"")
+        assert app.cache.misses == 1
+
+        assert (await request(app, "/series/missing"))[0] == 404
+        assert (await request(app, "/series/00000000-0000-0000-0000-000000000000"))[
+            0
+        ] == 404
+        assert (await request(app, "/other"))[0] == 404
+        assert (await request(app, f"/series/{series_id}", "wait=soon"))[0] == 400
+        await app.engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_long_poll(database):
+    url, engine, series_id, edit_key = database
+    app = create_app(url)
+    app.cache.ttl = 0.05
+
+    async def run():
+        start = time.monotonic()
+        status, _, _ = await request(app, f"/series/{series_id}", "wait=0.2", b'"0"')
+        assert status == 304
+        assert time.monotonic() - start >= 0.2
+
+        def edit():
+            time.sleep(0.1)
+            with Session(engine) as session:
+                MatchSeriesManager(session, series_id, edit_key).set_hero_bans(
+                    ["rexxar"], []
+                )
+
+        status, headers, body = (
+            await asyncio.gather(
+                request(app, f"/series/{series_id}", "wait=5", b'"0"'),
+                asyncio.to_thread(edit),
+            )
+        )[0]
+        assert status == 200
+        assert headers[b"etag"] == b'"1"'
+        assert "rexxar" in json.loads(body)["bans"]
+        await app.engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_lifespan_checks_schema(tmp_path):
+    app = create_app(f"sqlite:///{tmp_path / 'empty.db'}")
+    messages = []
+
+    async def receive():
+        return {"type": "lifespan.startup"}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app({"type": "lifespan"}, receive, send))
+    assert messages[0]["type"] == "lifespan.startup.failed"
+    asyncio.run(app.engine.dispose())
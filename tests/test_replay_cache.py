@@ -0,0 +1,111 @@
+import sys
+import threading
+from io import BytesIO
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.heroes import extract_heroes_from_replay
+from app.replay_cache import (
+    CachedExtraction,
+    ReplayCache,
+    replay_cache_table,
+    replay_hash,
+)
+from app.schema import upgrade_schema
+from tests.replay_factory import DEFAULT_HEROES, make_replay
+
+ENTRY = CachedExtraction(("abathur",) * 10, 91756, "details")
+
+
+def test_hit_miss_counters():
+    cache = ReplayCache()
+
+    assert cache.get("key") is None
+    cache.put("key", ENTRY)
+    assert cache.get("key") == ENTRY
+    assert cache.stats == {
+        "hits": 1,
+        "misses": 1,
+        "memory_entries": 1,
+        "failure_entries": 0,
+    }
+
+
+def test_memory_lru_eviction():
+    cache = ReplayCache(max_memory_entries=2)
+
+    cache.put("a", ENTRY)
+    cache.put("b", ENTRY)
+    cache.get("a")
+    cache.put("c", ENTRY)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == ENTRY
+
+
+def test_persistence_and_eviction():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    cache = ReplayCache(engine, max_entries=2, max_memory_entries=1)
+
+    cache.put("a", ENTRY)
+    cache.put("b", ENTRY._replace(method="tracker_events"))
+    cache.get("a")
+    cache.put("c", ENTRY)
+
+    new_cache = ReplayCache(engine)
+    assert new_cache.get("b") is None
+    assert new_cache.get("a") == new_cache.get("c") == ENTRY
+
+
+@pytest.mark.parametrize("upserts", [True, False])
+def test_concurrent_puts(tmp_path, monkeypatch, upserts):
+    if not upserts:
+        # take the path of databases without upserts
+        monkeypatch.setattr(sys.modules["app.replay_cache"], "_UPSERTS", {})
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}")
+    upgrade_schema(engine)
+    caches = [ReplayCache(engine) for _ in range(8)]
+    barrier = threading.Barrier(len(caches))
+
+    def put(cache):
+        barrier.wait()
+        cache.put("a", ENTRY)
+
+    threads = [threading.Thread(target=put, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # a put of an existing entry is a no-op
+    caches[0].put("a", ENTRY._replace(method="tracker_events"))
+    assert ReplayCache(engine).get("a") == ENTRY
+    with engine.connect() as connection:
+        count = connection.execute(
+            select(func.count()).select_from(replay_cache_table)
+        ).scalar_one()
+    assert count == 1
+
+
+def test_extraction_uses_cache():
+    data = make_replay()
+    cache = ReplayCache()
+
+    assert extract_heroes_from_replay(BytesIO(data), cache).heroes == tuple(
+        DEFAULT_HEROES
+    )
+    assert cache.get(replay_hash(data)) == CachedExtraction(
+        tuple(DEFAULT_HEROES), 91756, "details", (0,) * 5 + (1,) * 5
+    )
+    assert extract_heroes_from_replay(BytesIO(data), cache).heroes == tuple(
+        DEFAULT_HEROES
+    )
+    assert cache.stats["hits"] == 2
+
+    cache.put(replay_hash(b"not a replay"), ENTRY)
+    assert extract_heroes_from_replay(BytesIO(b"not a replay"), cache).heroes == (
+        ENTRY.heroes
+    )
+    assert not extract_heroes_from_replay(BytesIO(b"not a replay")).ok
@@ -0,0 +1,126 @@
+import io
+import json
+import subprocess
+import sys
+
+import pytest
+
+import app.replay_scan
+from app.__main__ import main
+from app.heroes import (
+    WORKER_CRASHED_MESSAGE,
+    ExtractionErrorCategory,
+    ExtractionResult,
+)
+from app.replay_scan import iter_replay_files, scan_replays
+from tests.replay_factory import DEFAULT_HEROES, make_replay
+
+
+@pytest.fixture()
+def replay_dir(tmp_path):
+    root = tmp_path / "replays"
+    (root / "week 2").mkdir(parents=True)
+    (root / "a.StormReplay").write_bytes(make_replay())
+    (root / "week 2" / "b.stormreplay").write_bytes(
+        make_replay(hero_names=DEFAULT_HEROES[::-1])
+    )
+    (root / "week 2" / "copy.StormReplay").write_bytes(make_replay())
+    (root / "broken.StormReplay").write_bytes(b"not a replay")
+    (root / "notes.txt").write_text("not a replay either")
+    return root
+
+
+def test_iter_replay_files(replay_dir):
+    assert [
+        path.relative_to(replay_dir).as_posix()
+        for path in iter_replay_files(replay_dir)
+    ] == [
+        "a.StormReplay",
+        "broken.StormReplay",
+        "week 2/b.stormreplay",
+        "week 2/copy.StormReplay",
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_scan_replays(replay_dir, tmp_path, max_workers):
+    manifest = tmp_path / "manifest.txt"
+    output = io.StringIO()
+
+    stats = scan_replays(replay_dir, output, manifest, max_workers)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [result["path"] for result in results] == [
+        "a.StormReplay",
+        "broken.StormReplay",
+        "week 2/b.stormreplay",
+    ]
+    assert sorted(results[0]["heroes"]) == sorted(DEFAULT_HEROES)
+    assert results[0]["method"] == "details"
+    assert results[0]["teams"] == [0] * 5 + [1] * 5
+    assert results[1]["error_category"] == "corrupt"
+    assert (stats.files, stats.extracted, stats.failed, stats.skipped) == (4, 2, 1, 1)
+    assert len(manifest.read_text().split()) == 3
+
+    # resume: everything is in the manifest already
+    (replay_dir / "new.StormReplay").write_bytes(
+        make_replay(hero_names=DEFAULT_HEROES[1:] + DEFAULT_HEROES[:1])
+    )
+    output = io.StringIO()
+    stats = scan_replays(replay_dir, output, manifest, max_workers)
+
+    assert [json.loads(line)["path"] for line in output.getvalue().splitlines()] == [
+        "new.StormReplay"
+    ]
+    assert stats.skipped == 4
+
+
+def test_scan_after_worker_crash(replay_dir, tmp_path, monkeypatch):
+    manifest = tmp_path / "manifest.txt"
+
+    def crash(payloads, max_workers):
+        return [
+            ExtractionResult().fail(
+                ExtractionErrorCategory.WORKER_CRASHED, WORKER_CRASHED_MESSAGE
+            )
+            for _ in payloads
+        ]
+
+    with monkeypatch.context() as patch:
+        patch.setattr(app.replay_scan, "extract_heroes_from_contents", crash)
+        output = io.StringIO()
+        stats = scan_replays(replay_dir, output, manifest)
+
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert {result["error_category"] for result in results} == {"worker_crashed"}
+    assert (stats.failed, stats.skipped) == (3, 1)
+    # replays that crashed a worker are retried on resume
+    assert not manifest.exists() or manifest.read_text() == ""
+
+    stats = scan_replays(replay_dir, io.StringIO(), manifest)
+    assert (stats.extracted, stats.failed, stats.skipped) == (2, 1, 1)
+
+
+def test_cli(replay_dir, tmp_path):
+    output = tmp_path / "results.jsonl"
+    manifest = tmp_path / "manifest.txt"
+    args = [
+        "scan",
+        str(replay_dir),
+        "--output",
+        str(output),
+        "--manifest",
+        str(manifest),
+    ]
+
+    main(["heroes", *args, "--workers", "1"])
+    assert len(output.read_text().splitlines()) == 3
+
+    process = subprocess.run(
+        [sys.executable, "-m", "app", "heroes", *args], capture_output=True, text=True
+    )
+    assert process.returncode == 0, process.stderr
+    assert "RuntimeWarning" not in process.stderr
+    assert "4 replays" in process.stderr
+    assert "4 skipped" in process.stderr
+    assert len(output.read_text().splitlines()) == 3
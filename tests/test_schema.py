@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text, update
+
+from app.__main__ import main
+from app.schema import (
+    SCHEMA_VERSION,
+    check_schema_version,
+    schema_version_table,
+    upgrade_schema,
+)
+
+
+def test_upgrade_new_database():
+    engine = create_engine("sqlite://")
+
+    with pytest.raises(RuntimeError):
+        check_schema_version(engine)
+
+    assert upgrade_schema(engine) is None
+    check_schema_version(engine)
+    assert upgrade_schema(engine) == SCHEMA_VERSION
+
+
+def test_newer_schema():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            update(schema_version_table).values(version=SCHEMA_VERSION + 1)
+        )
+
+    with pytest.raises(RuntimeError):
+        upgrade_schema(engine)
+    with pytest.raises(RuntimeError):
+        check_schema_version(engine)
+
+
+def test_cli(tmp_path, capsys):
+    url = f"sqlite:///{tmp_path / 'match_series.db'}"
+
+    with pytest.raises(RuntimeError):
+        main(["schema", "check", "--url", url])
+    main(["schema", "upgrade", "--url", url])
+    main(["schema", "check", "--url", url])
+
+    assert "up to date" in capsys.readouterr().out
+
+
+def test_upgrade_adds_version_column():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("ALTER TABLE match_series DROP COLUMN version"))
+        connection.execute(update(schema_version_table).values(version=2))
+
+    assert upgrade_schema(engine) == 2
+    columns = {column["name"] for column in inspect(engine).get_columns("match_series")}
+    assert "version" in columns
+
+
+def test_upgrade_adds_replay_cache_teams_column():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE replay_cache"))
+        connection.execute(
+            text(
+                "CREATE TABLE replay_cache (replay_hash VARCHAR(32) PRIMARY KEY, "
+                "heroes JSON NOT NULL, base_build INTEGER NOT NULL, "
+                "method VARCHAR(16) NOT NULL, last_used_at DATETIME NOT NULL)"
+            )
+        )
+        connection.execute(update(schema_version_table).values(version=3))
+
+    assert upgrade_schema(engine) == 3
+    columns = {column["name"] for column in inspect(engine).get_columns("replay_cache")}
+    assert "teams" in columns
+
+
+def test_upgrade_creates_replay_cache_table():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE replay_cache"))
+        connection.execute(update(schema_version_table).values(version=6))
+
+    assert upgrade_schema(engine) == 6
+    assert inspect(engine).has_table("replay_cache")
+
+
+def test_upgrade_adds_snapshot_version_column():
+    engine = create_engine("sqlite://")
+    upgrade_schema(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            text("ALTER TABLE match_series DROP COLUMN snapshot_version")
+        )
+        connection.execute(
+            text(
+                "INSERT INTO match_series (id, name, banned_mask, version) "
+                "VALUES ('00000000000000000000000000000001', 'q1', x'', 7)"
+            )
+        )
+        connection.execute(update(schema_version_table).values(version=4))
+
+    assert upgrade_schema(engine) == 4
+    with engine.connect() as connection:
+        assert (
+            connection.execute(
+                text("SELECT snapshot_version FROM match_series")
+            ).scalar()
+            == 7
+        )
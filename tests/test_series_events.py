@@ -0,0 +1,39 @@
+from app.series_events import SeriesVersionBroker
+
+
+def test_publish():
+    broker = SeriesVersionBroker()
+    assert broker.latest("a") is None
+
+    broker.publish("a", 2)
+    broker.publish("a", 1)
+    assert broker.latest("a") == 2
+    assert broker.latest("b") is None
+
+
+def test_subscribe():
+    broker = SeriesVersionBroker()
+    calls = []
+    broker.publish("a", 1)
+
+    broker.subscribe("session 1", "a", 1, lambda version: calls.append((1, version)))
+    broker.subscribe("session 2", "a", 0, lambda version: calls.append((2, version)))
+    assert calls == [(2, 1)]
+    assert broker.subscribers() == ["session 1"]
+
+    # subscribing again replaces the previous subscription
+    broker.subscribe("session 3", "a", 1, lambda version: calls.append((3, version)))
+    broker.subscribe("session 3", "b", 0, lambda version: calls.append((4, version)))
+    assert sorted(broker.subscribed_series()) == ["a", "b"]
+
+    broker.publish("a", 2)
+    broker.publish("a", 3)
+    assert calls == [(2, 1), (1, 2)]
+    assert broker.subscribed_series() == ["b"]
+
+    broker.unsubscribe("session 3")
+    broker.unsubscribe("missing")
+    broker.publish("b", 1)
+    assert calls == [(2, 1), (1, 2)]
+    assert broker.subscribers() == []
+    assert broker.subscribed_series() == []
@@ -0,0 +1,91 @@
+from PIL import Image
+
+from app.__main__ import main
+from app.hero_grid import hero_grid_style, hero_tile
+from app.heroes import HEROES_DICT, __heroes_file_path__
+from app.sprites import (
+    SPRITE_SIZES,
+    build_sprite_sheets,
+    get_sprite_map,
+    sprite_size_report,
+    sprite_sheets_up_to_date,
+)
+
+
+def _make_static_dir(path, heroes):
+    path.mkdir()
+    for index, hero in enumerate(heroes):
+        Image.new("RGB", (152, 152), (index * 40, 0, 0)).save(path / f"{hero}.png")
+    Image.new("RGBA", (152, 152), (255, 0, 0, 128)).save(path / "ban.png")
+    Image.new("RGB", (76, 152), (0, 0, 255)).save(path / "tall.png")
+    return path
+
+
+def test_build_sprite_sheets(tmp_path):
+    names = [hero["name"] for hero in HEROES_DICT.values()][:4]
+    static_dir = _make_static_dir(tmp_path / "static", names)
+    heroes_file = tmp_path / "heroes.json"
+    heroes_file.write_bytes(__heroes_file_path__.read_bytes())
+    out_dir = tmp_path / "sprites"
+
+    assert not sprite_sheets_up_to_date(static_dir, out_dir, heroes_file)
+    sprite_map = build_sprite_sheets(static_dir, out_dir, heroes_file)
+    assert sprite_sheets_up_to_date(static_dir, out_dir, heroes_file)
+
+    assert (sprite_map["columns"], sprite_map["rows"]) == (3, 2)
+    assert list(sprite_map["tiles"]) == names + ["ban", "tall"]
+    assert sprite_map["tiles"]["ban"] == [1, 1]
+
+    for size in SPRITE_SIZES:
+        sheets = sprite_map["sheets"][str(size)]
+        assert list(sheets) == ["webp", "png"]
+        sheet = Image.open(out_dir / sheets["png"])
+        assert sheet.mode == "P"
+        sheet = sheet.convert("RGBA")
+        assert sheet.size == (3 * size, 2 * size)
+        assert sheet.getpixel((size + 1, 1)) == (40, 0, 0, 255)
+        # the tall icon is padded, not stretched
+        assert sheet.getpixel((2 * size + 1, size + size // 2))[3] == 0
+        assert sheet.getpixel((2 * size + size // 2, size + size // 2))[:3] == (
+            0,
+            0,
+            255,
+        )
+        assert Image.open(out_dir / sheets["webp"]).size == sheet.size
+
+    report = sprite_size_report(sprite_map)
+    assert len(report) == 1 + 2 * len(SPRITE_SIZES)
+    assert str(sprite_map["source_bytes"]) in report[0]
+
+    sheets = {path.name: path.read_bytes() for path in out_dir.iterdir()}
+    build_sprite_sheets(static_dir, out_dir, heroes_file)
+    assert sheets == {path.name: path.read_bytes() for path in out_dir.iterdir()}
+
+    heroes_file.write_text(heroes_file.read_text() + "\n")
+    assert not sprite_sheets_up_to_date(static_dir, out_dir, heroes_file)
+
+
+def test_committed_sprite_sheets_are_up_to_date(capsys):
+    main(["sprites", "check"])
+    assert "up to date" in capsys.readouterr().out
+
+    sprite_map = get_sprite_map()
+    for file_name, sheet_bytes in sprite_map["bytes"].items():
+        assert sheet_bytes < sprite_map["source_bytes"], file_name
+
+
+def test_sprite_tiles():
+    sprite_map = get_sprite_map()
+    column, row = sprite_map["tiles"]["abathur"]
+    x = column * 100 / (sprite_map["columns"] - 1)
+    y = row * 100 / (sprite_map["rows"] - 1)
+
+    tile = hero_tile("abathur", ban=True)
+    assert "<img" not in tile
+    assert f"background-position: {x:.4g}% {y:.4g}%" in tile
+    assert 'aria-label="abathur"' in tile
+    style = hero_grid_style(60, True, False)
+    assert 'url("app/static/sprites/heroes_64.png")' in style
+    assert 'url("app/static/sprites/heroes_64.webp") type("image/webp")' in style
+    assert "heroes_128.webp" in hero_grid_style(100, True, False)
+    assert "heroes_152.webp" in hero_grid_style(152, True, False)